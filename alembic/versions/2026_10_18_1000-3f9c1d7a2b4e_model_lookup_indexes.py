@@ -0,0 +1,79 @@
+"""model lookup indexes
+
+Unique (name, version) and partial live-row indexes on aimodel, unique users.email, and the
+low-selectivity standalone is_deleted indexes dropped.
+
+Every index is built with CREATE INDEX CONCURRENTLY outside of the migration transaction so it
+can run against a live database. A concurrent build that fails (e.g. on duplicate emails or
+model versions) leaves an INVALID index behind, drop it and fix the data before re-running.
+
+Revision ID: 3f9c1d7a2b4e
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c1d7a2b4e"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE_ROWS = sa.text("is_deleted = false")
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_aimodel_name_version",
+            "aimodel",
+            ["name", "version"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_aimodel_live_name_created_at",
+            "aimodel",
+            ["name", "created_at"],
+            postgresql_where=LIVE_ROWS,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_aimodel_live_created_at_id",
+            "aimodel",
+            ["created_at", "id"],
+            postgresql_where=LIVE_ROWS,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "uq_users_email",
+            "users",
+            ["email"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index("ix_aimodel_is_deleted", "aimodel", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_users_is_deleted", "users", postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_is_deleted", "users", ["is_deleted"], postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_aimodel_is_deleted", "aimodel", ["is_deleted"], postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index("uq_users_email", "users", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_aimodel_live_created_at_id", "aimodel", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_aimodel_live_name_created_at", "aimodel", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("uq_aimodel_name_version", "aimodel", postgresql_concurrently=True, if_exists=True)
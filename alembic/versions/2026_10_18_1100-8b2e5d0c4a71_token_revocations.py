@@ -0,0 +1,44 @@
+"""token revocations
+
+Denylist checked by stateless token validation, one row per revoked token (jti) or per user
+whose tokens issued so far are revoked (subject). Rows can be deleted once expires_at is past.
+
+Revision ID: 8b2e5d0c4a71
+Revises: 3f9c1d7a2b4e
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2e5d0c4a71"
+down_revision: Union[str, None] = "3f9c1d7a2b4e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "token_revocations",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("jti", sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True),
+        sa.Column("subject", sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_token_revocations_id"), "token_revocations", ["id"], unique=False)
+    op.create_index(op.f("ix_token_revocations_jti"), "token_revocations", ["jti"], unique=False)
+    op.create_index(op.f("ix_token_revocations_expires_at"), "token_revocations", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_token_revocations_expires_at"), table_name="token_revocations")
+    op.drop_index(op.f("ix_token_revocations_jti"), table_name="token_revocations")
+    op.drop_index(op.f("ix_token_revocations_id"), table_name="token_revocations")
+    op.drop_table("token_revocations")
@@ -0,0 +1,35 @@
+"""registry version
+
+Single row counter bumped in the transaction of every model registry change. Listing ETags are
+derived from it, so every node and replica hands out the same tag for the same registry state.
+
+Revision ID: 5d1a9e3c7b60
+Revises: 8b2e5d0c4a71
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1a9e3c7b60"
+down_revision: Union[str, None] = "8b2e5d0c4a71"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    registry_version = op.create_table(
+        "registry_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(registry_version, [{"id": 1, "version": 0}])
+
+
+def downgrade() -> None:
+    op.drop_table("registry_version")
@@ -0,0 +1,155 @@
+"""
+`/health` latency while a storm of logins hits `/auth/token`.
+
+The auth and health routers run in process, driven through an ASGI transport against a
+throwaway SQLite database. `/health` is polled the whole time and its latency is reported for an
+idle baseline, for the storm with bcrypt running inline on the event loop (as the login used to)
+and for the storm with the bounded hasher pool. Shed logins (503) are counted separately.
+
+    python benchmarks/login_storm.py --logins 50 --concurrency 25
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+EMAIL = "storm@example.com"
+PASSWORD = "s3cret"
+
+
+class InlineHasher:
+    """
+    bcrypt straight on the event loop, the behaviour before the hasher pool
+    """
+
+    async def hash(self, password: str) -> str:
+        from utils.password_hasher import pwd_context
+
+        return pwd_context.hash(password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        from utils.password_hasher import pwd_context
+
+        return pwd_context.verify(password, hashed_password)
+
+
+async def build_app(database_url: str):
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlmodel import SQLModel
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from apps.auth.router import router as auth_router
+    from apps.health.router import router as health_router
+    from db import session as session_module
+    from db.models.user import User
+    from utils.password_hasher import pwd_context
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        db.add(User(email=EMAIL, first_name="Storm", last_name="Test", hashed_password=pwd_context.hash(PASSWORD)))
+        await db.commit()
+
+    async def get_db():
+        async with factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth_router)
+    app.include_router(health_router)
+    app.dependency_overrides[session_module.get_async_db] = get_db
+    return app, engine
+
+
+async def measure(app, logins: int, concurrency: int, duration: float):
+    from httpx import ASGITransport, AsyncClient
+
+    latencies, statuses = [], []
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        stop = asyncio.Event()
+
+        async def poll_health():
+            # Latency counts from when the poll was due, a stalled loop delays the send as well
+            due = time.perf_counter()
+            while not stop.is_set():
+                await client.get("/health")
+                latencies.append((time.perf_counter() - due) * 1000)
+                due += 0.01
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/auth/token", data={"username": EMAIL, "password": PASSWORD})
+                statuses.append(response.status_code)
+
+        poller = asyncio.create_task(poll_health())
+        if logins:
+            await asyncio.gather(*[login() for _ in range(logins)])
+        else:
+            await asyncio.sleep(duration)
+        stop.set()
+        await poller
+    return latencies, statuses
+
+
+def summary(name: str, latencies, statuses) -> str:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    ok, shed = statuses.count(200), statuses.count(503)
+    return (
+        f"{name:<16} {len(ordered):>7} {statistics.median(ordered):>9.1f} {p99:>9.1f} {ordered[-1]:>9.1f}"
+        f" {ok:>6} {shed:>6}"
+    )
+
+
+async def run(logins: int, concurrency: int, database_url: str) -> None:
+    import logging
+    from utils import password_hasher as password_hasher_module
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    app, engine = await build_app(database_url)
+    print(f"{'scenario':<16} {'polls':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'200':>6} {'503':>6}")
+    print(summary("idle", *await measure(app, 0, concurrency, duration=1.0)))
+
+    password_hasher_module._password_hasher = InlineHasher()
+    print(summary("inline bcrypt", *await measure(app, logins, concurrency, duration=0)))
+
+    password_hasher_module._password_hasher = None
+    hasher = password_hasher_module.get_password_hasher()
+    # Start the workers before measuring
+    await hasher.hash(PASSWORD)
+    print(summary("hasher pool", *await measure(app, logins, concurrency, duration=0)))
+    password_hasher_module.shutdown_password_hasher()
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40, help="Logins in the storm")
+    parser.add_argument("--concurrency", type=int, default=20, help="Logins in flight at a time")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        asyncio.run(run(args.logins, args.concurrency, database_url))
+
+
+if __name__ == "__main__":
+    main()
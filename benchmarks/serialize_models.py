@@ -0,0 +1,89 @@
+"""
+Cost of turning a page of model rows into the `GET /ai/models` response body.
+
+Compares the response model path (a `ModelResponse` per row, validated and serialized again by
+FastAPI through `response_model=List[ModelResponse]`, then encoded with the standard json
+module) with the raw path the route uses now (the row dicts encoded with orjson as is). Rows are
+built in memory, the database is not involved.
+
+    python benchmarks/serialize_models.py --rows 1000 10000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+
+def make_rows(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": uuid4(),
+            "name": f"model-{i % 1000}",
+            "description": "benchmark model",
+            "url_or_path": f"s3://bench/model-{i}.zip",
+            "details": {"entrypoint": "model.onnx"},
+            "version": f"0.0.{i // 1000}",
+            "sha256": "0" * 64,
+            "created_at": start + timedelta(seconds=i),
+            "updated_at": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def run(sizes, repeat: int) -> None:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from server.controllers.ai.models.schemas import ModelResponse
+    from utils.responses import UTCORJSONResponse
+
+    field = create_response_field("Response_List_Models", List[ModelResponse])
+
+    def response_model_path(rows):
+        items = [ModelResponse(**row) for row in rows]
+        content = asyncio.run(serialize_response(field=field, response_content=items))
+        return JSONResponse(content).body
+
+    def raw_path(rows):
+        return UTCORJSONResponse(rows).body
+
+    print(f"{'rows':>7} {'response model (ms)':>20} {'raw orjson (ms)':>16} {'speedup':>8}")
+    for count in sizes:
+        rows = make_rows(count)
+        slow = best_of(lambda: response_model_path(rows), repeat)
+        fast = best_of(lambda: raw_path(rows), repeat)
+        print(f"{count:>7} {slow:>20.2f} {fast:>16.2f} {slow / fast:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[1000, 10000], help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
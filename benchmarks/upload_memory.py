@@ -0,0 +1,100 @@
+"""
+Peak RSS of a model upload against the artifact size.
+
+Every measurement runs in a fresh interpreter so `ru_maxrss` only reflects that upload.
+S3 is replaced by a sink that discards the bytes, which isolates the memory held by our code.
+
+    python benchmarks/upload_memory.py --sizes 16 64 256 512
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+MB = 1024 * 1024
+
+
+class NullS3:
+    def put_object(self, Bucket, Key, Body):
+        return {"ETag": "null"}
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": "null"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        return {}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_single(mode: str, path: str) -> None:
+    from fastapi import UploadFile
+    from utils import net_utils
+
+    net_utils.s3 = NullS3()
+    baseline = peak_rss_mb()
+
+    async def upload():
+        with open(path, "rb") as f:
+            if mode == "buffered":
+                # What the endpoint used to do: the whole body as bytes, then one put_object
+                buf = f.read()
+                net_utils.s3.put_object(Bucket="bench", Key="model.zip", Body=bytes(buf))
+            else:
+                await net_utils.upload_from_file(UploadFile(f, filename="model.zip"), "model.zip", "bench")
+
+    asyncio.run(upload())
+    print(f"{peak_rss_mb() - baseline:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[16, 64, 256], help="Artifact sizes in MiB")
+    parser.add_argument("--run", choices=["buffered", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_single(args.run, args.path)
+        return
+
+    print(f"{'size (MiB)':>10} {'buffered (MiB)':>15} {'streaming (MiB)':>16}")
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix=".zip") as artifact:
+            for _ in range(size):
+                artifact.write(os.urandom(MB))
+            artifact.flush()
+
+            results = []
+            for mode in ("buffered", "streaming"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--run", mode, "--path", artifact.name],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                results.append(float(out.stdout.strip().splitlines()[-1]))
+        print(f"{size:>10} {results[0]:>15.1f} {results[1]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -65,6 +65,29 @@ def generate_privkey(_ctx, path: str, size: int):
     generate_and_save_rsa_private_key(path, size)
     click.echo(f"Private key generated at {path}")
 
+@cli.command("rotate-jwt-key")
+@click.option("--path", "-p", help="Private key the tokens are signed with", default="./certs/privkey.pem")
+@click.option("--size", "-s", help="Size of the new key", default=2048)
+def rotate_jwt_key(path: str, size: int):
+    """
+    Replace the token signing key, the current public key is kept to verify the tokens it signed
+    """
+    from Crypto.PublicKey import RSA
+    from src.utils.encryption import generate_and_save_rsa_private_key
+    from src.utils.signing_keys import key_id
+
+    public_key_path = f"{path.replace('.pem', '')}.pub"
+    with open(public_key_path, "rb") as f:
+        kid = key_id(RSA.import_key(f.read()))
+    retired_path = f"{path.replace('.pem', '')}.{kid}.pub"
+    os.replace(public_key_path, retired_path)
+    generate_and_save_rsa_private_key(path, size)
+
+    expiration = Settings().JWT_EXPIRATION_MINUTES
+    click.echo(f"New signing key at {path}, the previous public key moved to {retired_path}")
+    click.echo(f"Add it to JWT_PREVIOUS_PUBLIC_KEYS for at least {expiration} minutes, then remove it:")
+    click.echo(f"JWT_PREVIOUS_PUBLIC_KEYS={retired_path}")
+
 @cli.command
 @click.pass_context
 @click.option("--profile", "-p", help="AWS Profile")
@@ -78,6 +101,47 @@ def deploy(_ctx, profile: str):
     p.wait
     
 
+@cli.command("import-models")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--concurrency", "-c", type=int, default=None, help="Artifacts uploaded at the same time")
+def import_models(manifest: str, concurrency: int):
+    """
+    Register the models listed in a JSON or JSON lines manifest, artifact paths are relative to it
+    """
+    import asyncio
+    import json
+    from rich.table import Table
+    from db.session import local_session
+    from server.controllers.ai.models.model_controller import ModelController
+    from server.controllers.ai.models.schemas import BulkModelItem
+
+    with open(manifest) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        raw = json.loads(text)
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+    items = [BulkModelItem(**item) for item in raw]
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+
+    def open_artifact(item: BulkModelItem):
+        return open(os.path.join(base_dir, item.artifact), "rb")
+
+    async def run():
+        async with local_session() as db:
+            return await ModelController.bulk_create_models(db, items, open_artifact, concurrency)
+
+    response = asyncio.run(run())
+
+    table = Table("Name", "Version", "Status", "SHA256 / Error")
+    for result in response.results:
+        table.add_row(result.name, result.version, result.status, result.error or result.sha256 or "")
+    console = Console()
+    console.print(table)
+    console.print(f"{response.created} created, {response.existing} already registered, {response.failed} failed")
+    if response.failed:
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     cli()
@@ -13,6 +13,11 @@ from db.session import async_engine as engine
 from core.models import Base
 from core.logger import logging
 from utils.system_info import log_system_info
+from server.inference.process_pool import shutdown_inference_pool
+from db.model_cache import start_model_cache_listener, stop_model_cache_listener
+from utils.password_hasher import shutdown_password_hasher
+from utils.http_client import close_http_client
+from utils.signing_keys import get_key_ring
 from core.config import (
     AppSettings,
     DatabaseSettings,
@@ -40,12 +45,14 @@ async def set_threadpool_tokens(number_of_tokens: int = 100) -> None:
 
 
 async def ensure_private_key_exists() -> None:
-    # Function to ensure private key exists
-    from src.core.config import settings
-    import os
-
-    if not os.path.exists(settings.PRIVATE_KEY_PATH):
-        raise FileNotFoundError(f"Private key not found at {settings.PRIVATE_KEY_PATH}")
+    # Load the token signing keys now, a missing key fails the startup instead of every login
+    try:
+        get_key_ring()
+    except FileNotFoundError as e:
+        raise RuntimeError(
+            f"JWT signing key not found ({e.filename}), generate it with `pybe generate-privkey`"
+            " or set PRIVATE_KEY_PATH"
+        ) from e
 
 
 async def startup_logging() -> None:
@@ -58,11 +65,15 @@ async def shutdown_logging() -> None:
 
 @asynccontextmanager
 async def lifespan(_entrypoint: FastAPI):
-    # TODO:
-    # await ensure_private_key_exists()
+    await ensure_private_key_exists()
     await set_threadpool_tokens()
     # await create_tables()
+    start_model_cache_listener()
     yield
+    await stop_model_cache_listener()
+    shutdown_inference_pool()
+    shutdown_password_hasher()
+    await close_http_client()
     await shutdown_logging()
 
 
@@ -1,12 +1,16 @@
 from typing import Annotated, Dict
 from sqlmodel.ext.asyncio.session import AsyncSession
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, status
 from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse
 
 from fastapi.security import OAuth2PasswordRequestForm
 
 from db.session import get_async_db
 from server.controllers.auth.auth_controller import AuthController, get_current_user
+from server.dependencies import oauth2_scheme
+from core.config import get_settings
+from utils.signing_keys import get_key_ring
 
 from db.models import User
 from server.controllers.auth.schemas import (
@@ -17,6 +21,8 @@ from server.controllers.auth.schemas import (
 )
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+# Served at the root, where verifiers look for it
+well_known_router = APIRouter(prefix="/.well-known", tags=["auth"])
 
 
 @router.post("/signup", response_model=User)
@@ -27,6 +33,8 @@ async def signup(
     try:
         user = await AuthController.create_user(db, create_user)
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail="User already exists")
 
@@ -46,9 +54,23 @@ async def login(
     access_token = await AuthController.create_access_token(user)
     return Token(access_token=access_token, token_type="bearer")
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> None:
+    await AuthController.revoke_token(db, token)
+
 @router.get("/me", response_model=UserResponse)
 async def me(
     current_user: Annotated[UserResponse, Depends(get_current_user)],
 ) -> User:
     return current_user
 
+@well_known_router.get("/jwks.json")
+async def jwks() -> JSONResponse:
+    # Verifiers cache the keys, and fetch them again when a token has a kid they do not know
+    return JSONResponse(
+        get_key_ring().jwks(),
+        headers={"Cache-Control": f"public, max-age={get_settings().JWKS_MAX_AGE}"},
+    )
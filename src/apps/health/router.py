@@ -2,7 +2,9 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, status
 import psutil
 
+from typing import Dict, List
 from core.config import get_settings
+from core.metrics import get_metrics
 from .schemas import APIStatus
 
 router = APIRouter(prefix="/health", tags=["health"])
@@ -22,3 +24,12 @@ async def health_check() -> APIStatus:
         uptime=psutil.boot_time(),
         version=cfg.APP_VERSION,
     )
+
+
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    responses={200: {"description": "Process metrics"}},
+)
+async def metrics() -> List[Dict]:
+    return get_metrics().snapshot()
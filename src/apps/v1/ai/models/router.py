@@ -1,10 +1,21 @@
-from typing import Annotated, Dict, List
-from fastapi import APIRouter, Depends, File, status
+from typing import Annotated, Dict, List, Optional
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.session import get_async_db
+from db.session import get_async_db, release, stream_session
 from server.controllers.ai.models.model_controller import ModelController
-from server.controllers.ai.models.schemas import CreateModel, ModelResponse
+from utils.etag import etag_matches
+from utils.responses import UTCORJSONResponse
+from server.controllers.ai.models.schemas import (
+    BulkCreateResponse,
+    BulkModelItem,
+    CreateModel,
+    ModelResponse,
+    PredictRequest,
+    PredictResponse,
+)
 
 router = APIRouter(prefix="/models", tags=["ai"])
 
@@ -12,13 +23,70 @@ router = APIRouter(prefix="/models", tags=["ai"])
 @router.get(
     "",
     status_code=status.HTTP_200_OK,
-    responses={200: {"description": "List available models", "model": ModelResponse}},
+    responses={
+        200: {"description": "List available models, the next page cursor is in X-Next-Cursor"},
+        304: {"description": "Nothing changed since the ETag in If-None-Match"},
+    },
     response_model=List[ModelResponse],
 )
 async def list_models(
     db: Annotated[AsyncSession, Depends(get_async_db)],
+    limit: Annotated[int, Query(ge=1, le=1000)] = 50,
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    version: Optional[str] = None,
+    include_deleted: bool = False,
+    if_none_match: Annotated[Optional[str], Header()] = None,
 ) -> List[ModelResponse]:
-    return await ModelController.get_models(db)
+    # Taken before the query on the same session, a change racing with it yields a stale tag,
+    # never a stale page
+    etag = await ModelController.get_registry_etag(db)
+    if etag_matches(if_none_match, etag):
+        await release(db)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    # Rows come straight from the database, they are encoded as is instead of being validated
+    # into ModelResponse objects and serialized again by the response model
+    page = await ModelController.get_models(db, limit, cursor, name, version, include_deleted, raw=True)
+    await release(db)
+    headers = {"ETag": etag}
+    if page.next_cursor is not None:
+        headers["X-Next-Cursor"] = page.next_cursor
+    return UTCORJSONResponse(page.items, headers=headers)
+
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    responses={200: {"description": "Every model as newline delimited JSON", "content": {"application/x-ndjson": {}}}},
+    response_class=StreamingResponse,
+)
+async def export_models(include_deleted: bool = False) -> StreamingResponse:
+    return StreamingResponse(
+        ModelController.export_models(stream_session, include_deleted), media_type="application/x-ndjson"
+    )
+
+@router.get(
+    "/{model_name}",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Latest (or the requested) version of a model", "model": ModelResponse},
+        304: {"description": "Nothing changed since the ETag in If-None-Match"},
+    },
+    response_model=ModelResponse,
+)
+async def get_model(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    response: Response,
+    model_name: str,
+    version: Optional[str] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> ModelResponse:
+    model = await ModelController.get_model(db, model_name, version)
+    await release(db)
+    etag = ModelController.model_etag(model)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return ModelResponse.model_validate(model, from_attributes=True)
 
 @router.post(
     "",
@@ -29,10 +97,34 @@ async def list_models(
 async def create_model(
     db: Annotated[AsyncSession, Depends(get_async_db)],
     create_model: CreateModel,
-    file: Annotated[bytes, File()],
+    file: Annotated[UploadFile, File()],
 ) -> ModelResponse:
     return await ModelController.create_model(db, create_model, file)
 
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    responses={200: {"description": "Register many models, with one result per item", "model": BulkCreateResponse}},
+    response_model=BulkCreateResponse,
+)
+async def bulk_create_models(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    manifest: Annotated[str, Form(description="JSON list of models, `artifact` names one of the uploaded files")],
+    files: Annotated[List[UploadFile], File()] = [],
+) -> BulkCreateResponse:
+    try:
+        items = TypeAdapter(List[BulkModelItem]).validate_json(manifest)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False))
+    uploads = {file.filename: file for file in files}
+
+    def open_artifact(item: BulkModelItem) -> UploadFile:
+        if item.artifact not in uploads:
+            raise FileNotFoundError(f"No uploaded file named {item.artifact}")
+        return uploads[item.artifact]
+
+    return await ModelController.bulk_create_models(db, items, open_artifact)
+
 @router.delete(
     "/{model_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -43,3 +135,16 @@ async def delete_model(
     model_id: str,
 ) -> None:
     return await ModelController.delete_model(db, model_id)
+
+@router.post(
+    "/{model_name}/predict",
+    status_code=status.HTTP_200_OK,
+    responses={200: {"description": "Run a model", "model": PredictResponse}},
+    response_model=PredictResponse,
+)
+async def predict(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    model_name: str,
+    predict_request: PredictRequest,
+) -> PredictResponse:
+    return await ModelController.predict(db, model_name, predict_request)
@@ -25,6 +25,9 @@ class AppSettings(BaseSettings):
     PROJECT_DESCRIPTION: str = config("PROJECT_DESCRIPTION", default="MoodMe backend")
     APP_VERSION: str = config("APP_VERSION", default="0.1.0")
     APP_PORT: int = config("APP_PORT", default=8000)
+    # Shared outbound HTTP client, connections are pooled and kept alive between requests
+    HTTP_CLIENT_TIMEOUT: float = config("HTTP_CLIENT_TIMEOUT", default=5.0)
+    HTTP_CLIENT_MAX_CONNECTIONS: int = config("HTTP_CLIENT_MAX_CONNECTIONS", default=100)
 
 
 class AWSSettings(BaseSettings):
@@ -36,18 +39,99 @@ class AWSSettings(BaseSettings):
 
 
 class DatabaseSettings(BaseSettings):
-    pass
+    # "queue" or "null", empty picks "null" on Lambda and "queue" elsewhere
+    DB_POOL_MODE: str = config("DB_POOL_MODE", default="")
+    DB_POOL_SIZE: int = config("DB_POOL_SIZE", default=5)
+    DB_MAX_OVERFLOW: int = config("DB_MAX_OVERFLOW", default=10)
+    DB_POOL_TIMEOUT: float = config("DB_POOL_TIMEOUT", default=30.0)
+    DB_POOL_RECYCLE: int = config("DB_POOL_RECYCLE", default=1800)
+    DB_POOL_PRE_PING: bool = config("DB_POOL_PRE_PING", default=True)
+    DB_STATEMENT_TIMEOUT_MS: int = config("DB_STATEMENT_TIMEOUT_MS", default=0)
+    # Behind pgbouncer in transaction mode, disables prepared statement caching
+    DB_PGBOUNCER: bool = config("DB_PGBOUNCER", default=False)
 
 
 class SecuritySettings(BaseSettings):
     PRIVATE_KEY_PATH: str = config("PRIVATE_KEY_PATH", default="./certs/privkey.pem")
     JWT_SECRET_KEY: str = config("JWT_SECRET_KEY", default="n0ts3cr3t")
+    # HS256 uses JWT_SECRET_KEY, RS256 signs with PRIVATE_KEY_PATH (checked at startup) and
+    # publishes /.well-known/jwks.json
+    JWT_ALGORITHM: str = config("JWT_ALGORITHM", default="HS256")
+    # Comma separated public keys retired by a rotation, they verify until their tokens expire
+    JWT_PREVIOUS_PUBLIC_KEYS: str = config("JWT_PREVIOUS_PUBLIC_KEYS", default="")
+    JWKS_MAX_AGE: int = config("JWKS_MAX_AGE", default=300)
     JWT_EXPIRATION_MINUTES: int = config("JWT_EXPIRATION_MINUTES", default=60)
+    # bcrypt runs on its own pool, "process" or "thread" (only with the bcrypt package installed)
+    PASSWORD_HASHER_MODE: str = config("PASSWORD_HASHER_MODE", default="process")
+    PASSWORD_HASHER_WORKERS: int = config("PASSWORD_HASHER_WORKERS", default=0)
+    # Hashes queued or running before logins and signups are shed with a 503
+    PASSWORD_HASHER_MAX_PENDING: int = config("PASSWORD_HASHER_MAX_PENDING", default=32)
+    # Trust the signed claims for identity, users come from a TTL cache and revoked tokens
+    # from a denylist reloaded in bulk, instead of a users query per request
+    JWT_STATELESS_VALIDATION: bool = config("JWT_STATELESS_VALIDATION", default=True)
+    AUTH_USER_CACHE_TTL: float = config("AUTH_USER_CACHE_TTL", default=60.0)
+    AUTH_USER_CACHE_MAX_ENTRIES: int = config("AUTH_USER_CACHE_MAX_ENTRIES", default=10000)
+    TOKEN_DENYLIST_REFRESH_SECONDS: float = config("TOKEN_DENYLIST_REFRESH_SECONDS", default=10.0)
+    # Claims of verified tokens kept until they expire, repeated bearer tokens skip verification
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = config("AUTH_TOKEN_CACHE_MAX_ENTRIES", default=10000)
+    AUTH_TOKEN_CACHE_MAX_BYTES: int = config("AUTH_TOKEN_CACHE_MAX_BYTES", default=16 * 1024 * 1024)
+    # ID tokens of these providers are accepted as bearer tokens, a provider without a client id is off
+    GOOGLE_CLIENT_ID: str = config("GOOGLE_CLIENT_ID", default="")
+    GOOGLE_JWKS_URL: str = config("GOOGLE_JWKS_URL", default="https://www.googleapis.com/oauth2/v3/certs")
+    FACEBOOK_APP_ID: str = config("FACEBOOK_APP_ID", default="")
+    FACEBOOK_JWKS_URL: str = config(
+        "FACEBOOK_JWKS_URL", default="https://limited.facebook.com/.well-known/oauth/openid/jwks/"
+    )
+    # Provider keys are kept as long as their Cache-Control allows, this long without one
+    OAUTH_JWKS_DEFAULT_TTL: float = config("OAUTH_JWKS_DEFAULT_TTL", default=3600.0)
+    # An unknown kid refetches the keys early, at most this often
+    OAUTH_JWKS_MIN_REFRESH_SECONDS: float = config("OAUTH_JWKS_MIN_REFRESH_SECONDS", default=60.0)
+    OAUTH_NEGATIVE_CACHE_TTL: float = config("OAUTH_NEGATIVE_CACHE_TTL", default=30.0)
+    OAUTH_NEGATIVE_CACHE_MAX_ENTRIES: int = config("OAUTH_NEGATIVE_CACHE_MAX_ENTRIES", default=10000)
 
 
 class StorageSettings(BaseSettings):
     STORAGE_PATH: str = config("STORAGE_PATH", default="/tmp")
     MODEL_PATH: str = config("MODEL_PATH", default="/tmp/models")
+    MODEL_CACHE_MAX_BYTES: int = config("MODEL_CACHE_MAX_BYTES", default=10 * 1024 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE: int = config("UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024)
+    UPLOAD_STAGING_PREFIX: str = config("UPLOAD_STAGING_PREFIX", default="uploads")
+    MODEL_BLOB_PREFIX: str = config("MODEL_BLOB_PREFIX", default="blobs/sha256")
+    DOWNLOAD_PART_SIZE: int = config("DOWNLOAD_PART_SIZE", default=16 * 1024 * 1024)
+    DOWNLOAD_CONCURRENCY: int = config("DOWNLOAD_CONCURRENCY", default=8)
+    # Artifacts uploaded at the same time by a bulk registration
+    MODEL_BULK_UPLOAD_CONCURRENCY: int = config("MODEL_BULK_UPLOAD_CONCURRENCY", default=8)
+    MODEL_ARCHIVE_MAX_MEMBERS: int = config("MODEL_ARCHIVE_MAX_MEMBERS", default=10000)
+    MODEL_ARCHIVE_MAX_MEMBER_BYTES: int = config("MODEL_ARCHIVE_MAX_MEMBER_BYTES", default=4 * 1024 * 1024 * 1024)
+    MODEL_ARCHIVE_MAX_TOTAL_BYTES: int = config("MODEL_ARCHIVE_MAX_TOTAL_BYTES", default=10 * 1024 * 1024 * 1024)
+
+
+class InferenceSettings(BaseSettings):
+    INFERENCE_SESSION_CACHE_MAX_BYTES: int = config("INFERENCE_SESSION_CACHE_MAX_BYTES", default=2 * 1024 * 1024 * 1024)
+    INFERENCE_WARMUP: bool = config("INFERENCE_WARMUP", default=True)
+    INFERENCE_INTRA_OP_THREADS: int = config("INFERENCE_INTRA_OP_THREADS", default=0)
+    # Optimize models once when they enter the artifact cache and memory-map their weights
+    INFERENCE_MMAP_WEIGHTS: bool = config("INFERENCE_MMAP_WEIGHTS", default=True)
+    INFERENCE_BATCHING_ENABLED: bool = config("INFERENCE_BATCHING_ENABLED", default=True)
+    # Defaults, a model can override them with "max_batch_size" / "max_batch_wait_ms" in its details
+    INFERENCE_MAX_BATCH_SIZE: int = config("INFERENCE_MAX_BATCH_SIZE", default=32)
+    INFERENCE_MAX_BATCH_WAIT_MS: float = config("INFERENCE_MAX_BATCH_WAIT_MS", default=5.0)
+    # "thread" runs sessions in this process, "process" in a pool of worker processes
+    INFERENCE_EXECUTION_MODE: str = config("INFERENCE_EXECUTION_MODE", default="thread")
+    INFERENCE_PROCESS_WORKERS: int = config("INFERENCE_PROCESS_WORKERS", default=0)
+    # One CPU list per worker separated by semicolons, e.g. "0-1;2-3"
+    INFERENCE_CPU_AFFINITY: str = config("INFERENCE_CPU_AFFINITY", default="")
+
+
+class CacheSettings(BaseSettings):
+    # In-process cache of model records, invalidated across nodes through LISTEN/NOTIFY
+    MODEL_METADATA_CACHE_ENABLED: bool = config("MODEL_METADATA_CACHE_ENABLED", default=True)
+    MODEL_METADATA_CACHE_TTL: float = config("MODEL_METADATA_CACHE_TTL", default=60.0)
+    MODEL_METADATA_CACHE_MAX_ENTRIES: int = config("MODEL_METADATA_CACHE_MAX_ENTRIES", default=4096)
+    MODEL_METADATA_CACHE_CHANNEL: str = config("MODEL_METADATA_CACHE_CHANNEL", default="aimodel_changed")
+    # Direct connection to Postgres for LISTEN, defaults to POSTGRES_ASYNC_URI. Required with
+    # DB_PGBOUNCER, notifications do not go through pgbouncer in transaction mode.
+    MODEL_METADATA_CACHE_LISTEN_URI: str = config("MODEL_METADATA_CACHE_LISTEN_URI", default="")
 
 
 class PostgresSettings(DatabaseSettings):
@@ -57,6 +141,10 @@ class PostgresSettings(DatabaseSettings):
     POSTGRES_PORT: int = config("POSTGRES_PORT", default=5432)
     POSTGRES_DB: str = config("POSTGRES_DB", default="postgres")
     POSTGRES_ASYNC_URI: PostgresDsn | str = config("POSTGRES_ASYNC_URI", default="")
+    # Comma separated read replica URIs, GET requests read from them when set
+    POSTGRES_REPLICA_URIS: str = config("POSTGRES_REPLICA_URIS", default="")
+    DB_REPLICA_MAX_LAG_SECONDS: float = config("DB_REPLICA_MAX_LAG_SECONDS", default=5.0)
+    DB_REPLICA_CHECK_INTERVAL: float = config("DB_REPLICA_CHECK_INTERVAL", default=5.0)
 
     @field_validator("POSTGRES_ASYNC_URI", mode="after")
     def assemble_db_connection(cls, v: str | None, info: ValidationInfo) -> Any:
@@ -78,7 +166,7 @@ class CORSSettings(BaseSettings):
     CORS_ALLOW_METHODS: List[str] | str = config("CORS_ALLOW_METHODS", default="*").upper().split(",")  # fmt: skip
     CORS_ALLOW_HEADERS: List[str] | str = config("CORS_ALLOW_HEADERS", default="*").split(",")
     CORS_ALLOW_CREDENTIALS: bool = config("CORS_ALLOW_CREDENTIALS", default="False").lower() == "true"  # fmt: skip
-    CORS_EXPOSE_HEADERS: List[str] | str = config("CORS_EXPOSE_HEADERS", default="").split(",")
+    CORS_EXPOSE_HEADERS: List[str] | str = config("CORS_EXPOSE_HEADERS", default="X-Next-Cursor,ETag").split(",")
     CORS_MAX_AGE: int = int(config("CORS_MAX_AGE", default="600"))
 
 
@@ -99,6 +187,8 @@ class Settings(
     SecuritySettings,
     PostgresSettings,
     StorageSettings,
+    InferenceSettings,
+    CacheSettings,
     CORSSettings,
     EnvironmentSettings,
 ):
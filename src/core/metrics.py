@@ -0,0 +1,138 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Labels = Dict[str, str]
+
+
+class Counter:
+    def __init__(self, name: str, labels: Labels):
+        self.name = name
+        self.labels = labels
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict:
+        return {"type": "counter", "name": self.name, "labels": self.labels, "value": self._value}
+
+
+class Gauge:
+    """
+    Either set explicitly or backed by a callback evaluated when the metrics are read
+    """
+
+    def __init__(self, name: str, labels: Labels, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.labels = labels
+        self._value = 0.0
+        self._fn = fn
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self._fn() if self._fn is not None else self._value
+
+    def snapshot(self) -> Dict:
+        return {"type": "gauge", "name": self.name, "labels": self.labels, "value": self.value}
+
+
+class Histogram:
+    def __init__(self, name: str, labels: Labels, buckets: Sequence[float]):
+        self.name = name
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip([*self.buckets, float("inf")], self._counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {
+                "type": "histogram",
+                "name": self.name,
+                "labels": self.labels,
+                "count": self._count,
+                "sum": self._sum,
+                "buckets": buckets,
+            }
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics, looked up by name and labels so callers can re-request them freely
+    """
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, labels: Optional[Labels], factory: Callable[[Labels], object]):
+        labels = labels or {}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = factory(labels)
+            return metric
+
+    def counter(self, name: str, labels: Optional[Labels] = None) -> Counter:
+        return self._get_or_create(name, labels, lambda labels: Counter(name, labels))
+
+    def gauge(self, name: str, labels: Optional[Labels] = None, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get_or_create(name, labels, lambda labels: Gauge(name, labels, fn))
+
+    def histogram(self, name: str, buckets: Sequence[float], labels: Optional[Labels] = None) -> Histogram:
+        return self._get_or_create(name, labels, lambda labels: Histogram(name, labels, buckets))
+
+    def unregister(self, name: str, labels: Optional[Labels] = None) -> None:
+        with self._lock:
+            self._metrics.pop((name, tuple(sorted((labels or {}).items()))), None)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.snapshot() for metric in metrics]
+
+
+metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return metrics
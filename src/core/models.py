@@ -63,7 +63,6 @@ class SoftDeleteMixin(SQLModel):
     )
     is_deleted: bool = Field(
         default=False,
-        index=True,
         description="Flag indicating whether the record is deleted (soft deletion)",
     )
 
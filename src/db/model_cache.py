@@ -0,0 +1,329 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import get_settings
+from core.logger import logging
+from core.metrics import get_metrics
+from db.models.ai_models import AiModel
+from db.models.registry_version import RegistryVersion
+
+logger = logging.getLogger(__name__)
+
+# (name, version), a None version stands for the latest version of the model
+CacheKey = Tuple[str, Optional[str]]
+
+
+class ModelMetadataCache:
+    """
+    TTL + LRU cache of model records keyed by name and version.
+
+    Records are kept as column values and every hit returns a new detached `AiModel`, so callers
+    never share an instance. Entries are dropped by model name when a change is committed,
+    here or on another node (see `ModelCacheListener`). While `suspended`, e.g. when the
+    notification connection is down, every lookup is a miss.
+
+    A replica may not have replayed a change yet when the invalidation arrives, so for
+    `replica_lag` seconds after it records read from a replica are not stored.
+
+    `version` follows the shared registry version (see `RegistryVersion`) through the same
+    changes, it is unknown until read from the database and again after notifications were lost.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, replica_lag: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.replica_lag = replica_lag
+        self.suspended = False
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict]]" = OrderedDict()
+        self._by_name: Dict[str, Set[CacheKey]] = {}
+        # Bumped on every invalidation, a lookup that raced with one must not store its result
+        self._epochs: Dict[str, int] = {}
+        self._epoch = 0
+        # When each name, or everything, was last invalidated
+        self._invalidated_at: Dict[str, float] = {}
+        self._cleared_at = float("-inf")
+        self.version: Optional[int] = None
+        self._lock = threading.Lock()
+
+        registry = get_metrics()
+        self.hits = registry.counter("model_metadata_cache_hits_total")
+        self.misses = registry.counter("model_metadata_cache_misses_total")
+        self.invalidations = registry.counter("model_metadata_cache_invalidations_total")
+        registry.gauge("model_metadata_cache_entries", fn=lambda: len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def token(self, name: str) -> Tuple[int, int]:
+        """
+        Taken before querying the database, handed back to `put`
+        """
+        with self._lock:
+            return self._epoch, self._epochs.get(name, 0)
+
+    def get(self, key: CacheKey) -> Optional[AiModel]:
+        with self._lock:
+            entry = None if self.suspended else self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        self.hits.inc()
+        return AiModel(**entry[1])
+
+    def put(self, key: CacheKey, model: AiModel, token: Tuple[int, int], replica: bool = False) -> None:
+        """
+        Store a record read after taking `token`, `replica` when it was read from a read replica
+        """
+        values = {column.name: getattr(model, column.name) for column in AiModel.__table__.columns}
+        with self._lock:
+            if self.suspended or token != (self._epoch, self._epochs.get(key[0], 0)):
+                return
+            if replica and self._replica_may_lag(key[0]):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            self._by_name.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def registry_version(self) -> Tuple[Optional[int], int]:
+        """
+        The registry version if known, and a token for `learn_version` when it is not
+        """
+        with self._lock:
+            return (None if self.suspended else self.version), self._epoch
+
+    def learn_version(self, version: int, epoch: int) -> None:
+        """
+        Store a registry version read from the primary after `registry_version` returned `epoch`
+        """
+        with self._lock:
+            # Changes committed after the read are notified, unless the connection dropped since
+            if not self.suspended and epoch == self._epoch:
+                self.version = max(self.version or 0, version)
+
+    def invalidate(self, names: Iterable[str], version: Optional[int] = None) -> None:
+        with self._lock:
+            if version is not None and self.version is not None:
+                self.version = max(self.version, version)
+            now = time.monotonic()
+            for name in names:
+                self._epochs[name] = self._epochs.get(name, 0) + 1
+                self._invalidated_at[name] = now
+                for key in self._by_name.pop(name, ()):
+                    self._entries.pop(key, None)
+                self.invalidations.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self.version = None
+            self._epochs.clear()
+            self._invalidated_at.clear()
+            self._cleared_at = time.monotonic()
+            self._entries.clear()
+            self._by_name.clear()
+
+    def _replica_may_lag(self, name: str) -> bool:
+        cutoff = time.monotonic() - self.replica_lag
+        if self._cleared_at > cutoff:
+            return True
+        invalidated_at = self._invalidated_at.get(name)
+        if invalidated_at is None:
+            return False
+        if invalidated_at > cutoff:
+            return True
+        del self._invalidated_at[name]
+        return False
+
+    def _remove(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_name.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_name[key[0]]
+
+
+def mark_models_changed(db: AsyncSession, *names: str) -> None:
+    """
+    Drop the cached records of these models once the session commits, on every node
+    """
+    db.info.setdefault("changed_models", set()).update(names)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_model_changes(session: Session) -> None:
+    names = session.info.get("changed_models")
+    if not names:
+        return
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    # Changes to the registry queue on this row until they commit, versions follow commit order
+    bump = (
+        insert(RegistryVersion)
+        .values(id=1, version=1)
+        .on_conflict_do_update(index_elements=["id"], set_={"version": RegistryVersion.version + 1})
+        .returning(RegistryVersion.version)
+    )
+    version = session.execute(bump).scalar_one()
+    session.info["registry_version"] = version
+    if dialect != "postgresql":
+        return
+    # NOTIFY is transactional, other nodes only hear about the change once it is visible
+    channel = get_settings().MODEL_METADATA_CACHE_CHANNEL
+    for name in sorted(names):
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": f"{version}:{name}"})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_model_changes(session: Session) -> None:
+    names = session.info.pop("changed_models", None)
+    version = session.info.pop("registry_version", None)
+    if names and _model_cache is not None:
+        _model_cache.invalidate(names, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_model_changes(session: Session) -> None:
+    session.info.pop("changed_models", None)
+    session.info.pop("registry_version", None)
+
+
+class ModelCacheListener:
+    """
+    Keeps a dedicated connection LISTENing on the invalidation channel and drops the names it is
+    notified about. Notifications sent while disconnected are lost, so the cache is suspended
+    until the connection is back and then starts over empty.
+    """
+
+    def __init__(self, dsn: str, channel: str, cache: ModelMetadataCache, keepalive: float = 30.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.cache = cache
+        self.keepalive = keepalive
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.cache.suspended = True
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, _connection, _pid: int, _channel: str, payload: str) -> None:
+        # "<registry version>:<model name>"
+        version, _, name = payload.partition(":")
+        self.cache.invalidate([name], int(version))
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except Exception as e:
+                logger.error(f"Model cache listener could not connect: {e}")
+                await asyncio.sleep(self.keepalive)
+                continue
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _connection: lost.set())
+            try:
+                await connection.add_listener(self.channel, self._on_notify)
+                self.cache.clear()
+                self.cache.suspended = False
+                logger.info(f"Listening for model changes on {self.channel}")
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.keepalive)
+                    except asyncio.TimeoutError:
+                        # A half-open connection only shows up when something is sent
+                        await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Model cache listener lost its connection: {e}")
+            finally:
+                self.cache.suspended = True
+                if not connection.is_closed():
+                    connection.terminate()
+
+
+_model_cache: Optional[ModelMetadataCache] = None
+_listener: Optional[ModelCacheListener] = None
+
+
+def get_model_cache() -> Optional[ModelMetadataCache]:
+    """
+    The process wide cache, None when MODEL_METADATA_CACHE_ENABLED is off or when it could not
+    hear about changes: behind pgbouncer without MODEL_METADATA_CACHE_LISTEN_URI
+    """
+    global _model_cache
+    settings = get_settings()
+    if not settings.MODEL_METADATA_CACHE_ENABLED or _listen_url(settings) is None:
+        return None
+    if _model_cache is None:
+        # A replica serving reads is at most this far behind, the lag is checked periodically
+        replica_lag = settings.DB_REPLICA_MAX_LAG_SECONDS + settings.DB_REPLICA_CHECK_INTERVAL
+        _model_cache = ModelMetadataCache(
+            settings.MODEL_METADATA_CACHE_MAX_ENTRIES, settings.MODEL_METADATA_CACHE_TTL, replica_lag
+        )
+    return _model_cache
+
+
+def _listen_url(settings) -> Optional[URL]:
+    """
+    Where to LISTEN for changes, None behind pgbouncer without a direct connection
+    """
+    if settings.MODEL_METADATA_CACHE_LISTEN_URI:
+        return make_url(settings.MODEL_METADATA_CACHE_LISTEN_URI)
+    if settings.DB_PGBOUNCER:
+        return None
+    return make_url(str(settings.POSTGRES_ASYNC_URI))
+
+
+def start_model_cache_listener() -> None:
+    """
+    Start listening for changes made by other nodes. Only Postgres has LISTEN/NOTIFY, other
+    databases are expected to be used by a single process.
+    """
+    global _listener
+    settings = get_settings()
+    url = _listen_url(settings)
+    if url is None and settings.MODEL_METADATA_CACHE_ENABLED:
+        logger.warning(
+            "Model metadata cache disabled: LISTEN does not work through pgbouncer, "
+            "set MODEL_METADATA_CACHE_LISTEN_URI to a direct Postgres connection"
+        )
+    cache = get_model_cache()
+    if cache is None or _listener is not None or not url.drivername.startswith("postgresql"):
+        return
+    dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+    _listener = ModelCacheListener(dsn, settings.MODEL_METADATA_CACHE_CHANNEL, cache)
+    _listener.start()
+
+
+async def stop_model_cache_listener() -> None:
+    global _listener
+    if _listener is not None:
+        await _listener.stop()
+        _listener = None
@@ -1,2 +1,4 @@
 from .user import User
 from .ai_models import AiModel
+from .token_revocation import TokenRevocation
+from .registry_version import RegistryVersion
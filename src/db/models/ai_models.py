@@ -1,6 +1,6 @@
 from typing import Optional, Dict
 from sqlmodel import Field
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index, false
 
 
 
@@ -24,3 +24,24 @@ class AiModel(
     version: str = Field(..., description="The version of the model")
     details: dict = Field(sa_column=Column(JSON), default={})
     sha256: str = Field(..., description="The SHA256 hash of the model")
+
+
+# Queries must spell the soft delete filter as `AiModel.is_deleted == false()`, a literal the
+# planner can match against these partial indexes, a bound parameter would not match them
+Index("uq_aimodel_name_version", AiModel.name, AiModel.version, unique=True)
+# Latest version of a model
+Index(
+    "ix_aimodel_live_name_created_at",
+    AiModel.name,
+    AiModel.created_at,
+    postgresql_where=AiModel.is_deleted == false(),
+    sqlite_where=AiModel.is_deleted == false(),
+)
+# Keyset pagination walks the registry in (created_at, id) order
+Index(
+    "ix_aimodel_live_created_at_id",
+    AiModel.created_at,
+    AiModel.id,
+    postgresql_where=AiModel.is_deleted == false(),
+    sqlite_where=AiModel.is_deleted == false(),
+)
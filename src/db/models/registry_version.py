@@ -0,0 +1,16 @@
+from sqlmodel import Field, BigInteger
+
+from src.core.common import Base
+
+class RegistryVersion(
+    Base,
+    table=True
+):
+    """
+    Single row counting the committed changes to the model registry, bumped in the transaction
+    of every change so each node and replica derives the same listing ETag from it
+    """
+    __tablename__ = "registry_version"
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0, sa_type=BigInteger, description="Number of committed registry changes")
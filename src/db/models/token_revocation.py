@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, DateTime
+
+from src.core.common import (
+    UUIDMixin,
+    Base,
+)
+
+class TokenRevocation(
+    Base,
+    UUIDMixin,
+    table=True
+):
+    """
+    Either one token (`jti`) or every token of a user issued up to `revoked_at` (`subject`)
+    """
+    __tablename__ = "token_revocations"
+
+    jti: Optional[str] = Field(default=None, max_length=64, index=True, description="Revoked token id")
+    subject: Optional[str] = Field(default=None, max_length=255, description="Email whose tokens are revoked")
+    revoked_at: datetime = Field(sa_type=DateTime(timezone=True), description="When the revocation was made")
+    expires_at: datetime = Field(
+        sa_type=DateTime(timezone=True), index=True, description="Once the revoked tokens expire the row can go"
+    )
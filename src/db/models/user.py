@@ -1,5 +1,6 @@
 from typing import Optional, List
 from sqlmodel import Field, Relationship
+from sqlalchemy import Index
 
 from src.core.common import (
     SoftDeleteMixin,
@@ -25,3 +26,5 @@ class User(
         nullable=False, description="Hashed password for user auth"
     )
 
+
+Index("uq_users_email", User.email, unique=True)
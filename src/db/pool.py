@@ -0,0 +1,135 @@
+import os
+import time
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from core.config import get_settings
+from core.logger import logging
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_WAIT_MS_BUCKETS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 30000]
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool reporting how long checkouts wait and how often they time out
+    """
+
+    def __init__(self, *args, pool_name: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_name = None
+        if pool_name is not None:
+            self.instrument(pool_name)
+
+    def instrument(self, pool_name: str) -> None:
+        self.pool_name = pool_name
+        registry = get_metrics()
+        labels = {"pool": pool_name}
+        self.wait_ms = registry.histogram("db_pool_wait_ms", POOL_WAIT_MS_BUCKETS, labels)
+        self.timeouts = registry.counter("db_pool_timeouts_total", labels)
+        gauges = {
+            "db_pool_size": self.size,
+            "db_pool_checked_out": self.checkedout,
+            "db_pool_checked_in": self.checkedin,
+            "db_pool_overflow": lambda: max(self.overflow(), 0),
+        }
+        for name, fn in gauges.items():
+            # A recreated pool replaces the callbacks of the one it succeeds
+            registry.unregister(name, labels)
+            registry.gauge(name, labels, fn=fn)
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # Called on engine.dispose(), keep the name so the metrics carry over
+        return self.__class__(
+            self._creator,
+            pool_size=self._pool.maxsize,
+            max_overflow=self._max_overflow,
+            pre_ping=self._pre_ping,
+            use_lifo=self._pool.use_lifo,
+            timeout=self._timeout,
+            recycle=self._recycle,
+            echo=self.echo,
+            logging_name=self._orig_logging_name,
+            reset_on_return=self._reset_on_return,
+            _dispatch=self.dispatch,
+            dialect=self._dialect,
+            pool_name=self.pool_name,
+        )
+
+    def connect(self):
+        if self.pool_name is None:
+            return super().connect()
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts.inc()
+            raise
+        finally:
+            self.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+
+def pool_mode() -> str:
+    """
+    "queue" keeps connections open in the process, "null" opens one per checkout. Left empty
+    it is "null" on Lambda, where a frozen container cannot return its connections.
+    """
+    mode = get_settings().DB_POOL_MODE
+    if mode:
+        return mode
+    return "null" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "queue"
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Keyword arguments of `create_async_engine` for `url` according to the database settings
+    """
+    settings = get_settings()
+    options: Dict[str, Any] = {"echo": False, "future": True, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if pool_mode() == "null":
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_use_lifo=True,
+        )
+
+    if make_url(url).get_driver_name() != "asyncpg":
+        return options
+    connect_args: Dict[str, Any] = {}
+    if settings.DB_PGBOUNCER:
+        # Transaction pooling hands each transaction to any server connection, named prepared
+        # statements cannot be cached and must not collide between clients
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            # Startup parameters are not forwarded by pgbouncer, time out on the client instead
+            connect_args["command_timeout"] = settings.DB_STATEMENT_TIMEOUT_MS / 1000
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def create_engine(url: str, pool_name: str = "primary") -> AsyncEngine:
+    options = engine_options(url)
+    if get_settings().DB_PGBOUNCER and make_url(url).get_driver_name() == "asyncpg":
+        # SQLAlchemy keeps its own prepared statement cache on top of asyncpg's
+        url = make_url(url).update_query_dict({"prepared_statement_cache_size": "0"})
+    logger.info(f"Creating {pool_mode()} pool engine for {pool_name}")
+    engine = create_async_engine(url, **options)
+    if isinstance(engine.sync_engine.pool, InstrumentedQueuePool):
+        engine.sync_engine.pool.instrument(pool_name)
+    return engine
@@ -0,0 +1,94 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.logger import logging
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind, 0 when it has replayed everything it received (an idle
+# primary does not advance the replay timestamp, which would otherwise read as lag)
+POSTGRES_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    # Unknown until the first check, a replica is trusted until it says otherwise
+    lag: float = 0.0
+    checked_at: float = field(default=0.0)
+
+
+class ReplicaSet:
+    """
+    Read replicas handed out round robin, skipping those lagging more than `max_lag` seconds.
+
+    Lag is measured in the background every `check_interval` seconds, callers never wait on
+    it. A replica that cannot be reached counts as infinitely behind until the next check.
+    `pick` returns None when no replica is fit, reads then go to the primary.
+    """
+
+    def __init__(self, replicas: List[Replica], max_lag: float, check_interval: float):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cycle = itertools.cycle(replicas) if replicas else None
+        self._check: Optional[asyncio.Task] = None
+        registry = get_metrics()
+        for replica in replicas:
+            registry.gauge("db_replica_lag_seconds", {"pool": replica.name}, fn=lambda replica=replica: replica.lag)
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        self._schedule_check()
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.lag <= self.max_lag:
+                return replica
+        return None
+
+    def _schedule_check(self) -> None:
+        stale = any(time.monotonic() - r.checked_at >= self.check_interval for r in self.replicas)
+        if stale and (self._check is None or self._check.done()):
+            self._check = asyncio.ensure_future(self.check())
+
+    async def check(self) -> None:
+        await asyncio.gather(*[self._check_replica(replica) for replica in self.replicas])
+
+    async def _check_replica(self, replica: Replica) -> None:
+        try:
+            replica.lag = await self.measure_lag(replica.engine)
+        except Exception as e:
+            replica.lag = float("inf")
+            logger.error(f"Replica {replica.name} is unreachable: {e}")
+        replica.checked_at = time.monotonic()
+        if replica.lag > self.max_lag:
+            logger.warning(f"Replica {replica.name} is {replica.lag:.1f}s behind, reading from the primary")
+
+    async def measure_lag(self, engine: AsyncEngine) -> float:
+        if engine.dialect.name != "postgresql":
+            return 0.0
+        async with engine.connect() as conn:
+            return float((await conn.execute(POSTGRES_LAG_QUERY)).scalar() or 0.0)
+
+    async def dispose(self) -> None:
+        await asyncio.gather(*[replica.engine.dispose() for replica in self.replicas])
@@ -1,11 +1,17 @@
+from typing import Dict
+
 # Third-Party Dependencies
+from fastapi import Request
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session, sessionmaker
 
 # Local Dependencies
 from src.core.config import settings
 from src.core.logger import logging
+from db.pool import create_engine
+from db.replicas import Replica, ReplicaSet
 
 logger = logging.getLogger(__name__)
 
@@ -13,25 +19,109 @@ logger = logging.getLogger(__name__)
 # Define the database URI and URL based on the application settings
 POSTGRES_ASYNC_URI = f"{settings.POSTGRES_ASYNC_URI}"
 
-# Create an async database engine
-async_engine = create_async_engine(POSTGRES_ASYNC_URI, echo=False, future=True)
+# Create an async database engine, pooling is tuned through DatabaseSettings
+async_engine = create_engine(POSTGRES_ASYNC_URI)
 
 # Create a local session class using the async engine
 local_session = sessionmaker(
     bind=async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Read replicas, GET requests are served from them while they keep up with the primary
+replica_set = ReplicaSet(
+    [
+        Replica(name=f"replica-{i}", engine=create_engine(uri, pool_name=f"replica-{i}"))
+        for i, uri in enumerate(uri.strip() for uri in settings.POSTGRES_REPLICA_URIS.split(",") if uri.strip())
+    ],
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+)
+
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_replica_writes(session: Session, _flush_context, _instances) -> None:
+    if session.info.get("read_only"):
+        raise RuntimeError("Attempted to write through a read-only replica session")
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session: Session, _flush_context) -> None:
+    session.info["written"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _mark_clean(session: Session) -> None:
+    session.info.pop("written", None)
 
-# Define an async function to get the database session
-async def get_async_db() -> AsyncSession:
-    logger.info(f"Creating session with engine URL")
 
-    async_session = local_session
+def needs_commit(db: AsyncSession) -> bool:
+    """
+    Whether the session wrote (or has pending writes) since its last commit
+    """
+    return bool(db.info.get("written") or db.new or db.dirty or db.deleted)
+
+
+async def release(db: AsyncSession) -> None:
+    """
+    Finish the unit of work early: commit pending writes and hand the connection back to the
+    pool, so it is not held while the response is serialized. Loaded objects stay usable.
+    """
+    if needs_commit(db):
+        await db.commit()
+    await db.close()
+
+
+_autocommit_engines: Dict[AsyncEngine, AsyncEngine] = {}
+
+
+def read_session(engine: AsyncEngine, read_only: bool = False) -> AsyncSession:
+    """
+    Session for read requests. Statements run in autocommit mode, no BEGIN/COMMIT round trips
+    are spent on a request that only reads.
+    """
+    autocommit = _autocommit_engines.get(engine)
+    if autocommit is None:
+        autocommit = _autocommit_engines[engine] = engine.execution_options(isolation_level="AUTOCOMMIT")
+    return AsyncSession(bind=autocommit, expire_on_commit=False, info={"read_only": read_only})
+
+
+def stream_session() -> AsyncSession:
+    """
+    Session for long reads streamed with a server-side cursor, outside of any request
+    dependency. Cursors live in a transaction, so unlike `read_session` this is not autocommit.
+    """
+    replica = replica_set.pick()
+    engine = replica.engine if replica is not None else local_session.kw["bind"]
+    return AsyncSession(bind=engine, expire_on_commit=False, info={"read_only": replica is not None})
+
+
+# Define an async function to get the database session
+async def get_async_db(request: Request) -> AsyncSession:
+    if request.method in READ_ONLY_METHODS:
+        replica = replica_set.pick()
+        engine = replica.engine if replica is not None else local_session.kw["bind"]
+        async with read_session(engine, read_only=replica is not None) as db:
+            yield db
+            if needs_commit(db):
+                await db.commit()
+        return
 
-    async with async_session() as db:
+    # Transactions start with the first statement, a request that never touches the
+    # database never checks a connection out
+    async with local_session() as db:
         try:
             yield db
-            await db.commit()
+            if needs_commit(db):
+                await db.commit()
         except Exception as e:
             await db.rollback()
             raise e
@@ -1,29 +1,170 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy import false, tuple_
 from db.models.ai_models import AiModel
+from db.models.registry_version import RegistryVersion
+from db.model_cache import get_model_cache, mark_models_changed
 from utils.validators import is_valid_path_or_url, validate_uploaded_file
-from fastapi import UploadFile, File
-from typing import Optional, Dict, Annotated, List
+from fastapi import UploadFile, HTTPException, status
+from typing import Optional, Dict, AsyncIterator, BinaryIO, Callable, List, Union
+import asyncio
+import math
+import numpy as np
+import orjson
+from sqlalchemy.dialects import postgresql, sqlite
 
-from utils.net_utils import upload_from_file
+from utils.net_utils import object_exists, upload_blob
+from utils.storage_utils import get_blob_key, is_sha256
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+from utils.responses import ORJSON_OPTIONS
+from core.config import get_settings
+from core.logger import logging
+from server.inference.batcher import get_batcher, get_runner
+from server.inference.session_cache import LoadedModel, find_model_file, get_session_cache
+from server.tasks.model_tasks import fetch_model
 from .schemas import (
     ModelResponse,
-    CreateModel
+    ModelPage,
+    CreateModel,
+    BulkModelItem,
+    BulkItemResult,
+    BulkCreateResponse,
+    PredictRequest,
+    PredictResponse,
 )
 
 
+# Only the columns a ModelResponse needs, selected as plain rows instead of ORM objects
+MODEL_LIST_COLUMNS = [getattr(AiModel, name) for name in ModelResponse.model_fields]
+# Rows per INSERT statement of a bulk registration, well under the bind parameter limits
+BULK_INSERT_BATCH = 500
+# Rows fetched from the server-side cursor, and written to the response, at a time
+EXPORT_BATCH = 1000
+
+ArtifactOpener = Callable[[BulkModelItem], Union[UploadFile, BinaryIO]]
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_option(details: Dict, name: str, default: float, cast: Callable, minimum: float) -> float:
+    """
+    Batching option from the model details, the setting when it is missing or invalid
+    """
+    if name not in details:
+        return default
+    try:
+        value = cast(details[name])
+    except (TypeError, ValueError, OverflowError):
+        value = None
+    if value is None or not math.isfinite(value) or value < minimum:
+        logger.warning(f"Ignoring invalid {name}={details[name]!r} in the model details, using {default}")
+        return default
+    return value
+
+
 class ModelController:
     @staticmethod
-    async def get_models(db: AsyncSession) -> List[ModelResponse]:
-        query = select(AiModel)
-        models = await db.exec(query)
-        return [ModelResponse(**model.model_dump()) for model in models]
+    async def get_models(
+        db: AsyncSession,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        name: Optional[str] = None,
+        version: Optional[str] = None,
+        include_deleted: bool = False,
+        raw: bool = False,
+    ) -> ModelPage:
+        """
+        One page of models ordered by (created_at, id), `cursor` continues after the previous page.
+
+        With `raw` the items are the plain column dicts read from the database, no `ModelResponse`
+        is built, for routes that encode them straight to JSON.
+        """
+        try:
+            after = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        # A name and version select at most one live model, served from the metadata cache
+        single = name is not None and version is not None and after is None and not include_deleted
+        cache = get_model_cache() if single else None
+        if cache is not None:
+            model = cache.get((name, version))
+            if model is not None:
+                if raw:
+                    return ModelPage.model_construct(items=[{key: getattr(model, key) for key in ModelResponse.model_fields}])
+                return ModelPage(items=[ModelResponse.model_validate(model, from_attributes=True)])
+            token = cache.token(name)
+
+        query = select(*MODEL_LIST_COLUMNS)
+        if not include_deleted:
+            query = query.where(AiModel.is_deleted == false())
+        if name is not None:
+            query = query.where(AiModel.name == name)
+        if version is not None:
+            query = query.where(AiModel.version == version)
+        if after is not None:
+            # A row value comparison lets the database seek straight into the index
+            query = query.where(tuple_(AiModel.created_at, AiModel.id) > tuple_(*after))
+        # One extra row tells whether there is a next page
+        query = query.order_by(AiModel.created_at, AiModel.id).limit(limit + 1)
+
+        rows = (await db.exec(query)).all()
+        if cache is not None and rows:
+            cache.put((name, version), AiModel(**rows[0]._mapping), token, replica=db.info.get("read_only", False))
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        if raw:
+            return ModelPage.model_construct(items=[row._asdict() for row in rows[:limit]], next_cursor=next_cursor)
+        items = [ModelResponse.model_construct(**row._mapping) for row in rows[:limit]]
+        return ModelPage(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    async def export_models(
+        session_factory: Callable[[], AsyncSession], include_deleted: bool = False, batch_size: int = EXPORT_BATCH
+    ) -> AsyncIterator[bytes]:
+        """
+        The whole registry as newline delimited JSON, in (created_at, id) order.
+
+        Rows are read through a server-side cursor `batch_size` at a time and each batch is
+        encoded and handed to the response before the next one is fetched, memory stays flat
+        whatever the size of the table. The session is opened here and lives as long as the
+        stream, the request's own session is gone by the time the body is sent.
+        """
+        query = select(*MODEL_LIST_COLUMNS)
+        if not include_deleted:
+            query = query.where(AiModel.is_deleted == false())
+        query = query.order_by(AiModel.created_at, AiModel.id).execution_options(yield_per=batch_size)
+
+        async with session_factory() as db:
+            result = await db.stream(query)
+            async for rows in result.partitions():
+                yield b"".join(orjson.dumps(row._asdict(), option=ORJSON_OPTIONS) + b"\n" for row in rows)
 
     @staticmethod
-    async def get_model_info(db: AsyncSession, model_name: str) -> ModelResponse:
-        query = select(AiModel).where(AiModel.name == model_name)
-        model = await db.exec(query)
-        return ModelResponse(**model.model_dump())
+    async def get_registry_etag(db: AsyncSession) -> str:
+        """
+        ETag covering every listing of the registry, the registry version every node agrees on.
+        On the primary the metadata cache knows it while it hears about every change, otherwise
+        it is read from `db`. A replica may lag behind the version the cache knows, there it is
+        read from the replica along with the rows the page is read from.
+        """
+        cache = get_model_cache()
+        version = epoch = None
+        if cache is not None and not db.info.get("read_only"):
+            version, epoch = cache.registry_version()
+        if version is None:
+            version = (await db.exec(select(RegistryVersion.version))).first() or 0
+            if epoch is not None:
+                cache.learn_version(version, epoch)
+        return f'W/"models-{version}"'
+
+    @staticmethod
+    def model_etag(model: AiModel) -> str:
+        return f'"{model.sha256[:16]}-{model.updated_at.timestamp():.6f}"'
+
+    @staticmethod
+    async def get_model_info(db: AsyncSession, model_name: str, version: Optional[str] = None) -> ModelResponse:
+        model = await ModelController.get_model(db, model_name, version)
+        return ModelResponse.model_validate(model, from_attributes=True)
 
     @staticmethod
     async def download_model(db: AsyncSession, model_name: str):
@@ -31,29 +172,134 @@ class ModelController:
         pass
 
     @staticmethod
-    async def create_model(db: AsyncSession, create_model: CreateModel, file: Annotated[bytes, File()]) -> ModelResponse:
+    async def create_model(db: AsyncSession, create_model: CreateModel, file: UploadFile) -> ModelResponse:
         await validate_uploaded_file(file)
-        query = select(AiModel).where(AiModel.name == create_model.name)
-        model_resp = await db.exec(query)
-        model = model_resp.first()
-        if model and model.version == create_model.version:
+        query = select(AiModel.id).where(AiModel.name == create_model.name, AiModel.version == create_model.version)
+        if (await db.exec(query)).first() is not None:
             raise Exception("Model version already exists")
 
         if not is_valid_path_or_url(create_model.url_or_path):
             raise Exception("Invalid path or url")
 
-        # TODO: Hash the file
         try:
-            # Upload model first
-            await upload_from_file(file, f"{create_model.name}-{create_model.version}.zip")
-            model = AiModel(**create_model.model_dump(), sha256="TODO")
+            # Upload model first, blobs are content addressed so re-published weights are stored once
+            blob = await upload_blob(file)
+            model = AiModel(**create_model.model_dump(), sha256=blob.sha256)
             db.add(model)
+            mark_models_changed(db, model.name)
             await db.commit()
             return ModelResponse(**model.model_dump())
         except Exception as e:
             print(f"Error creating model: {e}")
             raise Exception("Failed to create model") from e
 
+    @staticmethod
+    async def bulk_create_models(
+        db: AsyncSession,
+        items: List[BulkModelItem],
+        open_artifact: Optional[ArtifactOpener] = None,
+        concurrency: Optional[int] = None,
+    ) -> BulkCreateResponse:
+        """
+        Register many models at once.
+
+        Artifacts are uploaded with at most `concurrency` uploads in flight, then every model is
+        inserted with multi-row INSERT ... ON CONFLICT (name, version) DO NOTHING statements.
+        Each item gets its own result, an item that fails does not keep the others from being
+        registered. Versions that are already registered are reported and not uploaded again.
+        """
+        concurrency = concurrency or get_settings().MODEL_BULK_UPLOAD_CONCURRENCY
+        results = [BulkItemResult(name=item.name, version=item.version, status="pending") for item in items]
+
+        seen = set()
+        for item, result in zip(items, results):
+            if (item.name, item.version) in seen:
+                result.status, result.error = "failed", "Duplicate name and version in the batch"
+            elif not is_valid_path_or_url(item.url_or_path):
+                result.status, result.error = "failed", "Invalid path or url"
+            elif item.artifact is None and not is_sha256(item.sha256):
+                result.status, result.error = "failed", "Either an artifact or its sha256 is required"
+            seen.add((item.name, item.version))
+
+        pending = [(item, result) for item, result in zip(items, results) if result.status == "pending"]
+        if pending:
+            pairs = [(item.name, item.version) for item, _result in pending]
+            query = select(AiModel.name, AiModel.version).where(tuple_(AiModel.name, AiModel.version).in_(pairs))
+            existing = set((await db.exec(query)).all())
+            for item, result in pending:
+                if (item.name, item.version) in existing:
+                    result.status = "exists"
+
+        semaphore = asyncio.Semaphore(concurrency)
+        uploads: Dict[str, asyncio.Task] = {}
+
+        async def upload(item: BulkModelItem) -> str:
+            async with semaphore:
+                file = open_artifact(item)
+                try:
+                    return (await upload_blob(file)).sha256
+                finally:
+                    closed = file.close()
+                    if asyncio.iscoroutine(closed):
+                        await closed
+
+        async def store(item: BulkModelItem, result: BulkItemResult) -> None:
+            try:
+                if item.artifact is not None:
+                    # Items sharing an artifact share its upload
+                    if item.artifact not in uploads:
+                        uploads[item.artifact] = asyncio.ensure_future(upload(item))
+                    result.sha256 = await uploads[item.artifact]
+                else:
+                    async with semaphore:
+                        if not await object_exists(get_blob_key(item.sha256)):
+                            raise FileNotFoundError(f"No artifact stored for sha256 {item.sha256}")
+                    result.sha256 = item.sha256
+            except Exception as e:
+                result.status, result.error = "failed", str(e) or type(e).__name__
+
+        to_store = [(item, result) for item, result in pending if result.status == "pending"]
+        # Uploads first, a sha256 may refer to an artifact uploaded by this same batch
+        await asyncio.gather(*[store(item, result) for item, result in to_store if item.artifact is not None])
+        await asyncio.gather(*[store(item, result) for item, result in to_store if item.artifact is None])
+
+        rows = []
+        for item, result in to_store:
+            if result.status != "pending":
+                continue
+            model = AiModel(**item.model_dump(exclude={"artifact", "sha256"}), sha256=result.sha256)
+            rows.append(({column.name: getattr(model, column.name) for column in AiModel.__table__.columns}, result))
+
+        insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+        for start in range(0, len(rows), BULK_INSERT_BATCH):
+            batch = rows[start:start + BULK_INSERT_BATCH]
+            statement = (
+                insert(AiModel)
+                .values([row for row, _result in batch])
+                .on_conflict_do_nothing(index_elements=["name", "version"])
+                .returning(AiModel.name, AiModel.version)
+            )
+            try:
+                # A failing batch only rolls back to its own savepoint
+                async with db.begin_nested():
+                    created = set((await db.exec(statement)).all())
+            except Exception as e:
+                for _row, result in batch:
+                    result.status, result.error = "failed", f"Insert failed: {e}"
+                continue
+            for _row, result in batch:
+                # Not returned means registered concurrently by someone else
+                result.status = "created" if (result.name, result.version) in created else "exists"
+            mark_models_changed(db, *(name for name, _version in created))
+        await db.commit()
+
+        return BulkCreateResponse(
+            created=sum(result.status == "created" for result in results),
+            existing=sum(result.status == "exists" for result in results),
+            failed=sum(result.status == "failed" for result in results),
+            results=results,
+        )
+
     @staticmethod
     async def delete_model(db: AsyncSession, model_name: str):
         query = select(AiModel).where(AiModel.name == model_name)
@@ -63,5 +309,84 @@ class ModelController:
         model = model.first()
         print(f"model: {model}")
         await db.delete(model)
+        mark_models_changed(db, model.name)
         await db.commit()
         return {"message": "Model deleted"}
+
+    @staticmethod
+    async def get_model(db: AsyncSession, model_name: str, version: Optional[str] = None) -> AiModel:
+        """
+        Latest (or the requested) version of a model that has not been deleted
+        """
+        cache = get_model_cache()
+        if cache is not None:
+            model = cache.get((model_name, version))
+            if model is not None:
+                return model
+            token = cache.token(model_name)
+
+        query = select(AiModel).where(AiModel.name == model_name, AiModel.is_deleted == false())
+        if version is not None:
+            query = query.where(AiModel.version == version)
+        query = query.order_by(AiModel.created_at.desc())
+        model = (await db.exec(query)).first()
+        if model is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
+        if cache is not None:
+            cache.put((model_name, version), model, token, replica=db.info.get("read_only", False))
+        return model
+
+    @staticmethod
+    async def load_model(model: AiModel) -> LoadedModel:
+        cache = get_session_cache()
+        key = (model.name, model.version, model.sha256)
+        loaded = cache.peek(key)
+        if loaded is not None:
+            return loaded
+        model_dir = await fetch_model(model)
+        model_path = find_model_file(model_dir, (model.details or {}).get("entrypoint"))
+        return await cache.get(key, model_path)
+
+    @staticmethod
+    async def predict(db: AsyncSession, model_name: str, predict_request: PredictRequest) -> PredictResponse:
+        model = await ModelController.get_model(db, model_name, predict_request.version)
+        loaded = await ModelController.load_model(model)
+        inputs = ModelController.to_tensors(loaded, predict_request.inputs)
+        settings = get_settings()
+        runner = get_runner()
+        if settings.INFERENCE_BATCHING_ENABLED and loaded.batchable:
+            details = model.details or {}
+            batcher = get_batcher(
+                loaded,
+                max_batch_size=_batch_option(details, "max_batch_size", settings.INFERENCE_MAX_BATCH_SIZE, int, 1),
+                max_wait_ms=_batch_option(details, "max_batch_wait_ms", settings.INFERENCE_MAX_BATCH_WAIT_MS, float, 0),
+                runner=runner,
+            )
+            outputs = await batcher.submit(inputs)
+        else:
+            outputs = await runner(loaded, inputs)
+        return PredictResponse(
+            name=model.name,
+            version=model.version,
+            outputs={name: value.tolist() for name, value in outputs.items()},
+        )
+
+    @staticmethod
+    def to_tensors(loaded: LoadedModel, inputs: Dict[str, object]) -> Dict[str, np.ndarray]:
+        missing = [spec.name for spec in loaded.inputs if spec.name not in inputs]
+        if missing:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Missing inputs: {missing}")
+        tensors = {}
+        for spec in loaded.inputs:
+            try:
+                tensors[spec.name] = np.asarray(inputs[spec.name], dtype=spec.dtype)
+            except (TypeError, ValueError) as e:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid input {spec.name}: {e}"
+                )
+            if tensors[spec.name].ndim != len(spec.shape):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Input {spec.name} must have {len(spec.shape)} dimensions",
+                )
+        return tensors
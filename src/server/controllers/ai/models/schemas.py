@@ -1,14 +1,23 @@
+from datetime import datetime
 from fastapi import UploadFile, File
-from typing import Optional, Dict, Annotated
+from typing import Any, Optional, Dict, Annotated, List
 from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 
 class ModelResponse(BaseModel):
+    id: Optional[UUID] = Field(default=None, description="The id of the model")
     name: str = Field(..., description="The name of the model")
     description: Optional[str] = Field(..., description="The description of the model")
     url_or_path: str = Field(..., description="The path to the model")
     details: Optional[Dict[str, str]] = Field(default=None, description="The metadata of the model")
     version: Optional[str] = Field(default='0.0.1', description="The version of the model")
+    sha256: Optional[str] = Field(default=None, description="The SHA256 hash of the model")
+    created_at: Optional[datetime] = Field(default=None, description="When the model was registered")
+    updated_at: Optional[datetime] = Field(default=None, description="When the model was last updated")
+
+class ModelPage(BaseModel):
+    items: List[ModelResponse] = Field(..., description="The models of this page, oldest first")
+    next_cursor: Optional[str] = Field(default=None, description="Cursor of the next page, None on the last page")
 
 class CreateModel(BaseModel):
     name: str = Field(..., description="The name of the model")
@@ -17,3 +26,30 @@ class CreateModel(BaseModel):
     details: Optional[Dict[str, str]] = Field(default=None, description="The metadata of the model")
     version: Optional[str] = Field(default='0.0.1', description="The version of the model")
 
+
+class BulkModelItem(CreateModel):
+    artifact: Optional[str] = Field(default=None, description="File name of the uploaded artifact (or its path in a CLI manifest)")
+    sha256: Optional[str] = Field(default=None, description="SHA256 of an artifact already in the bucket, instead of uploading one")
+
+class BulkItemResult(BaseModel):
+    name: str = Field(..., description="The name of the model")
+    version: Optional[str] = Field(..., description="The version of the model")
+    status: str = Field(..., description="created, exists or failed")
+    sha256: Optional[str] = Field(default=None, description="The SHA256 hash of the model")
+    error: Optional[str] = Field(default=None, description="Why the item failed")
+
+class BulkCreateResponse(BaseModel):
+    created: int = Field(..., description="Number of models registered")
+    existing: int = Field(..., description="Number of models that were already registered")
+    failed: int = Field(..., description="Number of items that could not be registered")
+    results: List[BulkItemResult] = Field(..., description="One result per item, in request order")
+
+
+class PredictRequest(BaseModel):
+    inputs: Dict[str, Any] = Field(..., description="Input tensors as nested lists, keyed by model input name")
+    version: Optional[str] = Field(default=None, description="The version of the model, defaults to the latest")
+
+class PredictResponse(BaseModel):
+    name: str = Field(..., description="The name of the model")
+    version: str = Field(..., description="The version of the model")
+    outputs: Dict[str, Any] = Field(..., description="Output tensors as nested lists, keyed by model output name")
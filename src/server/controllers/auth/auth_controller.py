@@ -1,17 +1,22 @@
-from typing import Annotated, Dict
+from typing import Annotated, Dict, Optional
 from sqlmodel.ext.asyncio.session import AsyncSession
-from fastapi import Depends
+from fastapi import Depends, HTTPException, status
 # from fastapi.security import OAuth2PasswordBearer
-import requests
-from jose import jwt
+import httpx
 from jose.exceptions import JWTError
-from passlib.context import CryptContext
 from sqlmodel import Session, select, delete
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
-from db.session import get_async_db
+from db.session import get_async_db, release
 from db.models.user import User
+from db.models.token_revocation import TokenRevocation
 from core.config import get_settings
+from core.logger import logging
+from utils.password_hasher import HasherOverloaded, get_password_hasher
+from utils.signing_keys import get_key_ring
+from .token_cache import get_token_denylist, get_user_cache, get_verified_token_cache
+from .identity_providers import InvalidExternalToken, get_external_token_verifier
 
 # from db.session import get_async_db
 from server.dependencies import oauth2_scheme
@@ -22,9 +27,9 @@ from .schemas import (
     LoginUser
 )
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = settings.JWT_SECRET_KEY
 EXPIRATION_MINUTES = settings.JWT_EXPIRATION_MINUTES
 
 class AuthController:
@@ -46,7 +51,7 @@ class AuthController:
         if found_user:
             raise Exception("Email already exists")
 
-        hashed_password = pwd_context.hash(create_user.password) if not oauth else None
+        hashed_password = await hash_password(create_user.password) if not oauth else None
         db_user = User(
             email=create_user.email,
             first_name=create_user.first_name,
@@ -70,6 +75,8 @@ class AuthController:
         if not user:
             raise Exception("User not found")
         await db.delete(user)
+        # Tokens already handed out stay valid until they expire, unless revoked
+        await AuthController.revoke_user_tokens(db, email)
         return True
 
     @staticmethod
@@ -83,22 +90,103 @@ class AuthController:
         query = select(User).where(User.email == login_user.email)
         user = await db.exec(query)
         user = user.first()
-        print(f"found_user: {user}")
         if not user:
             return None
-        print(f"verifying password {pwd_context.verify(login_user.password, user.hashed_password)}")
-        if not pwd_context.verify(login_user.password, user.hashed_password):
+        # Nothing else to read, the connection is not held while bcrypt runs
+        await release(db)
+        if not await verify_password(login_user.password, user.hashed_password):
             return None
-        print("returning user")
         return user
 
     @staticmethod
     async def create_access_token(user: User):
-        expire = datetime.now() + timedelta(minutes=EXPIRATION_MINUTES)
+        now = datetime.now(timezone.utc)
+        expire = now + timedelta(minutes=EXPIRATION_MINUTES)
         public_user = UserResponse.model_validate(user.model_dump(mode="json"))
-        to_encode = {"exp": expire, "sub": user.email, "user": public_user.model_dump(mode="json")}
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
-        return encoded_jwt
+        to_encode = {
+            "exp": expire,
+            # Sub-second, a token issued in the same second right after a revocation of every
+            # token of its user must come after it
+            "iat": now.timestamp(),
+            "jti": uuid4().hex,
+            "sub": user.email,
+            "user": public_user.model_dump(mode="json"),
+        }
+        return get_key_ring().sign(to_encode)
+
+    @staticmethod
+    async def revoke_token(db: AsyncSession, token: str) -> None:
+        """
+        Revoke one access token until it expires (logout)
+        """
+        try:
+            payload = _decode_token(token)
+        except JWTError:
+            raise _credentials_error()
+        if payload.get("jti") is None:
+            # Issued before tokens had ids, only revoking every token of the user covers it
+            return await AuthController.revoke_user_tokens(db, payload.get("sub"))
+        revocation = TokenRevocation(
+            jti=payload["jti"],
+            revoked_at=datetime.now(timezone.utc),
+            expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc),
+        )
+        db.add(revocation)
+        await db.commit()
+        get_token_denylist().add(revocation)
+
+    @staticmethod
+    async def revoke_user_tokens(db: AsyncSession, email: str) -> None:
+        """
+        Revoke every token issued to a user so far (password change, deletion, logout everywhere)
+        """
+        now = datetime.now(timezone.utc)
+        revocation = TokenRevocation(
+            subject=email, revoked_at=now, expires_at=now + timedelta(minutes=EXPIRATION_MINUTES)
+        )
+        db.add(revocation)
+        await db.commit()
+        get_token_denylist().add(revocation)
+        get_user_cache().invalidate(email)
+
+
+def _hasher_overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password checks in progress, retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def hash_password(password: str) -> str:
+    try:
+        return await get_password_hasher().hash(password)
+    except HasherOverloaded:
+        raise _hasher_overloaded()
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    try:
+        return await get_password_hasher().verify(password, hashed_password)
+    except HasherOverloaded:
+        raise _hasher_overloaded()
+
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode_token(token: str) -> Dict:
+    cache = get_verified_token_cache()
+    payload = cache.get(token)
+    if payload is None:
+        payload = get_key_ring().decode(token)
+        cache.put(token, payload)
+    return payload
 
 
 async def get_current_user(
@@ -107,29 +195,71 @@ async def get_current_user(
 ) -> User:
     # first try to decode the token using our auth
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = _decode_token(token)
         email: str = payload.get("sub")
         if email is None:
-            raise Exception("Could not validate credentials")
+            raise _credentials_error()
+
+        if settings.JWT_STATELESS_VALIDATION:
+            return await _user_from_claims(db, payload)
 
         user = await db.exec(select(User).where(User.email == email))
         user = user.first()
+        # The user is all the request needs, give the connection back before the handler runs
+        await release(db)
         if user is None:
-            raise Exception("Could not validate credentials")
+            raise _credentials_error()
 
-    # if the token is not from our auth, try to decode it using facebook auth
+    # if the token is not from our auth, it may be an ID token of Google or Facebook
     except JWTError:
-        try:
-            user = await AuthController.get_facebook_user(token) or await AuthController.get_google_user(token)
-            return user
-        except Exception:
-            raise Exception("Could not validate credentials")
+        return await _user_from_external_token(db, token)
 
     return user
 
-async def get_facebook_user(token: str):
-    pass
 
-async def get_google_user(token: str):
-    pass
+async def _user_from_claims(db: AsyncSession, payload: Dict) -> User:
+    """
+    The signature already vouches for the subject. Only revocation is checked, against the
+    in-memory denylist, and the user comes from the cache, the users table is read on a miss.
+    """
+    return await _cached_user(db, payload["sub"], payload.get("jti"), payload.get("iat"))
 
+
+async def _user_from_external_token(db: AsyncSession, token: str) -> User:
+    """
+    A provider ID token identifies the registered user with its verified email
+    """
+    try:
+        claims = await get_external_token_verifier().verify(token)
+    except InvalidExternalToken:
+        await release(db)
+        raise _credentials_error()
+    except httpx.HTTPError:
+        logger.warning("Identity provider keys unavailable, rejecting its token", exc_info=True)
+        await release(db)
+        raise _credentials_error()
+
+    email = claims.get("email")
+    if not email or claims.get("email_verified") in (False, "false"):
+        await release(db)
+        raise _credentials_error()
+    return await _cached_user(db, email, None, claims.get("iat"))
+
+
+async def _cached_user(db: AsyncSession, email: str, jti: Optional[str], issued_at: Optional[float]) -> User:
+    denylist = get_token_denylist()
+    await denylist.refresh_if_stale(db)
+    if denylist.is_revoked(jti, email, issued_at):
+        await release(db)
+        raise _credentials_error()
+
+    cache = get_user_cache()
+    user = cache.get(email)
+    if user is None:
+        user = (await db.exec(select(User).where(User.email == email))).first()
+        if user is None:
+            await release(db)
+            raise _credentials_error()
+        cache.put(user)
+    await release(db)
+    return user
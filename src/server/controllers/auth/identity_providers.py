@@ -0,0 +1,208 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import httpx
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JOSEError
+
+from core.config import get_settings
+from core.logger import logging
+from core.metrics import get_metrics
+from utils.http_client import get_http_client
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class InvalidExternalToken(Exception):
+    pass
+
+
+def cache_lifetime(headers: httpx.Headers, default: float) -> float:
+    """
+    Seconds a response may be reused for according to its Cache-Control and Age headers
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE.search(cache_control)
+    if match is None:
+        return default
+    try:
+        age = float(headers.get("age", 0))
+    except ValueError:
+        age = 0.0
+    return max(0.0, int(match.group(1)) - age)
+
+
+class JWKSCache:
+    """
+    Public keys of one provider by kid, parsed once and kept as long as the provider's
+    Cache-Control allows. A kid missing from the cached set refetches early, at most every
+    `min_refresh_interval` seconds, providers publish new keys before signing with them.
+    When the provider cannot be reached the keys already known keep being used.
+    """
+
+    def __init__(self, name: str, url: str, default_ttl: float, min_refresh_interval: float):
+        self.name = name
+        self.url = url
+        self.default_ttl = default_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Key] = {}
+        self._expires_at = 0.0
+        self._fetched_at: Optional[float] = None
+        self._single_flight = SingleFlight()
+
+        registry = get_metrics()
+        self.fetches = registry.counter("oauth_jwks_fetches_total", {"provider": name})
+        self.fetch_errors = registry.counter("oauth_jwks_fetch_errors_total", {"provider": name})
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Key]:
+        now = time.monotonic()
+        if now >= self._expires_at:
+            await self._single_flight.do(self.url, self._refresh)
+        elif kid not in self._keys and now - (self._fetched_at or 0.0) >= self.min_refresh_interval:
+            await self._single_flight.do(self.url, self._refresh)
+        return self._keys.get(kid)
+
+    async def _refresh(self) -> None:
+        self.fetches.inc()
+        try:
+            response = await get_http_client().get(self.url)
+            response.raise_for_status()
+            document = response.json()
+        except (httpx.HTTPError, ValueError):
+            self.fetch_errors.inc()
+            if not self._keys:
+                raise
+            logger.warning(f"Could not refresh the {self.name} signing keys, keeping the cached ones", exc_info=True)
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + self.min_refresh_interval
+            return
+
+        keys = {}
+        for key in document.get("keys", []):
+            try:
+                keys[key["kid"]] = jwk.construct(key, key.get("alg", "RS256"))
+            except (KeyError, JOSEError):
+                logger.warning(f"Skipping an unusable {self.name} signing key {key.get('kid')}")
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + cache_lifetime(response.headers, self.default_ttl)
+
+
+class IdentityProvider:
+    """
+    OpenID Connect provider whose ID tokens are accepted as bearer tokens
+    """
+
+    def __init__(self, name: str, issuers: Sequence[str], audience: str, keys: JWKSCache):
+        self.name = name
+        self.issuers = tuple(issuers)
+        self.audience = audience
+        self.keys = keys
+
+    async def verify(self, token: str) -> Dict:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") != "RS256":
+            raise InvalidExternalToken(f"Unexpected {self.name} token algorithm {header.get('alg')}")
+        key = await self.keys.get_key(header.get("kid"))
+        if key is None:
+            raise InvalidExternalToken(f"Unknown {self.name} signing key {header.get('kid')}")
+        # There is no access token to check at_hash against, the ID token is the bearer token
+        return jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=self.audience,
+            issuer=self.issuers,
+            options={"verify_at_hash": False},
+        )
+
+
+class ExternalTokenVerifier:
+    """
+    Verifies ID tokens of the configured providers, picked by the `iss` claim, against their
+    cached keys: no outbound call per request. Rejected tokens are remembered for `negative_ttl`
+    seconds by their SHA-256, so a client retrying a bad token does not redo the work or trigger
+    key refetches.
+    """
+
+    def __init__(self, providers: Sequence[IdentityProvider], negative_ttl: float, max_rejected: int):
+        self.providers = {issuer: provider for provider in providers for issuer in provider.issuers}
+        self.negative_ttl = negative_ttl
+        self.max_rejected = max_rejected
+        self._rejected: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        registry = get_metrics()
+        self.verified = registry.counter("oauth_tokens_verified_total")
+        self.rejected = registry.counter("oauth_tokens_rejected_total")
+        self.negative_hits = registry.counter("oauth_negative_cache_hits_total")
+
+    async def verify(self, token: str) -> Dict:
+        """
+        Claims of a valid provider token, `InvalidExternalToken` otherwise. Provider outages
+        surface as `httpx.HTTPError` and are not remembered.
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        if self._recently_rejected(key):
+            self.negative_hits.inc()
+            raise InvalidExternalToken("Token recently rejected")
+        try:
+            provider = self.providers.get(jwt.get_unverified_claims(token).get("iss"))
+            if provider is None:
+                raise InvalidExternalToken("Token not issued by a configured provider")
+            claims = await provider.verify(token)
+        except (JOSEError, InvalidExternalToken) as e:
+            self._reject(key)
+            raise InvalidExternalToken(str(e)) from e
+        self.verified.inc()
+        return claims
+
+    def _recently_rejected(self, key: bytes) -> bool:
+        with self._lock:
+            expires_at = self._rejected.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._rejected[key]
+                return False
+            return True
+
+    def _reject(self, key: bytes) -> None:
+        self.rejected.inc()
+        with self._lock:
+            self._rejected[key] = time.monotonic() + self.negative_ttl
+            self._rejected.move_to_end(key)
+            while len(self._rejected) > self.max_rejected:
+                self._rejected.popitem(last=False)
+
+
+_external_token_verifier: Optional[ExternalTokenVerifier] = None
+
+
+def get_external_token_verifier() -> ExternalTokenVerifier:
+    global _external_token_verifier
+    if _external_token_verifier is None:
+        settings = get_settings()
+        ttl, min_refresh = settings.OAUTH_JWKS_DEFAULT_TTL, settings.OAUTH_JWKS_MIN_REFRESH_SECONDS
+        providers = []
+        if settings.GOOGLE_CLIENT_ID:
+            keys = JWKSCache("google", settings.GOOGLE_JWKS_URL, ttl, min_refresh)
+            issuers = ["https://accounts.google.com", "accounts.google.com"]
+            providers.append(IdentityProvider("google", issuers, settings.GOOGLE_CLIENT_ID, keys))
+        if settings.FACEBOOK_APP_ID:
+            keys = JWKSCache("facebook", settings.FACEBOOK_JWKS_URL, ttl, min_refresh)
+            providers.append(IdentityProvider("facebook", ["https://www.facebook.com"], settings.FACEBOOK_APP_ID, keys))
+        _external_token_verifier = ExternalTokenVerifier(
+            providers, settings.OAUTH_NEGATIVE_CACHE_TTL, settings.OAUTH_NEGATIVE_CACHE_MAX_ENTRIES
+        )
+    return _external_token_verifier
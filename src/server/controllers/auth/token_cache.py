@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import get_settings
+from core.logger import logging
+from core.metrics import get_metrics
+from db.models.token_revocation import TokenRevocation
+from db.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes, they are stored as UTC
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+# (jti, subject, revoked at)
+Revocation = Tuple[Optional[str], Optional[str], float]
+
+
+def _revocation(row: TokenRevocation) -> Revocation:
+    return row.jti, row.subject, _timestamp(row.revoked_at)
+
+
+def _apply(jtis: Set[str], subjects: Dict[str, float], revocation: Revocation) -> None:
+    jti, subject, revoked_at = revocation
+    if jti is not None:
+        jtis.add(jti)
+    if subject is not None:
+        subjects[subject] = max(revoked_at, subjects.get(subject, revoked_at))
+
+
+class UserCache:
+    """
+    TTL + LRU cache of users by email, for validating tokens without reading the users table.
+    Every hit returns a new detached `User`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        registry = get_metrics()
+        self.hits = registry.counter("auth_user_cache_hits_total")
+        self.misses = registry.counter("auth_user_cache_misses_total")
+
+    def get(self, email: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[email]
+                entry = None
+            if entry is None:
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(email)
+        self.hits.inc()
+        return User(**entry[1])
+
+    def put(self, user: User) -> None:
+        values = {column.name: getattr(user, column.name) for column in User.__table__.columns}
+        with self._lock:
+            self._entries[user.email] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user.email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenDenylist:
+    """
+    In-memory copy of the unexpired token revocations, reloaded in bulk at most every
+    `refresh_interval` seconds. Revocations made by this process apply immediately, those made
+    by other nodes within one refresh interval.
+
+    Reloads may read a replica that has not replayed the latest revocations yet, the ones made
+    here are merged back into every reload for `replica_lag` seconds.
+    """
+
+    def __init__(self, refresh_interval: float, replica_lag: float = 0.0):
+        self.refresh_interval = refresh_interval
+        self.replica_lag = replica_lag
+        self._jtis: Set[str] = set()
+        # Tokens of these subjects issued at or before the timestamp are revoked
+        self._subjects: Dict[str, float] = {}
+        # Revocations made by this process, with when they were made
+        self._local: List[Tuple[float, Revocation]] = []
+        self._refreshed_at: Optional[float] = None
+        self._refresh_lock = asyncio.Lock()
+
+        get_metrics().gauge("auth_token_denylist_entries", fn=lambda: len(self._jtis) + len(self._subjects))
+
+    def is_revoked(self, jti: Optional[str], subject: str, issued_at: Optional[float]) -> bool:
+        if jti is not None and jti in self._jtis:
+            return True
+        revoked_at = self._subjects.get(subject)
+        # Tokens without an issue time predate revocation support
+        return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+    def add(self, revocation: TokenRevocation) -> None:
+        values = _revocation(revocation)
+        self._local.append((time.monotonic(), values))
+        _apply(self._jtis, self._subjects, values)
+
+    def is_stale(self) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+
+    async def refresh(self, db: AsyncSession) -> None:
+        query = select(TokenRevocation).where(TokenRevocation.expires_at > datetime.now(timezone.utc))
+        revocations = (await db.exec(query)).all()
+        jtis, subjects = set(), {}
+        for revocation in revocations:
+            _apply(jtis, subjects, _revocation(revocation))
+        cutoff = time.monotonic() - self.replica_lag
+        self._local = [(added_at, revocation) for added_at, revocation in self._local if added_at > cutoff]
+        for _added_at, revocation in self._local:
+            _apply(jtis, subjects, revocation)
+        self._jtis, self._subjects = jtis, subjects
+        self._refreshed_at = time.monotonic()
+
+    async def refresh_if_stale(self, db: AsyncSession) -> None:
+        if not self.is_stale():
+            return
+        async with self._refresh_lock:
+            # Concurrent requests wait for the one refresh in flight
+            if self.is_stale():
+                await self.refresh(db)
+
+
+class VerifiedTokenCache:
+    """
+    LRU of the claims of tokens whose signature already checked out, keyed by the SHA-256 of the
+    token, so a client reusing its bearer token skips decoding and verifying it. Entries live until
+    the token's `exp` and are bounded both in count and in approximate bytes. Revocation is not
+    cached here, callers still check the denylist.
+    """
+
+    # Rough size of an entry besides the claims: the key, the tuple and the dict bookkeeping
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[bytes, Tuple[float, int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        registry = get_metrics()
+        self.hits = registry.counter("auth_token_cache_hits_total")
+        self.misses = registry.counter("auth_token_cache_misses_total")
+        self.evictions = registry.counter("auth_token_cache_evictions_total")
+        self.expirations = registry.counter("auth_token_cache_expirations_total")
+        registry.unregister("auth_token_cache_entries")
+        registry.gauge("auth_token_cache_entries", fn=lambda: len(self._entries))
+        registry.unregister("auth_token_cache_bytes")
+        registry.gauge("auth_token_cache_bytes", fn=lambda: self._bytes)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[Dict]:
+        """
+        Claims of a verified, unexpired token, shared between callers and not to be mutated
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._remove(key)
+                self.expirations.inc()
+                entry = None
+            if entry is None:
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        self.hits.inc()
+        return entry[2]
+
+    def put(self, token: str, claims: Dict) -> None:
+        expires_at = claims.get("exp")
+        # Tokens without an expiry are verified every time
+        if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+        # The claims are decoded from the token, its length bounds their size
+        size = len(token) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, size, claims)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: bytes) -> None:
+        _expires_at, size, _claims = self._entries.pop(key)
+        self._bytes -= size
+
+
+_user_cache: Optional[UserCache] = None
+_token_denylist: Optional[TokenDenylist] = None
+_verified_token_cache: Optional[VerifiedTokenCache] = None
+
+
+def get_user_cache() -> UserCache:
+    global _user_cache
+    if _user_cache is None:
+        settings = get_settings()
+        _user_cache = UserCache(settings.AUTH_USER_CACHE_MAX_ENTRIES, settings.AUTH_USER_CACHE_TTL)
+    return _user_cache
+
+
+def get_token_denylist() -> TokenDenylist:
+    global _token_denylist
+    if _token_denylist is None:
+        settings = get_settings()
+        # A replica serving reads is at most this far behind, the lag is checked periodically
+        replica_lag = settings.DB_REPLICA_MAX_LAG_SECONDS + settings.DB_REPLICA_CHECK_INTERVAL
+        _token_denylist = TokenDenylist(settings.TOKEN_DENYLIST_REFRESH_SECONDS, replica_lag)
+    return _token_denylist
+
+
+def get_verified_token_cache() -> VerifiedTokenCache:
+    global _verified_token_cache
+    if _verified_token_cache is None:
+        settings = get_settings()
+        _verified_token_cache = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES, settings.AUTH_TOKEN_CACHE_MAX_BYTES)
+    return _verified_token_cache
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from anyio import to_thread
+
+from core.config import get_settings
+from core.logger import logging
+from core.metrics import get_metrics
+from .session_cache import LoadedModel
+
+logger = logging.getLogger(__name__)
+
+Tensors = Dict[str, np.ndarray]
+Runner = Callable[[LoadedModel, Tensors], Awaitable[Tensors]]
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+QUEUE_WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000]
+
+
+async def run_in_thread(model: LoadedModel, inputs: Tensors) -> Tensors:
+    return await to_thread.run_sync(model.run, inputs)
+
+
+def get_runner() -> Runner:
+    if get_settings().INFERENCE_EXECUTION_MODE == "process":
+        from .process_pool import get_inference_pool
+
+        return get_inference_pool().run
+    return run_in_thread
+
+
+@dataclass
+class _Pending:
+    inputs: Tensors
+    rows: int
+    future: asyncio.Future
+    enqueued_at: float
+
+    @property
+    def signature(self) -> Tuple:
+        # Requests can only share a batch when every non-batch dimension matches
+        return tuple((name, tensor.shape[1:], tensor.dtype.str) for name, tensor in sorted(self.inputs.items()))
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent predictions for one model into batched calls.
+
+    Requests are collected until `max_batch_size` rows are queued or the oldest request has
+    waited `max_wait_ms`, then run as one call with inputs concatenated along the first axis
+    and the outputs split back per request. Only one batch per model runs at a time, requests
+    that arrive meanwhile form the next batch.
+    """
+
+    def __init__(
+        self,
+        model: LoadedModel,
+        max_batch_size: int,
+        max_wait_ms: float,
+        runner: Runner = run_in_thread,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.runner = runner
+        self._queue: List[_Pending] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        registry = get_metrics()
+        labels = {"model": f"{model.key[0]}:{model.key[1]}"}
+        self.batch_size = registry.histogram("inference_batch_size", BATCH_SIZE_BUCKETS, labels)
+        self.queue_wait_ms = registry.histogram("inference_queue_wait_ms", QUEUE_WAIT_MS_BUCKETS, labels)
+        self.requests = registry.counter("inference_requests_total", labels)
+        self.batches = registry.counter("inference_batches_total", labels)
+
+    async def submit(self, inputs: Tensors) -> Tensors:
+        rows = next(iter(inputs.values())).shape[0] if inputs else 1
+        pending = _Pending(inputs, rows, asyncio.get_running_loop().create_future(), time.monotonic())
+        self._queue.append(pending)
+        self.requests.inc()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+        return await pending.future
+
+    async def _run(self) -> None:
+        # The worker exits once the queue is drained, the next submit starts a new one
+        while self._queue:
+            await self._wait_for_batch()
+            batch = self._take_batch()
+            await self._execute(batch)
+
+    async def _wait_for_batch(self) -> None:
+        deadline = self._queue[0].enqueued_at + self.max_wait
+        while sum(p.rows for p in self._queue) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    def _take_batch(self) -> List[_Pending]:
+        first = self._queue.pop(0)
+        batch, rows, rest = [first], first.rows, []
+        for pending in self._queue:
+            if rows + pending.rows <= self.max_batch_size and pending.signature == first.signature:
+                batch.append(pending)
+                rows += pending.rows
+            else:
+                rest.append(pending)
+        self._queue = rest
+        return batch
+
+    async def _execute(self, batch: List[_Pending]) -> None:
+        now = time.monotonic()
+        for pending in batch:
+            self.queue_wait_ms.observe((now - pending.enqueued_at) * 1000)
+        total_rows = sum(p.rows for p in batch)
+        self.batch_size.observe(total_rows)
+        self.batches.inc()
+
+        try:
+            if len(batch) == 1:
+                inputs = batch[0].inputs
+            else:
+                inputs = {name: np.concatenate([p.inputs[name] for p in batch]) for name in batch[0].inputs}
+            outputs = await self.runner(self.model, inputs)
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        offset = 0
+        for pending in batch:
+            result = {}
+            for name, value in outputs.items():
+                # Outputs without a batch dimension are shared as is
+                batched = value.ndim > 0 and value.shape[0] == total_rows
+                result[name] = value[offset:offset + pending.rows] if batched else value
+            offset += pending.rows
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+
+def get_batcher(
+    model: LoadedModel, max_batch_size: int, max_wait_ms: float, runner: Runner = run_in_thread
+) -> MicroBatcher:
+    """
+    Batcher of a loaded model, created on first use. It is dropped together with the session
+    when the session cache evicts the model.
+    """
+    if model.batcher is None:
+        model.batcher = MicroBatcher(model, max_batch_size, max_wait_ms, runner)
+    return model.batcher
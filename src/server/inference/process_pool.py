@@ -0,0 +1,262 @@
+import asyncio
+import multiprocessing
+import os
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from anyio import to_thread
+
+from core.config import get_settings
+from core.logger import logging
+from .session_cache import LoadedModel, SessionKey, TensorSpec, load_session, model_size
+
+logger = logging.getLogger(__name__)
+
+# (input or output name, shared memory block name, shape, dtype string)
+TensorRef = Tuple[str, str, Tuple[int, ...], str]
+
+
+class InferenceWorkerError(Exception):
+    pass
+
+
+def parse_cpu_affinity(value: str) -> List[List[int]]:
+    """
+    "0-1;2-3" -> [[0, 1], [2, 3]], one semicolon separated CPU list per worker
+    """
+    groups = []
+    for group in filter(None, (part.strip() for part in value.split(";"))):
+        cpus = []
+        for item in filter(None, (part.strip() for part in group.split(","))):
+            if "-" in item:
+                start, end = item.split("-")
+                cpus.extend(range(int(start), int(end) + 1))
+            else:
+                cpus.append(int(item))
+        groups.append(cpus)
+    return groups
+
+
+def _to_shared_memory(name: str, tensor: np.ndarray) -> Tuple[SharedMemory, TensorRef]:
+    tensor = np.ascontiguousarray(tensor)
+    shm = SharedMemory(create=True, size=max(tensor.nbytes, 1))
+    np.ndarray(tensor.shape, dtype=tensor.dtype, buffer=shm.buf)[...] = tensor
+    return shm, (name, shm.name, tensor.shape, tensor.dtype.str)
+
+
+def _attach(ref: TensorRef) -> Tuple[SharedMemory, np.ndarray]:
+    name, shm_name, shape, dtype = ref
+    shm = SharedMemory(name=shm_name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _worker_main(conn: Connection, cpus: Optional[List[int]]) -> None:
+    """
+    Entry point of a worker process: holds one replica of every model it is asked to run
+    """
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    sessions: Dict[SessionKey, LoadedModel] = {}
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        command, key = message[0], message[1]
+        try:
+            if command == "load":
+                _, _, path, warmup = message
+                if key not in sessions:
+                    sessions[key] = load_session(key, path, warmup, intra_op_threads=len(cpus) if cpus else None)
+                model = sessions[key]
+                conn.send(("ok", [(s.name, s.shape, np.dtype(s.dtype).str) for s in model.inputs], model.outputs))
+            elif command == "unload":
+                sessions.pop(key, None)
+                conn.send(("ok",))
+            elif command == "run":
+                _, _, path, refs = message
+                if key not in sessions:
+                    sessions[key] = load_session(key, path, warmup=False, intra_op_threads=len(cpus) if cpus else None)
+                conn.send(("ok", _run_shared(sessions[key], refs)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _run_shared(model: LoadedModel, refs: List[TensorRef]) -> List[TensorRef]:
+    blocks, inputs = [], {}
+    for ref in refs:
+        shm, array = _attach(ref)
+        blocks.append(shm)
+        # Inputs are read in place from the parent's shared memory
+        inputs[ref[0]] = array
+    try:
+        outputs = model.run(inputs)
+    finally:
+        # Views must be released before the blocks can be closed
+        inputs.clear()
+        for shm in blocks:
+            shm.close()
+
+    out_refs = []
+    for name, tensor in outputs.items():
+        # The parent copies the result out and unlinks the block
+        shm, ref = _to_shared_memory(name, tensor)
+        shm.close()
+        out_refs.append(ref)
+    return out_refs
+
+
+@dataclass
+class _Worker:
+    index: int
+    cpus: Optional[List[int]]
+    process: Optional[multiprocessing.process.BaseProcess] = None
+    conn: Optional[Connection] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class InferenceProcessPool:
+    """
+    Runs inference in dedicated worker processes, each holding its own replica of the models.
+
+    Tensors travel through shared memory blocks: the parent writes the inputs once, the worker
+    runs the session directly on them and writes the outputs to new blocks the parent copies
+    out and unlinks. Only block names, shapes and dtypes go through the pipe.
+    """
+
+    def __init__(self, workers: int, cpu_affinity: Optional[List[List[int]]] = None):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = [
+            _Worker(index, cpu_affinity[index % len(cpu_affinity)] if cpu_affinity else None)
+            for index in range(max(1, workers))
+        ]
+        self._next = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def _spawn(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(child_conn, worker.cpus), name=f"inference-worker-{worker.index}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+
+    def _pick(self) -> _Worker:
+        # Prefer an idle worker, otherwise queue up round robin
+        for offset in range(len(self._workers)):
+            worker = self._workers[(self._next + offset) % len(self._workers)]
+            if not worker.lock.locked():
+                self._next = (worker.index + 1) % len(self._workers)
+                return worker
+        worker = self._workers[self._next]
+        self._next = (self._next + 1) % len(self._workers)
+        return worker
+
+    async def _call(self, worker: _Worker, message: tuple) -> tuple:
+        async with worker.lock:
+            if worker.process is None or not worker.process.is_alive():
+                self._spawn(worker)
+            try:
+                await to_thread.run_sync(worker.conn.send, message)
+                reply = await to_thread.run_sync(worker.conn.recv)
+            except (EOFError, OSError) as e:
+                # Respawned on the next call
+                worker.process = None
+                raise InferenceWorkerError(f"Inference worker {worker.index} died: {e}") from e
+        if reply[0] == "error":
+            raise InferenceWorkerError(reply[1])
+        return reply
+
+    async def load(self, key: SessionKey, model_path: str, warmup: bool = True) -> LoadedModel:
+        """
+        Load (and warm up) a replica in every worker, the parent only keeps the tensor specs
+        """
+        replies = await asyncio.gather(*[self._call(w, ("load", key, model_path, warmup)) for w in self._workers])
+        _, inputs, outputs = replies[0]
+        return LoadedModel(
+            key=key,
+            path=model_path,
+            session=None,
+            inputs=[TensorSpec(name, list(shape), np.dtype(dtype).type) for name, shape, dtype in inputs],
+            outputs=outputs,
+            size=model_size(model_path),
+        )
+
+    async def unload(self, key: SessionKey) -> None:
+        await asyncio.gather(
+            *[self._call(w, ("unload", key)) for w in self._workers if w.process is not None],
+            return_exceptions=True,
+        )
+
+    def unload_soon(self, model: LoadedModel) -> None:
+        try:
+            asyncio.get_running_loop().create_task(self.unload(model.key))
+        except RuntimeError:
+            # No loop (e.g. shutting down), the workers go away with the pool anyway
+            pass
+
+    async def run(self, model: LoadedModel, inputs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        blocks, refs = [], []
+        try:
+            for name, tensor in inputs.items():
+                shm, ref = _to_shared_memory(name, tensor)
+                blocks.append(shm)
+                refs.append(ref)
+            _, out_refs = await self._call(self._pick(), ("run", model.key, model.path, refs))
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        outputs = {}
+        for ref in out_refs:
+            shm, view = _attach(ref)
+            outputs[ref[0]] = view.copy()
+            del view
+            shm.close()
+            shm.unlink()
+        return outputs
+
+    def close(self, timeout: float = 5.0) -> None:
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.process = None
+
+
+_inference_pool: Optional[InferenceProcessPool] = None
+
+
+def get_inference_pool() -> InferenceProcessPool:
+    global _inference_pool
+    if _inference_pool is None:
+        settings = get_settings()
+        workers = settings.INFERENCE_PROCESS_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+        _inference_pool = InferenceProcessPool(workers, parse_cpu_affinity(settings.INFERENCE_CPU_AFFINITY))
+    return _inference_pool
+
+
+def shutdown_inference_pool() -> None:
+    global _inference_pool
+    if _inference_pool is not None:
+        _inference_pool.close()
+        _inference_pool = None
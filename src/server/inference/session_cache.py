@@ -0,0 +1,304 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import onnxruntime as ort
+from anyio import to_thread
+
+from core.config import get_settings
+from core.logger import logging
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# (name, version, sha256)
+SessionKey = Tuple[str, str, str]
+
+ONNX_TYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int8)": np.int8,
+    "tensor(int16)": np.int16,
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64,
+    "tensor(uint8)": np.uint8,
+    "tensor(bool)": np.bool_,
+}
+
+
+@dataclass
+class TensorSpec:
+    name: str
+    shape: List[Any]
+    dtype: Any
+
+
+@dataclass
+class LoadedModel:
+    key: SessionKey
+    path: str
+    # None when the replicas live in the inference process pool
+    session: Optional[ort.InferenceSession]
+    inputs: List[TensorSpec]
+    outputs: List[str]
+    size: int
+    # MicroBatcher coalescing requests for this session, see server.inference.batcher
+    batcher: Optional[Any] = None
+
+    @property
+    def batchable(self) -> bool:
+        """
+        Requests can only be stacked when every input has a dynamic leading dimension, a model
+        exported with a fixed batch size rejects the stacked tensors
+        """
+        return bool(self.inputs) and all(
+            spec.shape and not (isinstance(spec.shape[0], int) and spec.shape[0] > 0) for spec in self.inputs
+        )
+
+    def run(self, inputs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        if self.session is None:
+            raise RuntimeError(f"{self.key[0]}:{self.key[1]} is not loaded in this process")
+        results = self.session.run(self.outputs, inputs)
+        return dict(zip(self.outputs, results))
+
+    def sample_inputs(self, batch_size: int = 1) -> Dict[str, np.ndarray]:
+        """
+        Zero tensors matching the model inputs, dynamic dimensions become `batch_size` for the
+        leading one and 1 elsewhere
+        """
+        samples = {}
+        for spec in self.inputs:
+            shape = [
+                dim if isinstance(dim, int) and dim > 0 else (batch_size if i == 0 else 1)
+                for i, dim in enumerate(spec.shape)
+            ]
+            samples[spec.name] = np.zeros(shape, dtype=spec.dtype)
+        return samples
+
+
+def find_model_file(model_dir: str, entrypoint: Optional[str] = None) -> str:
+    """
+    Locate the ONNX graph inside an extracted model artifact
+    """
+    if entrypoint:
+        path = os.path.normpath(os.path.join(model_dir, entrypoint))
+        if path.startswith(os.path.abspath(model_dir) + os.sep) and os.path.isfile(path):
+            return path
+        raise FileNotFoundError(f"Model entrypoint {entrypoint} not found in {model_dir}")
+
+    candidates = sorted(
+        os.path.join(dirpath, filename)
+        for dirpath, _dirnames, filenames in os.walk(model_dir)
+        for filename in filenames
+        if filename.endswith(".onnx")
+    )
+    if not candidates:
+        raise FileNotFoundError(f"No ONNX model found in {model_dir}")
+    return candidates[0]
+
+
+PREPARED_SUFFIX = ".prepared"
+
+
+def is_prepared(model_path: str) -> bool:
+    """
+    Whether `model_path` was rewritten by `prepare_model` for the onnxruntime we are running
+    """
+    try:
+        with open(model_path + PREPARED_SUFFIX) as f:
+            return f.read().strip() == ort.__version__
+    except FileNotFoundError:
+        return False
+
+
+def prepare_model(model_path: str) -> None:
+    """
+    Rewrite an ONNX graph in place so its weights can be memory-mapped.
+
+    The graph is optimized once, offline, and every initializer of at least a page moves to
+    an uncompressed `<model>.onnx.data` file next to it. onnxruntime maps that file instead of
+    copying the weights, so every process on the host loading the model shares one copy in the
+    page cache. Sessions then skip graph optimizations, which would otherwise rebuild private
+    copies of the fused weights.
+    """
+    model_dir = os.path.dirname(model_path)
+    filename = os.path.basename(model_path)
+    optimized_path = os.path.join(model_dir, f".{filename}.optimized")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = optimized_path
+    options.add_session_config_entry("session.optimized_model_external_initializers_file_name", filename + ".data")
+    options.add_session_config_entry(
+        "session.optimized_model_external_initializers_min_size_in_bytes", str(mmap.PAGESIZE)
+    )
+    ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    os.replace(optimized_path, model_path)
+    with open(model_path + PREPARED_SUFFIX, "w") as f:
+        f.write(ort.__version__)
+
+
+def prepare_model_dir(model_dir: str) -> None:
+    """
+    `prepare_model` every graph of an extracted artifact, models that cannot be prepared are
+    left as they are and loaded the regular way
+    """
+    for dirpath, _dirnames, filenames in os.walk(model_dir):
+        for filename in filenames:
+            if not filename.endswith(".onnx"):
+                continue
+            try:
+                prepare_model(os.path.join(dirpath, filename))
+            except Exception as e:
+                logger.error(f"Could not prepare {filename} for memory-mapped loading: {e}")
+
+
+def load_session(
+    key: SessionKey, model_path: str, warmup: bool = True, intra_op_threads: Optional[int] = None
+) -> LoadedModel:
+    settings = get_settings()
+    options = ort.SessionOptions()
+    if is_prepared(model_path):
+        # Already optimized by `prepare_model`, the weights are used straight from the mapping
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    else:
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    intra_op_threads = intra_op_threads or settings.INFERENCE_INTRA_OP_THREADS
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+    model = LoadedModel(
+        key=key,
+        path=model_path,
+        session=session,
+        inputs=[TensorSpec(i.name, list(i.shape), ONNX_TYPES.get(i.type, np.float32)) for i in session.get_inputs()],
+        outputs=[o.name for o in session.get_outputs()],
+        # Weights dominate the footprint of a session, the graph file size is a good estimate
+        size=model_size(model_path),
+    )
+    if warmup:
+        # The first run allocates arenas and picks kernels, pay for it before real traffic arrives
+        model.run(model.sample_inputs())
+    logger.info(f"Loaded inference session for {key[0]}:{key[1]} ({model.size} bytes)")
+    return model
+
+
+def model_size(model_path: str) -> int:
+    model_dir = os.path.dirname(model_path)
+    return sum(
+        os.path.getsize(os.path.join(model_dir, filename))
+        for filename in os.listdir(model_dir)
+        if os.path.isfile(os.path.join(model_dir, filename))
+    )
+
+
+class SessionCache:
+    """
+    LRU cache of loaded inference sessions bounded by an estimated memory budget.
+
+    Sessions are loaded (and warmed up) in a worker thread, concurrent requests for a model
+    that is still loading wait for the same load. A custom `loader` can load them elsewhere,
+    `on_evict` is told about every session leaving the cache.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        warmup: bool = True,
+        loader: Optional[Callable[[SessionKey, str, bool], Awaitable[LoadedModel]]] = None,
+        on_evict: Optional[Callable[[LoadedModel], None]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.warmup = warmup
+        self.loader = loader or (lambda key, path, warmup: to_thread.run_sync(load_session, key, path, warmup))
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[SessionKey, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+
+    def __contains__(self, key: SessionKey) -> bool:
+        with self._lock:
+            return key in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(model.size for model in self._sessions.values())
+
+    def peek(self, key: SessionKey) -> Optional[LoadedModel]:
+        with self._lock:
+            model = self._sessions.get(key)
+            if model is not None:
+                self._sessions.move_to_end(key)
+            return model
+
+    async def get(self, key: SessionKey, model_path: str) -> LoadedModel:
+        model = self.peek(key)
+        if model is not None:
+            return model
+        return await self._loads.do(repr(key), lambda: self._load(key, model_path))
+
+    async def _load(self, key: SessionKey, model_path: str) -> LoadedModel:
+        model = await self.loader(key, model_path, self.warmup)
+        self.put(model)
+        return model
+
+    def put(self, model: LoadedModel) -> None:
+        evicted = []
+        with self._lock:
+            self._sessions[model.key] = model
+            self._sessions.move_to_end(model.key)
+            used = sum(m.size for m in self._sessions.values())
+            while used > self.max_bytes and len(self._sessions) > 1:
+                _key, oldest = self._sessions.popitem(last=False)
+                used -= oldest.size
+                evicted.append(oldest)
+        for oldest in evicted:
+            logger.info(f"Evicted inference session for {oldest.key[0]}:{oldest.key[1]}")
+            self._notify_evicted(oldest)
+
+    def evict(self, key: SessionKey) -> None:
+        with self._lock:
+            model = self._sessions.pop(key, None)
+        if model is not None:
+            self._notify_evicted(model)
+
+    def clear(self) -> None:
+        with self._lock:
+            models = list(self._sessions.values())
+            self._sessions.clear()
+        for model in models:
+            self._notify_evicted(model)
+
+    def _notify_evicted(self, model: LoadedModel) -> None:
+        if self.on_evict is not None:
+            self.on_evict(model)
+
+
+_session_cache: Optional[SessionCache] = None
+
+
+def get_session_cache() -> SessionCache:
+    global _session_cache
+    if _session_cache is None:
+        settings = get_settings()
+        if settings.INFERENCE_EXECUTION_MODE == "process":
+            from .process_pool import get_inference_pool
+
+            pool = get_inference_pool()
+            _session_cache = SessionCache(
+                settings.INFERENCE_SESSION_CACHE_MAX_BYTES, settings.INFERENCE_WARMUP, pool.load, pool.unload_soon
+            )
+        else:
+            _session_cache = SessionCache(settings.INFERENCE_SESSION_CACHE_MAX_BYTES, settings.INFERENCE_WARMUP)
+    return _session_cache
@@ -1,13 +1,71 @@
+import os
+from anyio import to_thread
 from fastapi import BackgroundTasks
 
+from core.config import get_settings
+from core.logger import logging
 from db.models.ai_models import AiModel
-from utils.net_utils import download_file
+from server.inference.session_cache import prepare_model_dir
+from utils.archive_utils import extract_zip
+from utils.artifact_cache import get_artifact_cache
+from utils.net_utils import download_s3_file
+from utils.single_flight import SingleFlight, async_file_lock
+from utils.storage_utils import get_model_key, get_model_object_key, is_sha256
+
+logger = logging.getLogger(__name__)
+
+# One download per artifact at a time in this process, the lock file covers the other workers
+model_downloads = SingleFlight()
 
 
 async def download_model(model: AiModel, background_tasks: BackgroundTasks):
     background_tasks.add_task(download_in_the_background, model)
 
 
-def download_in_the_background(model: AiModel):
-    pass
+async def fetch_model(model: AiModel) -> str:
+    """
+    Return the local directory of a model, pulling it into the artifact cache on a miss
+    """
+    cache = get_artifact_cache()
+    key = get_model_key(model.name, model.version, model.sha256)
+    # The lookup may flush the index under the lock another worker holds while it deletes evicted
+    # models, it must not stall the event loop
+    path = await to_thread.run_sync(cache.get, key)
+    if path is not None:
+        return path
+    return await model_downloads.do(key, lambda: _fetch_model_locked(model, key))
+
+
+async def _fetch_model_locked(model: AiModel, key: str) -> str:
+    cache = get_artifact_cache()
+    async with async_file_lock(cache.lock_path(key)):
+        # Another worker may have installed it while we were waiting on the lock
+        await to_thread.run_sync(cache.refresh)
+        path = await to_thread.run_sync(cache.get, key)
+        if path is not None:
+            return path
+        return await _download_to_cache(model, key)
+
+
+async def _download_to_cache(model: AiModel, key: str) -> str:
+    cache = get_artifact_cache()
+    with cache.staging() as staging_dir:
+        archive_path = os.path.join(staging_dir, "artifact.zip")
+        sha256 = model.sha256 if is_sha256(model.sha256) else None
+        await download_s3_file(
+            get_model_object_key(model.name, model.version, model.sha256), archive_path, sha256=sha256
+        )
+        model_dir = os.path.join(staging_dir, "model")
+        # Members of an archive verified against its sha256 do not need their CRC checked again
+        await to_thread.run_sync(lambda: extract_zip(archive_path, model_dir, verify_crc=sha256 is None))
+        os.remove(archive_path)
+        if get_settings().INFERENCE_MMAP_WEIGHTS:
+            await to_thread.run_sync(prepare_model_dir, model_dir)
+        return await to_thread.run_sync(cache.install, key, model_dir)
+
 
+async def download_in_the_background(model: AiModel):
+    try:
+        await fetch_model(model)
+    except Exception as e:
+        logger.error(f"Error downloading model {model.name}:{model.version}: {e}")
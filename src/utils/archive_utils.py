@@ -0,0 +1,161 @@
+import errno
+import os
+import stat
+import struct
+import zipfile
+import zlib
+from typing import List, Optional, Tuple
+
+from core.config import get_settings
+
+# Fixed part of a zip local file header, the member data follows its name and extra field
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+# Size of the blocks inflated or checksummed at a time
+COPY_BLOCK_SIZE = 1024 * 1024
+MAX_PATH_BYTES = 4096
+MAX_NAME_BYTES = 255
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def extract_zip(
+    archive_path: str,
+    dest_dir: str,
+    max_member_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+    max_members: Optional[int] = None,
+    verify_crc: bool = True,
+) -> int:
+    """
+    Extract a zip archive into `dest_dir` and return the number of bytes written.
+
+    Members are located through the central directory and streamed straight to their final
+    path. Stored (uncompressed) members are copied from their offset in the archive with
+    `copy_file_range`, without going through user space. Deflated members are inflated
+    block by block. Paths, member count and sizes are checked against the limits before
+    anything is written, and sizes again while streaming, so a header lying about a member
+    size cannot fill the disk. `verify_crc=False` skips the CRC of stored members for
+    archives whose checksum was already verified as a whole.
+    """
+    settings = get_settings()
+    max_member_bytes = max_member_bytes or settings.MODEL_ARCHIVE_MAX_MEMBER_BYTES
+    max_total_bytes = max_total_bytes or settings.MODEL_ARCHIVE_MAX_TOTAL_BYTES
+    max_members = max_members or settings.MODEL_ARCHIVE_MAX_MEMBERS
+    dest_dir = os.path.abspath(dest_dir)
+
+    with open(archive_path, "rb") as raw, zipfile.ZipFile(raw) as archive:
+        members = archive.infolist()
+        if len(members) > max_members:
+            raise ArchiveError(f"Archive has {len(members)} members, the limit is {max_members}")
+        if sum(info.file_size for info in members) > max_total_bytes:
+            raise ArchiveError(f"Archive expands beyond {max_total_bytes} bytes")
+        plan = _plan(members, dest_dir, max_member_bytes)
+
+        os.makedirs(dest_dir, exist_ok=True)
+        total = 0
+        for info, path in plan:
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            budget = min(max_member_bytes, max_total_bytes - total)
+            if info.compress_type == zipfile.ZIP_STORED:
+                total += _copy_stored(raw.fileno(), info, path, budget, verify_crc)
+            else:
+                total += _inflate(archive, info, path, budget)
+    return total
+
+
+def _plan(members: List[zipfile.ZipInfo], dest_dir: str, max_member_bytes: int) -> List[Tuple[zipfile.ZipInfo, str]]:
+    plan = []
+    for info in members:
+        name = info.filename
+        if info.flag_bits & 0x1:
+            raise ArchiveError(f"Encrypted member {name}")
+        if stat.S_ISLNK(info.external_attr >> 16):
+            raise ArchiveError(f"Symbolic link member {name}")
+        if info.file_size > max_member_bytes:
+            raise ArchiveError(f"Member {name} is {info.file_size} bytes, the limit is {max_member_bytes}")
+        parts = name.replace("\\", "/").split("/")
+        if (
+            len(name.encode()) > MAX_PATH_BYTES
+            or any(len(part.encode()) > MAX_NAME_BYTES for part in parts)
+            or name.startswith(("/", "\\"))
+            or ".." in parts
+            or ":" in parts[0]
+        ):
+            raise ArchiveError(f"Unsafe member path {name}")
+        path = os.path.normpath(os.path.join(dest_dir, *parts))
+        if not path.startswith(dest_dir + os.sep):
+            raise ArchiveError(f"Unsafe member path {name}")
+        plan.append((info, path))
+    return plan
+
+
+def _copy_stored(src_fd: int, info: zipfile.ZipInfo, path: str, budget: int, verify_crc: bool) -> int:
+    size = info.compress_size
+    if size != info.file_size or size > budget:
+        raise ArchiveError(f"Member {info.filename} does not fit the extraction limits")
+
+    header = os.pread(src_fd, LOCAL_HEADER.size, info.header_offset)
+    if len(header) != LOCAL_HEADER.size or header[:4] != LOCAL_HEADER_SIGNATURE:
+        raise ArchiveError(f"Bad local header for member {info.filename}")
+    fields = LOCAL_HEADER.unpack(header)
+    offset = info.header_offset + LOCAL_HEADER.size + fields[10] + fields[11]
+
+    dst_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _copy_range(src_fd, dst_fd, offset, size, info.filename)
+    finally:
+        os.close(dst_fd)
+
+    if verify_crc and _crc32(src_fd, offset, size) != info.CRC:
+        raise ArchiveError(f"Bad CRC for member {info.filename}")
+    return size
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, size: int, name: str) -> None:
+    copied = 0
+    try:
+        while copied < size:
+            n = os.copy_file_range(src_fd, dst_fd, size - copied, offset + copied)
+            if n == 0:
+                raise ArchiveError(f"Member {name} is truncated")
+            copied += n
+        return
+    except (AttributeError, OSError) as e:
+        # Not available on this platform or filesystem pair, copy through user space
+        if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+    while copied < size:
+        block = os.pread(src_fd, min(COPY_BLOCK_SIZE, size - copied), offset + copied)
+        if not block:
+            raise ArchiveError(f"Member {name} is truncated")
+        os.pwrite(dst_fd, block, copied)
+        copied += len(block)
+
+
+def _crc32(fd: int, offset: int, size: int) -> int:
+    crc, end = 0, offset + size
+    while offset < end:
+        block = os.pread(fd, min(COPY_BLOCK_SIZE, end - offset), offset)
+        if not block:
+            break
+        crc = zlib.crc32(block, crc)
+        offset += len(block)
+    return crc
+
+
+def _inflate(archive: zipfile.ZipFile, info: zipfile.ZipInfo, path: str, budget: int) -> int:
+    written = 0
+    # zipfile checks the CRC once the member is fully read
+    with archive.open(info) as src, open(path, "wb") as dst:
+        while block := src.read(COPY_BLOCK_SIZE):
+            written += len(block)
+            if written > budget:
+                raise ArchiveError(f"Member {info.filename} expands beyond the extraction limits")
+            dst.write(block)
+    return written
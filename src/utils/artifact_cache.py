@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional
+
+from core.config import get_settings
+from core.logger import logging
+from .single_flight import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    size: int
+    last_access: float
+    hits: int = 0
+
+
+class ArtifactCache:
+    """
+    Size-bounded LRU cache of model artifacts on local disk.
+
+    Entries are files or directories under `root`, addressed by a relative key such as
+    "<name>/<version>". New entries are prepared in a staging directory on the same filesystem
+    and moved in with a single rename, so readers never observe a half written artifact.
+    The index is persisted next to the entries so a restart does not need to rescan the tree.
+    Several processes can share one cache root, index updates are merged under a file lock.
+    """
+
+    INDEX_FILE = "index.json"
+    STAGING_DIR = ".staging"
+    LOCKS_DIR = ".locks"
+    # Access times are only flushed to disk this often, installs and evictions flush immediately
+    INDEX_FLUSH_INTERVAL = 30.0
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries: Dict[str, CacheEntry] = {}
+        self._last_flush = 0.0
+        os.makedirs(os.path.join(self.root, self.STAGING_DIR), exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def path_for(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        reserved = (self.INDEX_FILE, self.STAGING_DIR, self.LOCKS_DIR)
+        if not path.startswith(self.root + os.sep) or os.path.relpath(path, self.root).split(os.sep)[0] in reserved:
+            raise ValueError(f"Invalid cache key: {key}")
+        return path
+
+    def lock_path(self, key: str) -> str:
+        """
+        Lock file guarding the installation of `key` across processes
+        """
+        return os.path.join(self.root, self.LOCKS_DIR, hashlib.sha1(key.encode()).hexdigest() + ".lock")
+
+    def refresh(self) -> None:
+        """
+        Pick up entries installed or evicted by other processes sharing this cache root
+        """
+        with self._lock, file_lock(self._index_lock_path):
+            self._merge_disk_index()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the path of a cached artifact and mark it as recently used, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = self.path_for(key)
+            if not os.path.exists(path):
+                # Removed behind our back, forget about it
+                del self._entries[key]
+                self._save_index()
+                return None
+            entry.last_access = time.time()
+            entry.hits += 1
+            if time.monotonic() - self._last_flush > self.INDEX_FLUSH_INTERVAL:
+                self._save_index()
+            return path
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries and os.path.exists(self.path_for(key))
+
+    @contextmanager
+    def staging(self) -> Iterator[str]:
+        """
+        Temporary directory on the cache filesystem, removed on exit whatever happens
+        """
+        path = tempfile.mkdtemp(dir=os.path.join(self.root, self.STAGING_DIR))
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def install(self, key: str, staged_path: str) -> str:
+        """
+        Atomically move a staged file or directory into the cache under `key`
+        """
+        size = _disk_usage(staged_path)
+        if size > self.max_bytes:
+            raise ValueError(f"Artifact {key} ({size} bytes) is larger than the cache budget ({self.max_bytes} bytes)")
+
+        path = self.path_for(key)
+        with self._lock, file_lock(self._index_lock_path):
+            self._merge_disk_index()
+            self._evict_to_fit(size, keep=key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self._remove_path(path)
+            os.rename(staged_path, path)
+            self._entries[key] = CacheEntry(key=key, size=size, last_access=time.time())
+            self._write_index()
+        logger.info(f"Installed {key} in the artifact cache ({size} bytes)")
+        return path
+
+    def evict(self, key: str) -> None:
+        with self._lock, file_lock(self._index_lock_path):
+            self._merge_disk_index()
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._remove_path(self.path_for(key))
+            self._write_index()
+        logger.info(f"Evicted {key} from the artifact cache ({entry.size} bytes)")
+
+    def _evict_to_fit(self, size: int, keep: str) -> None:
+        used = sum(entry.size for key, entry in self._entries.items() if key != keep)
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_access):
+            if used + size <= self.max_bytes:
+                break
+            if entry.key == keep:
+                continue
+            self._entries.pop(entry.key)
+            self._remove_path(self.path_for(entry.key))
+            used -= entry.size
+            logger.info(f"Evicted {entry.key} from the artifact cache ({entry.size} bytes)")
+
+    def _remove_path(self, path: str) -> None:
+        # Rename first so the entry disappears atomically, then delete at leisure
+        trash = tempfile.mkdtemp(dir=os.path.join(self.root, self.STAGING_DIR))
+        try:
+            if os.path.exists(path):
+                os.rename(path, os.path.join(trash, "entry"))
+        finally:
+            shutil.rmtree(trash, ignore_errors=True)
+
+    @property
+    def _index_lock_path(self) -> str:
+        return os.path.join(self.root, self.LOCKS_DIR, "index.lock")
+
+    def _load_index(self) -> None:
+        with self._lock, file_lock(self._index_lock_path):
+            self._merge_disk_index()
+
+    def _read_index(self) -> Dict[str, CacheEntry]:
+        try:
+            with open(self.index_path) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (ValueError, OSError) as e:
+            logger.error(f"Ignoring unreadable artifact cache index {self.index_path}: {e}")
+            return {}
+        return {item["key"]: CacheEntry(**item) for item in raw.get("entries", [])}
+
+    def _merge_disk_index(self) -> None:
+        # Entries whose files are gone were evicted (possibly by another process)
+        merged = {}
+        for key, entry in {**self._entries, **self._read_index()}.items():
+            if not os.path.exists(self.path_for(key)):
+                continue
+            ours = self._entries.get(key)
+            if ours is not None:
+                entry.last_access = max(entry.last_access, ours.last_access)
+                entry.hits = max(entry.hits, ours.hits)
+            merged[key] = entry
+        self._entries = merged
+
+    def _save_index(self) -> None:
+        with file_lock(self._index_lock_path):
+            self._merge_disk_index()
+            self._write_index()
+
+    def _write_index(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, self.STAGING_DIR), suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"entries": [asdict(entry) for entry in self._entries.values()]}, f)
+        os.replace(tmp_path, self.index_path)
+        self._last_flush = time.monotonic()
+
+
+def _disk_usage(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+_artifact_cache: Optional[ArtifactCache] = None
+
+
+def get_artifact_cache() -> ArtifactCache:
+    global _artifact_cache
+    if _artifact_cache is None:
+        settings = get_settings()
+        _artifact_cache = ArtifactCache(settings.MODEL_PATH, settings.MODEL_CACHE_MAX_BYTES)
+    return _artifact_cache
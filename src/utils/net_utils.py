@@ -1,31 +1,190 @@
 import os
-from typing import Optional
-from io import BytesIO
+import hashlib
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, BinaryIO, Tuple, Union
+from uuid import uuid4
 import urllib.request
 import urllib.parse
 import urllib.error
 import shutil
 import tempfile
+from anyio import to_thread
+from botocore.exceptions import ClientError
 from core.config import get_settings
 from .aws import s3
-from fastapi import File, UploadFile
+from .storage_utils import get_blob_key
+from fastapi import UploadFile
 from core.logger import logging
 
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
 
-async def download_file(url: str, path: str):
-    if "s3" in url.lower():
-        await download_s3_file(url, path)
+
+@dataclass
+class UploadResult:
+    key: str
+    size: int
+    parts: int
+    sha256: str
+    deduplicated: bool = False
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumMismatch(DownloadError):
+    pass
+
+
+# Size of the blocks copied from a response body into the destination file
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+async def download_file(
+    url: str,
+    path: str,
+    sha256: Optional[str] = None,
+    part_size: int = settings.DOWNLOAD_PART_SIZE,
+    concurrency: int = settings.DOWNLOAD_CONCURRENCY,
+):
+    """
+    Download an http(s) URL, an S3 object or a local file to `path` without blocking the event loop.
+
+    Large objects are fetched with parallel ranged GETs written at their offsets in a preallocated
+    file. The file only appears at `path` once complete and, when `sha256` is given, verified.
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == "s3":
+        await download_s3_file(parsed.path.lstrip("/"), path, parsed.netloc, sha256, part_size, concurrency)
+    elif "s3" in url.lower() and parsed.scheme not in ("http", "https"):
+        await download_s3_file(url, path, sha256=sha256, part_size=part_size, concurrency=concurrency)
     elif "http" in url.lower():
-        urllib.request.urlretrieve(url, path)
+        size, accepts_ranges = await to_thread.run_sync(_http_head, url)
+
+        def fetch_range(start: Optional[int], end: Optional[int], fd: int) -> None:
+            _http_get_into(url, start, end, fd)
+
+        await _ranged_download(fetch_range, size if accepts_ranges else None, path, sha256, part_size, concurrency)
     else:
-        shutil.copy(url, path)
+        await _finish_download(path, sha256, lambda tmp_path: shutil.copyfile(url, tmp_path))
+
+
+async def download_s3_file(
+    url: str,
+    path: str,
+    bucket_name: str = settings.AWS_MODEL_BUCKET,
+    sha256: Optional[str] = None,
+    part_size: int = settings.DOWNLOAD_PART_SIZE,
+    concurrency: int = settings.DOWNLOAD_CONCURRENCY,
+):
+    if bucket_name is None:
+        bucket_name = settings.AWS_MODEL_BUCKET
+    head = await to_thread.run_sync(lambda: s3.head_object(Bucket=bucket_name, Key=url))
+
+    def fetch_range(start: Optional[int], end: Optional[int], fd: int) -> None:
+        kwargs = {"Range": f"bytes={start}-{end}"} if start is not None else {}
+        body = s3.get_object(Bucket=bucket_name, Key=url, **kwargs)["Body"]
+        _copy_into(body, fd, start or 0)
+
+    await _ranged_download(fetch_range, head["ContentLength"], path, sha256, part_size, concurrency)
+
+
+async def _ranged_download(
+    fetch_range: Callable[[Optional[int], Optional[int], int], None],
+    size: Optional[int],
+    path: str,
+    sha256: Optional[str],
+    part_size: int,
+    concurrency: int,
+):
+    """
+    Split [0, size) into parts of `part_size` and fetch them with up to `concurrency` threads.
+    Without a known size (or range support) the whole body is fetched in one request.
+    """
+
+    def fetch(tmp_path: str) -> None:
+        with open(tmp_path, "wb") as f:
+            fd = f.fileno()
+            if size is None:
+                fetch_range(None, None, fd)
+                return
+            _preallocate(fd, size)
+            ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+            if len(ranges) == 1:
+                fetch_range(*ranges[0], fd)
+                return
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                futures = [pool.submit(fetch_range, start, end, fd) for start, end in ranges]
+                for future in futures:
+                    future.result()
+
+    await _finish_download(path, sha256, fetch)
+
+
+async def _finish_download(path: str, sha256: Optional[str], fetch: Callable[[str], None]):
+    # Download next to the destination and rename, so readers never see a partial file
+    tmp_path = f"{path}.{uuid4().hex}.part"
+    try:
+        await to_thread.run_sync(fetch, tmp_path)
+        if sha256 is not None:
+            digest = await to_thread.run_sync(file_sha256, tmp_path)
+            if digest != sha256:
+                raise ChecksumMismatch(f"Expected sha256 {sha256}, got {digest}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(COPY_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _preallocate(fd: int, size: int) -> None:
+    if size == 0:
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        # Not every filesystem supports fallocate, a sparse file works just as well
+        os.ftruncate(fd, size)
+
 
+def _copy_into(body: BinaryIO, fd: int, offset: int) -> None:
+    while block := body.read(COPY_BLOCK_SIZE):
+        written = 0
+        while written < len(block):
+            written += os.pwrite(fd, block[written:], offset + written)
+        offset += len(block)
 
-async def download_s3_file(url: str, path: str, bucket_name: str = settings.AWS_MODEL_BUCKET):
-    s3.download_file(bucket_name, url, path)
+
+def _http_head(url: str) -> Tuple[Optional[int], bool]:
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request) as response:
+        length = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return (int(length) if length is not None else None), accepts_ranges
+
+
+def _http_get_into(url: str, start: Optional[int], end: Optional[int], fd: int) -> None:
+    request = urllib.request.Request(url)
+    if start is not None:
+        request.add_header("Range", f"bytes={start}-{end}")
+    with urllib.request.urlopen(request) as response:
+        if start is not None and response.status != 206:
+            raise DownloadError(f"Expected a partial response for {url}, got {response.status}")
+        _copy_into(response, fd, start or 0)
 
 
 async def upload_file(file_name: str, object_name: Optional[str] = None, bucket_name: str = settings.AWS_MODEL_BUCKET):
@@ -41,13 +200,142 @@ async def upload_file(file_name: str, object_name: Optional[str] = None, bucket_
     return True
 
 
-async def upload_from_file(file: File, object_name: Optional[str] = None, bucket_name: str = settings.AWS_MODEL_BUCKET):
+async def read_chunk(file: Union[UploadFile, BinaryIO], size: int) -> bytes:
+    """
+    Read at most `size` bytes from an UploadFile or a plain binary file object
+    """
+    data = file.read(size)
+    if inspect.isawaitable(data):
+        data = await data
+    return data
+
+
+async def _read_head(file: Union[UploadFile, BinaryIO], chunk_size: int) -> Tuple[bytes, bytes]:
+    # Reading one chunk ahead tells us whether the file fits in a single put_object
+    chunk = await read_chunk(file, chunk_size)
+    next_chunk = await read_chunk(file, chunk_size) if len(chunk) == chunk_size else b""
+    return chunk, next_chunk
+
+
+async def _put_object(chunk: bytes, object_name: str, bucket_name: str) -> UploadResult:
+    sha256 = await to_thread.run_sync(lambda: hashlib.sha256(chunk).hexdigest())
+    await to_thread.run_sync(lambda: s3.put_object(Bucket=bucket_name, Key=object_name, Body=chunk))
+    return UploadResult(key=object_name, size=len(chunk), parts=1, sha256=sha256)
+
+
+async def _multipart_upload(
+    file: Union[UploadFile, BinaryIO],
+    object_name: str,
+    bucket_name: str,
+    chunk_size: int,
+    chunk: bytes,
+    next_chunk: bytes,
+) -> UploadResult:
+    upload = await to_thread.run_sync(
+        lambda: s3.create_multipart_upload(Bucket=bucket_name, Key=object_name)
+    )
+    upload_id = upload["UploadId"]
+    hasher = hashlib.sha256()
+    parts = []
+    size = 0
+    try:
+        while chunk:
+            part_number = len(parts) + 1
+            # hashlib releases the GIL on large buffers, so hash off the event loop too
+            await to_thread.run_sync(hasher.update, chunk)
+            resp = await to_thread.run_sync(
+                lambda: s3.upload_part(
+                    Bucket=bucket_name, Key=object_name, UploadId=upload_id, PartNumber=part_number, Body=chunk
+                )
+            )
+            parts.append({"ETag": resp["ETag"], "PartNumber": part_number})
+            size += len(chunk)
+            chunk, next_chunk = next_chunk, (await read_chunk(file, chunk_size) if next_chunk else b"")
+
+        await to_thread.run_sync(
+            lambda: s3.complete_multipart_upload(
+                Bucket=bucket_name, Key=object_name, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        )
+    except Exception as e:
+        logger.error(f"Error uploading {object_name}, aborting multipart upload: {e}")
+        await to_thread.run_sync(
+            lambda: s3.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+        )
+        raise
+
+    return UploadResult(key=object_name, size=size, parts=len(parts), sha256=hasher.hexdigest())
+
+
+async def upload_from_file(
+    file: Union[UploadFile, BinaryIO],
+    object_name: Optional[str] = None,
+    bucket_name: str = settings.AWS_MODEL_BUCKET,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+) -> UploadResult:
+    """
+    Stream a file to S3 in bounded chunks, hashing it on the way.
+
+    Files that fit in a single chunk are sent with one `put_object`, anything larger goes
+    through a multipart upload so only one part is held in memory at a time.
+    """
+    if bucket_name is None:
+        bucket_name = settings.AWS_MODEL_BUCKET
+    chunk_size = max(chunk_size, MIN_PART_SIZE)
+
+    chunk, next_chunk = await _read_head(file, chunk_size)
+    if not next_chunk:
+        return await _put_object(chunk, object_name, bucket_name)
+    return await _multipart_upload(file, object_name, bucket_name, chunk_size, chunk, next_chunk)
+
+
+async def object_exists(object_name: str, bucket_name: str = settings.AWS_MODEL_BUCKET) -> bool:
+    try:
+        await to_thread.run_sync(lambda: s3.head_object(Bucket=bucket_name, Key=object_name))
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+async def upload_blob(
+    file: Union[UploadFile, BinaryIO],
+    bucket_name: str = settings.AWS_MODEL_BUCKET,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+) -> UploadResult:
+    """
+    Store a file under its content address (see `storage_utils.get_blob_key`).
+
+    The SHA-256 is computed in the same pass that streams the bytes. Small files are hashed before
+    anything is sent; larger ones are staged under UPLOAD_STAGING_PREFIX and promoted with a
+    server-side copy. When the blob already exists nothing new is kept in the bucket.
+    """
     if bucket_name is None:
         bucket_name = settings.AWS_MODEL_BUCKET
-    buf = file.default.read()
-    print("------------------")
-    print(bucket_name)
-    print("------------------")
-    response = s3.put_object(Bucket=bucket_name, Key=object_name, Body=buf)
-    print("------------------")
-    return response
+    chunk_size = max(chunk_size, MIN_PART_SIZE)
+
+    chunk, next_chunk = await _read_head(file, chunk_size)
+    if not next_chunk:
+        sha256 = await to_thread.run_sync(lambda: hashlib.sha256(chunk).hexdigest())
+        key = get_blob_key(sha256)
+        if await object_exists(key, bucket_name):
+            return UploadResult(key=key, size=len(chunk), parts=0, sha256=sha256, deduplicated=True)
+        return await _put_object(chunk, key, bucket_name)
+
+    staging_key = f"{settings.UPLOAD_STAGING_PREFIX}/{uuid4().hex}"
+    staged = await _multipart_upload(file, staging_key, bucket_name, chunk_size, chunk, next_chunk)
+    key = get_blob_key(staged.sha256)
+    deduplicated = True
+    try:
+        if not await object_exists(key, bucket_name):
+            deduplicated = False
+            await to_thread.run_sync(
+                lambda: s3.copy({"Bucket": bucket_name, "Key": staging_key}, bucket_name, key)
+            )
+    finally:
+        await to_thread.run_sync(lambda: s3.delete_object(Bucket=bucket_name, Key=staging_key))
+
+    return UploadResult(
+        key=key, size=staged.size, parts=staged.parts, sha256=staged.sha256, deduplicated=deduplicated
+    )
@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from passlib.context import CryptContext
+
+from core.config import get_settings
+from core.metrics import get_metrics
+
+HASH_MS_BUCKETS = [10, 25, 50, 100, 200, 300, 500, 1000, 2500]
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HasherOverloaded(Exception):
+    pass
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated pool, so a burst of logins never blocks the event loop.
+
+    Processes by default: passlib's os_crypt backend, used when the `bcrypt` package is not
+    installed, holds the GIL for the whole hash. At most `max_pending` calls are queued or running,
+    beyond that `HasherOverloaded` is raised right away instead of letting the queue grow.
+    """
+
+    def __init__(self, workers: int, max_pending: int, mode: str = "process"):
+        self.workers = workers
+        self.max_pending = max_pending
+        if mode == "process":
+            self._executor: Executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="password-hasher")
+        self._pending = 0
+
+        registry = get_metrics()
+        registry.unregister("password_hasher_pending")
+        registry.gauge("password_hasher_pending", fn=lambda: self._pending)
+        self.rejected = registry.counter("password_hasher_rejected_total")
+        self.duration_ms = registry.histogram("password_hasher_duration_ms", HASH_MS_BUCKETS)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    async def _run(self, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            self.rejected.inc()
+            raise HasherOverloaded(f"{self._pending} password hashes already pending")
+        self._pending += 1
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+            self.duration_ms.observe((time.monotonic() - started) * 1000)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_password_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    global _password_hasher
+    if _password_hasher is None:
+        settings = get_settings()
+        workers = settings.PASSWORD_HASHER_WORKERS or max(1, min(4, os.cpu_count() or 1))
+        _password_hasher = PasswordHasher(workers, settings.PASSWORD_HASHER_MAX_PENDING, settings.PASSWORD_HASHER_MODE)
+    return _password_hasher
+
+
+def shutdown_password_hasher() -> None:
+    global _password_hasher
+    if _password_hasher is not None:
+        _password_hasher.close()
+        _password_hasher = None
@@ -0,0 +1,16 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# UTC datetimes end in "Z" like pydantic writes them, not "+00:00"
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+
+
+class UTCORJSONResponse(ORJSONResponse):
+    """
+    orjson response with the same wire format as a pydantic response model
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
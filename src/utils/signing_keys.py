@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import json
+from typing import Dict, List, Optional, Sequence
+
+from Crypto.PublicKey import RSA
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWTError
+
+from core.config import get_settings
+from .encryption import load_rsa_keypair
+
+ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512"}
+
+
+def key_id(public_key: RSA.RsaKey) -> str:
+    """
+    RFC 7638 thumbprint of an RSA public key, every node derives the same id from the same key
+    """
+    members = {"e": _b64(public_key.e), "kty": "RSA", "n": _b64(public_key.n)}
+    digest = hashlib.sha256(json.dumps(members, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _b64(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class KeyRing:
+    """
+    Keys access tokens are signed and verified with.
+
+    With an RSA algorithm the private key signs and its `kid` goes in the token header. Its public
+    key and the previous ones, kept during a rotation until the tokens they signed expire, verify
+    and are published as a JWKS. Keys are parsed once here, verifying a token is a dictionary
+    lookup and a signature check. With HS256 the shared secret does both.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        private_key: Optional[RSA.RsaKey] = None,
+        previous_public_keys: Sequence[RSA.RsaKey] = (),
+        secret: Optional[str] = None,
+    ):
+        self.algorithm = algorithm
+        self.kid: Optional[str] = None
+        self._signing_key: Optional[Key] = None
+        self._verification_keys: Dict[str, Key] = {}
+
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            self._signing_key = jwk.construct(secret, algorithm)
+            return
+        if private_key is None:
+            raise ValueError(f"{algorithm} needs a private key")
+        self.kid = key_id(private_key.publickey())
+        self._signing_key = jwk.construct(private_key.export_key().decode(), algorithm)
+        for public_key in [private_key.publickey(), *previous_public_keys]:
+            self._verification_keys[key_id(public_key)] = jwk.construct(public_key.export_key().decode(), algorithm)
+
+    @property
+    def asymmetric(self) -> bool:
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def sign(self, claims: Dict) -> str:
+        headers = {"kid": self.kid} if self.kid else None
+        return jwt.encode(claims, self._signing_key, algorithm=self.algorithm, headers=headers)
+
+    def decode(self, token: str) -> Dict:
+        if not self.asymmetric:
+            return jwt.decode(token, self._signing_key, algorithms=[self.algorithm])
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._verification_keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key {kid}")
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+    def jwks(self) -> Dict[str, List[Dict]]:
+        keys = []
+        for kid, key in self._verification_keys.items():
+            public = {name: value for name, value in key.to_dict().items() if name in ("kty", "n", "e")}
+            keys.append({**public, "kid": kid, "alg": self.algorithm, "use": "sig"})
+        return {"keys": keys}
+
+
+_key_ring: Optional[KeyRing] = None
+
+
+def get_key_ring() -> KeyRing:
+    global _key_ring
+    if _key_ring is None:
+        settings = get_settings()
+        if settings.JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS:
+            private_key, _public_key = load_rsa_keypair(settings.PRIVATE_KEY_PATH)
+            previous = []
+            for path in filter(None, (part.strip() for part in settings.JWT_PREVIOUS_PUBLIC_KEYS.split(","))):
+                with open(path, "rb") as f:
+                    previous.append(RSA.import_key(f.read()))
+            _key_ring = KeyRing(settings.JWT_ALGORITHM, private_key, previous)
+        else:
+            _key_ring = KeyRing(settings.JWT_ALGORITHM, secret=settings.JWT_SECRET_KEY)
+    return _key_ring
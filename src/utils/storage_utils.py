@@ -1,10 +1,36 @@
 import os
-from core.common import get_settings
+import re
+from core.config import get_settings
+from .artifact_cache import get_artifact_cache
 settings = get_settings()
 
-def get_model_dir(model_name: str, version: str) -> str:
-    return f"{settings.MODEL_PATH}/{model_name}/{version}"
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
 
-def is_model_present(model_name: str, version: str) -> bool:
-    return os.path.exists(get_model_dir(model_name, version))
 
+def get_blob_key(sha256: str) -> str:
+    """
+    Content address of a model artifact in the model bucket
+    """
+    return f"{settings.MODEL_BLOB_PREFIX}/{sha256}.zip"
+
+def is_sha256(value: str | None) -> bool:
+    return bool(SHA256_PATTERN.match(value or ""))
+
+def get_model_object_key(model_name: str, version: str, sha256: str) -> str:
+    # Rows created before content addressing were uploaded as <name>-<version>.zip
+    if is_sha256(sha256):
+        return get_blob_key(sha256)
+    return f"{model_name}-{version}.zip"
+
+def get_model_key(model_name: str, version: str, sha256: str | None = None) -> str:
+    # Content addressed when the digest is known, a model deleted and registered again under the
+    # same name and version with other bytes must not resolve to the old directory
+    if is_sha256(sha256):
+        return f"sha256/{sha256}"
+    return f"{model_name}/{version}"
+
+def get_model_dir(model_name: str, version: str, sha256: str | None = None) -> str:
+    return get_artifact_cache().path_for(get_model_key(model_name, version, sha256))
+
+def is_model_present(model_name: str, version: str, sha256: str | None = None) -> bool:
+    return get_artifact_cache().get(get_model_key(model_name, version, sha256)) is not None
@@ -1,10 +1,18 @@
+import time
+
 import pytest
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import Session, select, delete
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, select, delete
 from passlib.context import CryptContext
+from fastapi import HTTPException
+from jose import jwt
 
 from db.models.user import User
 from server.controllers.auth.auth_controller import AuthController, get_current_user
+from server.controllers.auth import token_cache as token_cache_module
+from server.controllers.auth.token_cache import TokenDenylist, VerifiedTokenCache
 from server.controllers.auth.schemas import (
     CreateUser,
     LoginUser
@@ -134,3 +142,134 @@ async def test_get_current_user_with_token(session: AsyncSession, user: User):
     user = await get_current_user(session, token)
     assert user is not None
 
+
+
+@pytest.mark.anyio
+async def test_stateless_validation_uses_the_user_cache(session: AsyncSession, user: User, token_state):
+    user_cache, _denylist = token_state
+    token = await AuthController.create_access_token(user)
+    assert (await get_current_user(session, token)).email == user.email
+
+    # Served from the cache, the users table is not read again
+    await session.exec(delete(User))
+    await session.commit()
+    assert (await get_current_user(session, token)).email == user.email
+    assert user_cache.hits.value >= 1
+
+
+@pytest.mark.anyio
+async def test_revoked_tokens_are_rejected(session: AsyncSession, user: User, token_state):
+    _user_cache, denylist = token_state
+    token = await AuthController.create_access_token(user)
+    other = await AuthController.create_access_token(user)
+
+    await AuthController.revoke_token(session, token)
+    with pytest.raises(HTTPException) as e:
+        await get_current_user(session, token)
+    assert e.value.status_code == 401
+    assert (await get_current_user(session, other)).email == user.email
+
+    # Other nodes pick the revocation up on their next bulk refresh
+    fresh = TokenDenylist(refresh_interval=60)
+    await fresh.refresh(session)
+    claims = jwt.get_unverified_claims(token)
+    assert fresh.is_revoked(claims["jti"], claims["sub"], claims["iat"])
+
+
+@pytest.mark.anyio
+async def test_tokens_issued_right_after_revoking_every_token_are_valid(session: AsyncSession, user: User):
+    old = await AuthController.create_access_token(user)
+    await AuthController.revoke_user_tokens(session, user.email)
+    # Within the same second as the revocation
+    new = await AuthController.create_access_token(user)
+
+    assert (await get_current_user(session, new)).email == user.email
+    with pytest.raises(HTTPException):
+        await get_current_user(session, old)
+
+    fresh = TokenDenylist(refresh_interval=60)
+    await fresh.refresh(session)
+    for token, revoked in ((old, True), (new, False)):
+        claims = jwt.get_unverified_claims(token)
+        assert fresh.is_revoked(claims["jti"], claims["sub"], claims["iat"]) is revoked
+
+
+@pytest.mark.anyio
+async def test_deleting_a_user_revokes_its_tokens(session: AsyncSession, user: User):
+    token = await AuthController.create_access_token(user)
+    assert await get_current_user(session, token) is not None
+
+    await AuthController.delete_user(session, user.email)
+    with pytest.raises(HTTPException):
+        await get_current_user(session, token)
+
+
+@pytest.mark.anyio
+async def test_repeated_tokens_skip_verification(session: AsyncSession, user: User, token_cache, key_ring, monkeypatch):
+    token = await AuthController.create_access_token(user)
+    assert (await get_current_user(session, token)).email == user.email
+    assert len(token_cache) == 1
+
+    def fail(_token):
+        raise AssertionError("token verified again")
+
+    monkeypatch.setattr(key_ring, "decode", fail)
+    assert (await get_current_user(session, token)).email == user.email
+
+    # Revocation is still checked on every request
+    await AuthController.revoke_token(session, token)
+    with pytest.raises(HTTPException):
+        await get_current_user(session, token)
+
+
+def test_verified_token_cache_bounds_and_expiry(monkeypatch):
+    now = time.time()
+    cache = VerifiedTokenCache(max_entries=2, max_bytes=1024 * 1024)
+    evictions = cache.evictions.value
+
+    cache.put("expired", {"exp": now - 1})
+    cache.put("no-exp", {"sub": "a"})
+    assert len(cache) == 0
+
+    cache.put("a", {"exp": now + 60})
+    cache.put("b", {"exp": now + 600})
+    assert cache.get("a") is not None
+    cache.put("c", {"exp": now + 600})
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.evictions.value == evictions + 1
+
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert len(cache) == 1
+
+    small = VerifiedTokenCache(max_entries=100, max_bytes=3 * (VerifiedTokenCache.ENTRY_OVERHEAD + 10))
+    for i in range(5):
+        small.put(f"token-{i:04d}", {"exp": now + 600})
+    assert len(small) == 3
+    assert small.size_bytes <= small.max_bytes
+
+
+@pytest.mark.anyio
+async def test_local_revocations_survive_a_refresh_from_a_lagging_replica(session: AsyncSession, user: User, monkeypatch):
+    denylist = TokenDenylist(refresh_interval=60, replica_lag=10)
+    monkeypatch.setattr(token_cache_module, "_token_denylist", denylist)
+    token = await AuthController.create_access_token(user)
+    claims = jwt.get_unverified_claims(token)
+    await AuthController.revoke_token(session, token)
+
+    # The replica has not replayed the revocation yet
+    replica_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(replica_engine, info={"read_only": True}) as replica:
+        await denylist.refresh(replica)
+        assert denylist.is_revoked(claims["jti"], claims["sub"], claims["iat"])
+
+        # Past the replica lag the database is the source of truth again
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+        await denylist.refresh(replica)
+        assert not denylist.is_revoked(claims["jti"], claims["sub"], claims["iat"])
+    await replica_engine.dispose()
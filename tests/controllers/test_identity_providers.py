@@ -0,0 +1,131 @@
+import time
+
+import pytest
+from Crypto.PublicKey import RSA
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db.models.user import User
+from server.controllers.auth import identity_providers as identity_providers_module
+from server.controllers.auth.auth_controller import get_current_user
+from server.controllers.auth.identity_providers import (
+    ExternalTokenVerifier,
+    IdentityProvider,
+    JWKSCache,
+)
+from utils import http_client as http_client_module
+from utils.signing_keys import KeyRing
+
+ISSUER = "https://accounts.google.com"
+CLIENT_ID = "test-client-id"
+
+
+class FakeIdentityProvider:
+    """
+    Local stand-in for Google: serves its JWKS over ASGI and issues ID tokens
+    """
+
+    def __init__(self, key: RSA.RsaKey):
+        self.key_ring = KeyRing("RS256", key)
+        self.cache_control = "public, max-age=600"
+        self.jwks_requests = 0
+
+        self.app = FastAPI()
+
+        @self.app.get("/certs")
+        async def certs():
+            self.jwks_requests += 1
+            return JSONResponse(self.key_ring.jwks(), headers={"Cache-Control": self.cache_control})
+
+    def id_token(self, email: str, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": ISSUER,
+            "aud": CLIENT_ID,
+            "sub": "1234567890",
+            "email": email,
+            "email_verified": True,
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        return self.key_ring.sign(payload)
+
+
+@pytest.fixture(scope="module")
+def idp_key() -> RSA.RsaKey:
+    return RSA.generate(2048)
+
+
+@pytest.fixture(scope="function")
+async def fake_idp(monkeypatch, idp_key, external_token_verifier):
+    idp = FakeIdentityProvider(idp_key)
+    client = AsyncClient(transport=ASGITransport(app=idp.app))
+    monkeypatch.setattr(http_client_module, "_http_client", client)
+
+    keys = JWKSCache("google", "http://idp.test/certs", default_ttl=3600, min_refresh_interval=0)
+    verifier = ExternalTokenVerifier(
+        [IdentityProvider("google", [ISSUER], CLIENT_ID, keys)], negative_ttl=30, max_rejected=128
+    )
+    monkeypatch.setattr(identity_providers_module, "_external_token_verifier", verifier)
+    yield idp
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_provider_id_tokens_authenticate_registered_users(session: AsyncSession, user: User, fake_idp):
+    assert (await get_current_user(session, fake_idp.id_token(user.email))).email == user.email
+    assert (await get_current_user(session, fake_idp.id_token(user.email, sub="other"))).email == user.email
+    # The keys were fetched once for both tokens
+    assert fake_idp.jwks_requests == 1
+
+    with pytest.raises(HTTPException) as e:
+        await get_current_user(session, fake_idp.id_token("stranger@example.com"))
+    assert e.value.status_code == 401
+    with pytest.raises(HTTPException):
+        await get_current_user(session, fake_idp.id_token(user.email, email_verified=False))
+
+
+@pytest.mark.anyio
+async def test_provider_keys_follow_cache_headers(session: AsyncSession, user: User, fake_idp):
+    fake_idp.cache_control = "no-cache"
+    await get_current_user(session, fake_idp.id_token(user.email))
+    await get_current_user(session, fake_idp.id_token(user.email, sub="2"))
+    assert fake_idp.jwks_requests == 2
+
+    fake_idp.cache_control = "public, max-age=600"
+    await get_current_user(session, fake_idp.id_token(user.email, sub="3"))
+    await get_current_user(session, fake_idp.id_token(user.email, sub="4"))
+    assert fake_idp.jwks_requests == 3
+
+
+@pytest.mark.anyio
+async def test_rotated_provider_keys_are_fetched_early(session: AsyncSession, user: User, fake_idp):
+    await get_current_user(session, fake_idp.id_token(user.email))
+
+    fake_idp.key_ring = KeyRing("RS256", RSA.generate(2048))
+    assert (await get_current_user(session, fake_idp.id_token(user.email))).email == user.email
+    assert fake_idp.jwks_requests == 2
+
+
+@pytest.mark.anyio
+async def test_rejected_tokens_are_negatively_cached(session: AsyncSession, user: User, fake_idp):
+    verifier = identity_providers_module.get_external_token_verifier()
+    negative_hits = verifier.negative_hits.value
+
+    # Signed by a key the provider never published, every attempt would refetch the keys
+    forged = KeyRing("RS256", RSA.generate(2048)).sign(
+        {"iss": ISSUER, "aud": CLIENT_ID, "email": user.email, "exp": int(time.time()) + 3600}
+    )
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            await get_current_user(session, forged)
+    assert fake_idp.jwks_requests == 1
+    assert verifier.negative_hits.value == negative_hits + 2
+
+    with pytest.raises(HTTPException):
+        await get_current_user(session, fake_idp.id_token(user.email, aud="another-client"))
+    with pytest.raises(HTTPException):
+        await get_current_user(session, "not-a-jwt")
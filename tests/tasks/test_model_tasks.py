@@ -0,0 +1,95 @@
+import asyncio
+import os
+import hashlib
+import zipfile
+import threading
+import pytest
+from io import BytesIO
+
+from db.models.ai_models import AiModel
+from server.tasks.model_tasks import fetch_model
+from utils.net_utils import ChecksumMismatch
+from utils.storage_utils import get_blob_key, is_model_present
+
+
+@pytest.mark.anyio
+async def test_fetch_model_populates_the_artifact_cache(fake_s3, artifact_cache, model_file_bytes: BytesIO):
+    sha256 = hashlib.sha256(model_file_bytes.getvalue()).hexdigest()
+    fake_s3.objects[(None, get_blob_key(sha256))] = model_file_bytes.getvalue()
+    model = AiModel(name="gender", description="test", url_or_path="test", version="0.0.1", sha256=sha256)
+
+    assert not is_model_present("gender", "0.0.1", sha256)
+    path = await fetch_model(model)
+    assert os.path.exists(os.path.join(path, "gender.onnx"))
+    # weights are laid out for memory-mapped loading before the model enters the cache
+    assert os.path.exists(os.path.join(path, "gender.onnx.data"))
+    assert is_model_present("gender", "0.0.1", sha256)
+
+    # a second fetch is served from the cache
+    fake_s3.objects.clear()
+    assert await fetch_model(model) == path
+
+
+@pytest.mark.anyio
+async def test_cache_lookups_run_off_the_event_loop(monkeypatch, fake_s3, artifact_cache, model_file_bytes: BytesIO):
+    sha256 = hashlib.sha256(model_file_bytes.getvalue()).hexdigest()
+    fake_s3.objects[(None, get_blob_key(sha256))] = model_file_bytes.getvalue()
+    model = AiModel(name="gender", description="test", url_or_path="test", version="0.0.1", sha256=sha256)
+    await fetch_model(model)
+
+    # A lookup can wait on the index lock while another worker deletes evicted models
+    lookup_threads = []
+    get = artifact_cache.get
+
+    def recording_get(key):
+        lookup_threads.append(threading.current_thread())
+        return get(key)
+
+    monkeypatch.setattr(artifact_cache, "get", recording_get)
+    await fetch_model(model)
+    assert lookup_threads and threading.main_thread() not in lookup_threads
+
+
+@pytest.mark.anyio
+async def test_concurrent_fetches_download_once(fake_s3, artifact_cache, model_file_bytes: BytesIO):
+    sha256 = hashlib.sha256(model_file_bytes.getvalue()).hexdigest()
+    fake_s3.objects[(None, get_blob_key(sha256))] = model_file_bytes.getvalue()
+    model = AiModel(name="gender", description="test", url_or_path="test", version="0.0.1", sha256=sha256)
+
+    paths = await asyncio.gather(*[fetch_model(model) for _ in range(8)])
+    assert len(set(paths)) == 1
+    assert len(fake_s3.ranges) == 1
+
+
+@pytest.mark.anyio
+async def test_fetch_model_rejects_corrupted_artifacts(fake_s3, artifact_cache, model_file_bytes: BytesIO):
+    sha256 = hashlib.sha256(b"something else").hexdigest()
+    fake_s3.objects[(None, get_blob_key(sha256))] = model_file_bytes.getvalue()
+    model = AiModel(name="gender", description="test", url_or_path="test", version="0.0.1", sha256=sha256)
+
+    with pytest.raises(ChecksumMismatch):
+        await fetch_model(model)
+    assert not is_model_present("gender", "0.0.1", sha256)
+
+
+@pytest.mark.anyio
+async def test_reregistered_models_do_not_resolve_to_the_old_artifact(fake_s3, artifact_cache, model_file_bytes: BytesIO):
+    old_bytes = model_file_bytes.getvalue()
+    # Same model with one more member, other bytes under the same name and version
+    new_file = BytesIO()
+    with zipfile.ZipFile(BytesIO(old_bytes)) as old, zipfile.ZipFile(new_file, "w") as new:
+        for member in old.infolist():
+            new.writestr(member, old.read(member))
+        new.writestr("VERSION", "2")
+    new_bytes = new_file.getvalue()
+
+    paths = []
+    for data in (old_bytes, new_bytes):
+        sha256 = hashlib.sha256(data).hexdigest()
+        fake_s3.objects[(None, get_blob_key(sha256))] = data
+        model = AiModel(name="gender", description="test", url_or_path="test", version="0.0.1", sha256=sha256)
+        paths.append(await fetch_model(model))
+
+    assert paths[0] != paths[1]
+    assert not os.path.exists(os.path.join(paths[0], "VERSION"))
+    assert os.path.exists(os.path.join(paths[1], "VERSION"))
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.pool import NullPool
+
+from core.config import get_settings
+from core.metrics import MetricsRegistry
+from db import pool as pool_module
+from db.pool import InstrumentedQueuePool, create_engine, engine_options
+
+PG_URL = "postgresql+asyncpg://user:pass@db/app"
+
+
+@pytest.fixture
+def metrics_registry(monkeypatch) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    monkeypatch.setattr(pool_module, "get_metrics", lambda: registry)
+    return registry
+
+
+def metric(registry: MetricsRegistry, name: str) -> dict:
+    return next(m for m in registry.snapshot() if m["name"] == name and m["labels"] == {"pool": "test"})
+
+
+def test_queue_pool_uses_the_settings(monkeypatch):
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    monkeypatch.setattr(get_settings(), "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(get_settings(), "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = engine_options(PG_URL)
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 7
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+
+def test_lambda_defaults_to_null_pool(monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "pybe")
+    options = engine_options(PG_URL)
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+
+
+def test_pgbouncer_mode_disables_prepared_statement_caching(monkeypatch):
+    monkeypatch.setattr(get_settings(), "DB_PGBOUNCER", True)
+    options = engine_options(PG_URL)
+    assert options["connect_args"]["statement_cache_size"] == 0
+    names = {options["connect_args"]["prepared_statement_name_func"]() for _ in range(2)}
+    assert len(names) == 2
+
+    engine = create_engine(PG_URL)
+    assert engine.url.query["prepared_statement_cache_size"] == "0"
+
+
+@pytest.mark.asyncio
+async def test_pool_gauges_and_timeouts(tmp_path, monkeypatch, metrics_registry: MetricsRegistry):
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    monkeypatch.setattr(get_settings(), "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(get_settings(), "DB_MAX_OVERFLOW", 1)
+    monkeypatch.setattr(get_settings(), "DB_POOL_TIMEOUT", 0.1)
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", pool_name="test")
+    try:
+        first, second = await engine.connect(), await engine.connect()
+        await first.execute(text("SELECT 1"))
+        assert metric(metrics_registry, "db_pool_checked_out")["value"] == 2
+        assert metric(metrics_registry, "db_pool_overflow")["value"] == 1
+
+        with pytest.raises(exc.TimeoutError):
+            await engine.connect()
+        assert metric(metrics_registry, "db_pool_timeouts_total")["value"] == 1
+        assert metric(metrics_registry, "db_pool_wait_ms")["count"] == 3
+
+        await asyncio.gather(first.close(), second.close())
+        assert metric(metrics_registry, "db_pool_checked_out")["value"] == 0
+    finally:
+        await engine.dispose()
+    # the recreated pool reports under the same name
+    assert metric(metrics_registry, "db_pool_size")["value"] == 1
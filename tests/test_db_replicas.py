@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+
+from db import session as session_module
+from db.models import AiModel
+from db.replicas import Replica, ReplicaSet
+
+
+def request(method: str) -> Request:
+    return Request({"type": "http", "method": method, "headers": []})
+
+
+async def make_database(path, name: str):
+    """
+    SQLite stand-in holding a single model named after the database
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as db:
+        db.add(AiModel(name=name, description=None, url_or_path="test", version="0.0.1", sha256="x"))
+        await db.commit()
+    return engine
+
+
+@pytest.fixture
+async def databases(tmp_path, monkeypatch):
+    primary = await make_database(tmp_path / "primary.db", "primary")
+    replicas = [await make_database(tmp_path / f"replica-{i}.db", f"replica-{i}") for i in range(2)]
+    replica_set = ReplicaSet(
+        [Replica(name=f"replica-{i}", engine=engine) for i, engine in enumerate(replicas)],
+        max_lag=5,
+        check_interval=60,
+    )
+    monkeypatch.setattr(session_module, "local_session", sessionmaker(primary, class_=AsyncSession))
+    monkeypatch.setattr(session_module, "replica_set", replica_set)
+    yield replica_set
+    await replica_set.dispose()
+    await primary.dispose()
+
+
+async def served_by(method: str) -> str:
+    dependency = session_module.get_async_db(request(method))
+    db = await anext(dependency)
+    try:
+        return (await db.exec(select(AiModel.name))).one()
+    finally:
+        await dependency.aclose()
+
+
+@pytest.mark.asyncio
+async def test_reads_are_balanced_over_the_replicas(databases: ReplicaSet):
+    served = {await served_by("GET") for _ in range(4)}
+    assert served == {"replica-0", "replica-1"}
+
+
+@pytest.mark.asyncio
+async def test_writes_stay_on_the_primary(databases: ReplicaSet):
+    assert await served_by("POST") == "primary"
+    assert await served_by("DELETE") == "primary"
+
+
+@pytest.mark.asyncio
+async def test_lagging_replicas_are_skipped(databases: ReplicaSet, monkeypatch):
+    async def measure_lag(engine):
+        return 60.0 if engine is databases.replicas[0].engine else 0.0
+
+    monkeypatch.setattr(databases, "measure_lag", measure_lag)
+    await databases.check()
+    assert {await served_by("GET") for _ in range(4)} == {"replica-1"}
+
+    async def unreachable(engine):
+        raise ConnectionError("replica is down")
+
+    monkeypatch.setattr(databases, "measure_lag", unreachable)
+    await databases.check()
+    assert await served_by("GET") == "primary"
+
+
+@pytest.mark.asyncio
+async def test_replica_sessions_are_read_only(databases: ReplicaSet):
+    dependency = session_module.get_async_db(request("GET"))
+    db = await anext(dependency)
+    db.add(AiModel(name="new", description=None, url_or_path="test", version="0.0.1", sha256="x"))
+    with pytest.raises(RuntimeError):
+        await db.flush()
+    await dependency.aclose()
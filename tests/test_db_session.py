@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+
+from db import session as session_module
+from db.models import AiModel
+from db.replicas import ReplicaSet
+from db.session import needs_commit, release
+
+
+def request(method: str) -> Request:
+    return Request({"type": "http", "method": method, "headers": []})
+
+
+@pytest.fixture
+async def primary(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    monkeypatch.setattr(session_module, "local_session", sessionmaker(engine, class_=AsyncSession))
+    monkeypatch.setattr(session_module, "replica_set", ReplicaSet([], max_lag=5, check_interval=60))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def commits(primary, monkeypatch):
+    calls = []
+    commit = AsyncSession.commit
+
+    async def counting_commit(self):
+        calls.append(self)
+        await commit(self)
+
+    monkeypatch.setattr(AsyncSession, "commit", counting_commit)
+    return calls
+
+
+def model(name: str) -> AiModel:
+    return AiModel(name=name, description=None, url_or_path="test", version="0.0.1", sha256="x")
+
+
+@pytest.mark.asyncio
+async def test_clean_sessions_are_not_committed(primary, commits):
+    dependency = session_module.get_async_db(request("POST"))
+    db = await anext(dependency)
+    await db.exec(select(AiModel))
+    assert not needs_commit(db)
+    await dependency.aclose()
+    assert commits == []
+
+
+@pytest.mark.asyncio
+async def test_dirty_sessions_are_committed(primary, commits):
+    dependency = session_module.get_async_db(request("POST"))
+    db = await anext(dependency)
+    db.add(model("written"))
+    await db.flush()
+    assert needs_commit(db)
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+    assert len(commits) == 1
+
+    async with AsyncSession(primary) as check:
+        assert (await check.exec(select(AiModel.name))).all() == ["written"]
+
+
+@pytest.mark.asyncio
+async def test_reads_run_in_autocommit(primary, commits):
+    dependency = session_module.get_async_db(request("GET"))
+    db = await anext(dependency)
+    conn = await db.connection()
+    assert conn.sync_connection.get_execution_options()["isolation_level"] == "AUTOCOMMIT"
+    await db.exec(select(AiModel))
+    await dependency.aclose()
+    assert commits == []
+
+
+@pytest.mark.asyncio
+async def test_untouched_sessions_never_check_out_a_connection(primary):
+    checkouts = []
+    event.listen(primary.sync_engine, "checkout", lambda *args: checkouts.append(args))
+    for method in ("GET", "POST"):
+        dependency = session_module.get_async_db(request(method))
+        await anext(dependency)
+        await dependency.aclose()
+    assert checkouts == []
+
+
+@pytest.mark.asyncio
+async def test_release_returns_the_connection_and_keeps_objects(primary):
+    dependency = session_module.get_async_db(request("POST"))
+    db = await anext(dependency)
+    db.add(model("released"))
+    await db.flush()
+    assert primary.pool.checkedout() == 1
+
+    await release(db)
+    assert primary.pool.checkedout() == 0
+    async with AsyncSession(primary) as check:
+        assert (await check.exec(select(AiModel.name))).one() == "released"
+    await dependency.aclose()
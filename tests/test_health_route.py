@@ -12,3 +12,14 @@ async def test_health(client: AsyncClient):
     assert data["status"] == "ok"
     assert "timestamp" in data
     assert "uptime" in data
+
+
+@pytest.mark.anyio
+async def test_metrics(client: AsyncClient):
+    from core.metrics import get_metrics
+
+    get_metrics().counter("test_requests_total", {"route": "health"}).inc()
+    response = await client.get("/health/metrics")
+    assert response.status_code == 200
+    names = [metric["name"] for metric in response.json()]
+    assert "test_requests_total" in names
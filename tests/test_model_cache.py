@@ -0,0 +1,152 @@
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import get_settings
+from db import model_cache as model_cache_module
+from db.model_cache import ModelMetadataCache, ModelCacheListener, mark_models_changed
+from db.models import AiModel
+from server.controllers.ai.models.model_controller import ModelController
+
+
+def make_model(name: str = "test", version: str = "0.0.1") -> AiModel:
+    return AiModel(name=name, description="test", url_or_path="http://test.com/test", version=version, sha256="0" * 64)
+
+
+def test_get_returns_fresh_copies():
+    cache = ModelMetadataCache(max_entries=8, ttl=60)
+    cache.put(("test", None), make_model(), cache.token("test"))
+
+    first, second = cache.get(("test", None)), cache.get(("test", None))
+    assert first.version == "0.0.1" and first is not second
+    assert cache.get(("other", None)) is None
+    assert (cache.hits.value, cache.misses.value) >= (2, 1)
+
+
+def test_entries_expire_and_least_recently_used_go_first(monkeypatch):
+    cache = ModelMetadataCache(max_entries=2, ttl=10)
+    for version in ("1", "2"):
+        cache.put(("test", version), make_model(version=version), cache.token("test"))
+    cache.get(("test", "1"))
+    cache.put(("test", "3"), make_model(version="3"), cache.token("test"))
+    assert cache.get(("test", "2")) is None
+    assert cache.get(("test", "1")) is not None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(("test", "1")) is None
+    assert len(cache) == 1
+
+
+def test_invalidation_drops_every_version_and_racing_lookups():
+    cache = ModelMetadataCache(max_entries=8, ttl=60)
+    for key in (("test", None), ("test", "0.0.1"), ("other", None)):
+        cache.put(key, make_model(name=key[0]), cache.token(key[0]))
+
+    token = cache.token("test")
+    cache.invalidate(["test"])
+    assert cache.get(("test", None)) is None and cache.get(("test", "0.0.1")) is None
+    assert cache.get(("other", None)) is not None
+
+    # Read from the database before the invalidation, must not be stored after it
+    cache.put(("test", None), make_model(), token)
+    assert cache.get(("test", None)) is None
+
+
+def test_suspended_cache_misses():
+    cache = ModelMetadataCache(max_entries=8, ttl=60)
+    listener = ModelCacheListener("postgresql://unused", "aimodel_changed", cache)
+    cache.put(("test", None), make_model(), cache.token("test"))
+    cache.suspended = True
+    assert cache.get(("test", None)) is None
+
+    cache.suspended = False
+    cache.version = 3
+    listener._on_notify(None, 1, "aimodel_changed", "4:test")
+    assert cache.get(("test", None)) is None
+    assert cache.version == 4
+
+
+def test_behind_pgbouncer_the_cache_needs_a_direct_listen_uri(monkeypatch, model_cache):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(settings, "POSTGRES_ASYNC_URI", "postgresql+asyncpg://app@pgbouncer:6432/app")
+    monkeypatch.setattr(model_cache_module, "_listener", None)
+    monkeypatch.setattr(ModelCacheListener, "start", lambda self: None)
+
+    # Notifications would never arrive through pgbouncer
+    model_cache_module.start_model_cache_listener()
+    assert model_cache_module.get_model_cache() is None
+    assert model_cache_module._listener is None
+
+    monkeypatch.setattr(settings, "MODEL_METADATA_CACHE_LISTEN_URI", "postgresql+asyncpg://app@db:5432/app")
+    model_cache_module.start_model_cache_listener()
+    assert model_cache_module.get_model_cache() is model_cache
+    assert model_cache_module._listener.dsn == "postgresql://app@db:5432/app"
+
+
+@pytest.mark.asyncio
+async def test_get_model_is_cached_until_a_change_commits(session: AsyncSession, aimodel: AiModel, model_cache):
+    model = await ModelController.get_model(session, "test")
+    assert model_cache.get(("test", None)).id == model.id
+
+    # Out of band changes are not seen until the cache is told about them
+    await session.exec(delete(AiModel))
+    await session.commit()
+    assert (await ModelController.get_model(session, "test")).id == model.id
+
+    mark_models_changed(session, "test")
+    await session.commit()
+    with pytest.raises(Exception):
+        await ModelController.get_model(session, "test")
+
+
+@pytest.mark.asyncio
+async def test_create_model_invalidates_latest_version(session: AsyncSession, aimodel: AiModel, model_file, fake_s3, model_cache):
+    from server.controllers.ai.models.schemas import CreateModel
+
+    assert (await ModelController.get_model(session, "test")).version == "0.0.1"
+    await ModelController.create_model(
+        session, CreateModel(name="test", description="test", url_or_path="http://test.com/test", version="0.0.2"), model_file
+    )
+    assert (await ModelController.get_model(session, "test")).version == "0.0.2"
+
+
+@pytest.mark.asyncio
+async def test_replica_reads_are_not_cached_right_after_a_change(session: AsyncSession, monkeypatch):
+    cache = ModelMetadataCache(max_entries=8, ttl=60, replica_lag=10)
+    monkeypatch.setattr(model_cache_module, "_model_cache", cache)
+
+    # The replica still holds version 0.0.1, the primary already moved on to 0.0.2
+    replica_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(replica_engine) as db:
+        db.add(make_model(version="0.0.1"))
+        await db.commit()
+    replica = AsyncSession(replica_engine, expire_on_commit=False, info={"read_only": True})
+    session.add(make_model(version="0.0.2"))
+    mark_models_changed(session, "test")
+    await session.commit()
+
+    # Started after the invalidation, on a replica that has not replayed the change yet
+    assert (await ModelController.get_model(replica, "test")).version == "0.0.1"
+    assert cache.get(("test", None)) is None
+
+    # The primary is always up to date
+    assert (await ModelController.get_model(session, "test")).version == "0.0.2"
+    assert cache.get(("test", None)).version == "0.0.2"
+
+    # Once the replicas had the time to catch up their reads are cached again
+    cache.clear()
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    await ModelController.get_model(replica, "test")
+    assert cache.get(("test", None)) is not None
+
+    await replica.close()
+    await replica_engine.dispose()
@@ -1,3 +1,4 @@
+import hashlib
 from typing import Tuple
 from io import BytesIO
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -8,9 +9,18 @@ from starlette.testclient import TestClient
 from passlib.context import CryptContext
 from os import path
 from fastapi import UploadFile, File
+from starlette.datastructures import Headers
+from botocore.exceptions import ClientError
 
 from db.models.user import User
 from db.models.ai_models import AiModel
+from utils.artifact_cache import ArtifactCache
+from utils.storage_utils import get_blob_key
+from server.inference.session_cache import SessionCache
+from db.model_cache import ModelMetadataCache
+from server.controllers.auth.token_cache import TokenDenylist, UserCache, VerifiedTokenCache
+from utils.signing_keys import KeyRing
+from server.controllers.auth.identity_providers import ExternalTokenVerifier
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -47,8 +57,71 @@ async def model_file_bytes(fixture_path: str) -> BytesIO:
 
 
 @pytest.fixture(scope='function')
-def model_file(model_file_bytes: BytesIO) -> File:
-    return File(model_file_bytes, filename="gender-test.zip", media_type="application/zip")
+def model_file(model_file_bytes: BytesIO) -> UploadFile:
+    return UploadFile(model_file_bytes, filename="gender-test.zip", headers=Headers({"content-type": "application/zip"}))
+
+
+class FakeS3:
+    """
+    In-memory stand-in for the boto3 S3 client calls used by utils.net_utils
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.part_sizes = []
+        self.ranges = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": f"etag-{Key}"}
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        self.part_sizes.append(len(Body))
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        self.objects[(Bucket, Key)] = b"".join(parts[n] for n in numbers)
+        return {"ETag": "etag-complete"}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def copy(self, CopySource, Bucket, Key):
+        self.objects[(Bucket, Key)] = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        if Range is not None:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start):int(end) + 1]
+        self.ranges.append(Range)
+        return {"Body": BytesIO(data), "ContentLength": len(data)}
+
+
+@pytest.fixture(scope="function")
+def fake_s3(monkeypatch) -> FakeS3:
+    from utils import net_utils
+
+    s3 = FakeS3()
+    monkeypatch.setattr(net_utils, "s3", s3)
+    return s3
 
 
 @pytest.fixture(scope="function")
@@ -64,3 +137,93 @@ async def aimodel(session: AsyncSession, model_file: File) -> AiModel:
     query = select(AiModel).where(AiModel.name == "test")
     res = await session.exec(query)
     return res.first()
+
+
+@pytest.fixture(scope="function")
+def artifact_cache(tmp_path, monkeypatch) -> ArtifactCache:
+    from utils import artifact_cache as artifact_cache_module
+
+    cache = ArtifactCache(str(tmp_path / "models"), max_bytes=64 * 1024 * 1024)
+    monkeypatch.setattr(artifact_cache_module, "_artifact_cache", cache)
+    return cache
+
+
+@pytest.fixture(scope="function")
+def session_cache(monkeypatch) -> SessionCache:
+    from server.inference import session_cache as session_cache_module
+
+    cache = SessionCache(max_bytes=64 * 1024 * 1024)
+    monkeypatch.setattr(session_cache_module, "_session_cache", cache)
+    return cache
+
+
+@pytest.fixture(scope="function", autouse=True)
+def model_cache(monkeypatch) -> ModelMetadataCache:
+    """
+    A fresh metadata cache per test, every test starts with its own empty database
+    """
+    from db import model_cache as model_cache_module
+
+    cache = ModelMetadataCache(max_entries=128, ttl=60)
+    monkeypatch.setattr(model_cache_module, "_model_cache", cache)
+    return cache
+
+
+@pytest.fixture(scope="function", autouse=True)
+def token_state(monkeypatch) -> Tuple[UserCache, TokenDenylist]:
+    from server.controllers.auth import token_cache as token_cache_module
+
+    user_cache, denylist = UserCache(max_entries=128, ttl=60), TokenDenylist(refresh_interval=60)
+    monkeypatch.setattr(token_cache_module, "_user_cache", user_cache)
+    monkeypatch.setattr(token_cache_module, "_token_denylist", denylist)
+    return user_cache, denylist
+
+
+@pytest.fixture(scope="function", autouse=True)
+def token_cache(monkeypatch) -> VerifiedTokenCache:
+    from server.controllers.auth import token_cache as token_cache_module
+
+    cache = VerifiedTokenCache(max_entries=128, max_bytes=1024 * 1024)
+    monkeypatch.setattr(token_cache_module, "_verified_token_cache", cache)
+    return cache
+
+
+@pytest.fixture(scope="function", autouse=True)
+def external_token_verifier(monkeypatch) -> ExternalTokenVerifier:
+    """
+    No identity provider unless a test installs one, tests never reach the real ones
+    """
+    from server.controllers.auth import identity_providers as identity_providers_module
+
+    verifier = ExternalTokenVerifier([], negative_ttl=30, max_rejected=128)
+    monkeypatch.setattr(identity_providers_module, "_external_token_verifier", verifier)
+    return verifier
+
+
+@pytest.fixture(scope="session")
+def signing_key():
+    from Crypto.PublicKey import RSA
+
+    return RSA.generate(2048)
+
+
+@pytest.fixture(scope="function", autouse=True)
+def key_ring(monkeypatch, signing_key) -> KeyRing:
+    from utils import signing_keys as signing_keys_module
+
+    ring = KeyRing("RS256", signing_key)
+    monkeypatch.setattr(signing_keys_module, "_key_ring", ring)
+    return ring
+
+
+@pytest.fixture(scope="function")
+async def onnx_model(session: AsyncSession, fake_s3, artifact_cache, session_cache, model_file_bytes: BytesIO) -> AiModel:
+    """
+    The gender classifier fixture registered in the database and available from the S3 stand-in
+    """
+    sha256 = hashlib.sha256(model_file_bytes.getvalue()).hexdigest()
+    fake_s3.objects[(None, get_blob_key(sha256))] = model_file_bytes.getvalue()
+    model = AiModel(name="gender", description="gender", url_or_path="http://test.com/gender", version="0.0.1", sha256=sha256)
+    session.add(model)
+    await session.commit()
+    return model
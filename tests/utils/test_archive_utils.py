@@ -0,0 +1,88 @@
+import os
+import stat
+import zipfile
+
+import pytest
+
+from utils.archive_utils import ArchiveError, extract_zip
+
+
+def make_zip(path, members, compression=zipfile.ZIP_STORED):
+    with zipfile.ZipFile(path, "w", compression=compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_extract_zip_writes_every_member(tmp_path, compression):
+    members = {"model/graph.onnx": os.urandom(3 * 1024 * 1024 + 7), "model/labels.txt": b"male\nfemale\n", "README": b""}
+    archive = make_zip(tmp_path / "artifact.zip", members, compression)
+
+    total = extract_zip(archive, str(tmp_path / "out"))
+
+    assert total == sum(len(data) for data in members.values())
+    for name, data in members.items():
+        with open(tmp_path / "out" / name, "rb") as f:
+            assert f.read() == data
+
+
+def test_extract_zip_extracts_the_fixture(tmp_path, fixture_path: str):
+    extract_zip(os.path.join(fixture_path, "gender-test.zip"), str(tmp_path))
+    with open(tmp_path / "gender.onnx", "rb") as f, open(os.path.join(fixture_path, "gender.onnx"), "rb") as expected:
+        assert f.read() == expected.read()
+
+
+@pytest.mark.parametrize("name", ["../evil.txt", "/etc/evil.txt", "a/../../evil.txt", "C:/evil.txt"])
+def test_extract_zip_rejects_unsafe_paths(tmp_path, name):
+    archive = make_zip(tmp_path / "artifact.zip", {"ok.txt": b"ok", name: b"evil"})
+    with pytest.raises(ArchiveError):
+        extract_zip(archive, str(tmp_path / "out"))
+    # nothing is written when the archive is rejected up front
+    assert not os.path.exists(tmp_path / "out")
+
+
+def test_extract_zip_rejects_symlinks(tmp_path):
+    path = tmp_path / "artifact.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        info = zipfile.ZipInfo("link")
+        info.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive.writestr(info, "/etc/passwd")
+    with pytest.raises(ArchiveError):
+        extract_zip(str(path), str(tmp_path / "out"))
+
+
+def test_extract_zip_enforces_limits(tmp_path):
+    archive = make_zip(tmp_path / "artifact.zip", {"a": b"x" * 100, "b": b"y" * 100})
+    with pytest.raises(ArchiveError):
+        extract_zip(archive, str(tmp_path / "out1"), max_member_bytes=50)
+    with pytest.raises(ArchiveError):
+        extract_zip(archive, str(tmp_path / "out2"), max_total_bytes=150)
+    with pytest.raises(ArchiveError):
+        extract_zip(archive, str(tmp_path / "out3"), max_members=1)
+
+
+def test_extract_zip_detects_lying_sizes(tmp_path):
+    path = make_zip(tmp_path / "artifact.zip", {"bomb": b"\0" * 1024 * 1024}, zipfile.ZIP_DEFLATED)
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo("bomb")
+    # the central directory claims a tiny member, the stream must still be cut off
+    data = bytearray(open(path, "rb").read())
+    central = data.rindex(b"PK\x01\x02")
+    data[central + 24:central + 28] = (10).to_bytes(4, "little")
+    open(path, "wb").write(bytes(data))
+    assert info.file_size == 1024 * 1024
+
+    with pytest.raises((ArchiveError, zipfile.BadZipFile)):
+        extract_zip(path, str(tmp_path / "out"), max_member_bytes=1000)
+
+
+def test_extract_zip_checks_stored_crc(tmp_path):
+    path = make_zip(tmp_path / "artifact.zip", {"weights.bin": b"a" * 4096})
+    data = open(path, "rb").read().replace(b"a" * 16, b"b" * 16, 1)
+    open(path, "wb").write(data)
+
+    with pytest.raises(ArchiveError):
+        extract_zip(path, str(tmp_path / "out"))
+    # an archive verified by its sha256 skips the per member check
+    extract_zip(path, str(tmp_path / "trusted"), verify_crc=False)
@@ -0,0 +1,60 @@
+import os
+import pytest
+
+from utils.artifact_cache import ArtifactCache
+
+
+def stage_file(cache: ArtifactCache, staging_dir: str, size: int) -> str:
+    path = os.path.join(staging_dir, "model")
+    os.makedirs(path)
+    with open(os.path.join(path, "model.onnx"), "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_install_and_get(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("gender/0.0.1") is None
+    with cache.staging() as staging_dir:
+        path = cache.install("gender/0.0.1", stage_file(cache, staging_dir, 100))
+    assert cache.get("gender/0.0.1") == path
+    assert os.path.exists(os.path.join(path, "model.onnx"))
+    assert cache.total_bytes == 100
+    # the staging directory is cleaned up
+    assert os.listdir(os.path.join(str(tmp_path), ArtifactCache.STAGING_DIR)) == []
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    for key in ("a/1", "b/1"):
+        with cache.staging() as staging_dir:
+            cache.install(key, stage_file(cache, staging_dir, 100))
+    # touch a/1 so b/1 becomes the eviction candidate
+    cache.get("a/1")
+    with cache.staging() as staging_dir:
+        cache.install("c/1", stage_file(cache, staging_dir, 100))
+
+    assert "a/1" in cache
+    assert "b/1" not in cache
+    assert "c/1" in cache
+    assert not os.path.exists(cache.path_for("b/1"))
+    assert cache.total_bytes == 200
+
+
+def test_index_survives_restarts(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+    with cache.staging() as staging_dir:
+        cache.install("gender/0.0.1", stage_file(cache, staging_dir, 100))
+
+    reopened = ArtifactCache(str(tmp_path), max_bytes=1000)
+    assert reopened.get("gender/0.0.1") == cache.path_for("gender/0.0.1")
+    assert reopened.total_bytes == 100
+
+
+def test_rejects_artifacts_over_budget_and_escaping_keys(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=50)
+    with cache.staging() as staging_dir:
+        with pytest.raises(ValueError):
+            cache.install("big/1", stage_file(cache, staging_dir, 100))
+    with pytest.raises(ValueError):
+        cache.path_for("../outside")
@@ -1,7 +1,13 @@
 import pytest
 import os
 import boto3
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from fastapi import UploadFile
 from utils import net_utils
+from utils.storage_utils import get_blob_key
 
 @pytest.mark.anyio
 async def test_can_download_file_successfully_with_http():
@@ -29,3 +35,128 @@ async def test_can_upload_file_to_our_s3_bucket():
     assert os.path.exists("/tmp/test.txt")
     os.remove("/tmp/test.txt")
 
+
+@pytest.mark.anyio
+async def test_upload_from_file_sends_small_files_in_one_put(fake_s3):
+    result = await net_utils.upload_from_file(BytesIO(b"small model"), "small.zip", "bucket")
+    assert result.parts == 1
+    assert result.size == len(b"small model")
+    assert fake_s3.objects[("bucket", "small.zip")] == b"small model"
+
+@pytest.mark.anyio
+async def test_upload_from_file_streams_large_files_in_bounded_parts(fake_s3):
+    data = os.urandom(2 * net_utils.MIN_PART_SIZE + 1234)
+    upload = UploadFile(BytesIO(data), filename="large.zip")
+    result = await net_utils.upload_from_file(upload, "large.zip", "bucket", chunk_size=net_utils.MIN_PART_SIZE)
+    assert result.parts == 3
+    assert result.size == len(data)
+    assert max(fake_s3.part_sizes) == net_utils.MIN_PART_SIZE
+    assert fake_s3.objects[("bucket", "large.zip")] == data
+
+@pytest.mark.anyio
+async def test_upload_from_file_aborts_failed_multipart_uploads(fake_s3, monkeypatch):
+    def failing_upload_part(**kwargs):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(fake_s3, "upload_part", failing_upload_part)
+    data = BytesIO(os.urandom(2 * net_utils.MIN_PART_SIZE))
+    with pytest.raises(RuntimeError):
+        await net_utils.upload_from_file(data, "broken.zip", "bucket", chunk_size=net_utils.MIN_PART_SIZE)
+    assert fake_s3.uploads == {}
+    assert ("bucket", "broken.zip") not in fake_s3.objects
+
+@pytest.mark.anyio
+async def test_upload_from_file_hashes_while_streaming(fake_s3):
+    data = os.urandom(net_utils.MIN_PART_SIZE + 10)
+    result = await net_utils.upload_from_file(BytesIO(data), "hashed.zip", "bucket", chunk_size=net_utils.MIN_PART_SIZE)
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+
+@pytest.mark.anyio
+async def test_upload_blob_stores_identical_bytes_once(fake_s3):
+    data = os.urandom(net_utils.MIN_PART_SIZE + 10)
+    first = await net_utils.upload_blob(BytesIO(data), "bucket", chunk_size=net_utils.MIN_PART_SIZE)
+    second = await net_utils.upload_blob(BytesIO(data), "bucket", chunk_size=net_utils.MIN_PART_SIZE)
+    assert first.key == second.key == get_blob_key(hashlib.sha256(data).hexdigest())
+    assert not first.deduplicated
+    assert second.deduplicated
+    # staging objects are cleaned up, only the content addressed blob remains
+    assert list(fake_s3.objects) == [("bucket", first.key)]
+
+@pytest.mark.anyio
+async def test_upload_blob_skips_the_upload_for_known_small_files(fake_s3):
+    await net_utils.upload_blob(BytesIO(b"weights"), "bucket")
+    result = await net_utils.upload_blob(BytesIO(b"weights"), "bucket")
+    assert result.deduplicated
+    assert result.parts == 0
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    payload = b""
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        header = self.headers.get("Range")
+        self.ranges.append(header)
+        body = self.payload
+        if header:
+            start, end = header.removeprefix("bytes=").split("-")
+            body = self.payload[int(start):int(end) + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def http_server():
+    RangeRequestHandler.payload = os.urandom(3 * 1024 * 1024 + 17)
+    RangeRequestHandler.ranges = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.anyio
+async def test_download_file_uses_parallel_ranged_gets(http_server, tmp_path):
+    url = f"http://127.0.0.1:{http_server.server_port}/model.zip"
+    payload = RangeRequestHandler.payload
+    path = str(tmp_path / "model.zip")
+    await net_utils.download_file(
+        url, path, sha256=hashlib.sha256(payload).hexdigest(), part_size=1024 * 1024, concurrency=4
+    )
+    with open(path, "rb") as f:
+        assert f.read() == payload
+    assert len(RangeRequestHandler.ranges) == 4
+    assert os.listdir(tmp_path) == ["model.zip"]
+
+@pytest.mark.anyio
+async def test_download_file_rejects_checksum_mismatches(http_server, tmp_path):
+    url = f"http://127.0.0.1:{http_server.server_port}/model.zip"
+    path = str(tmp_path / "model.zip")
+    with pytest.raises(net_utils.ChecksumMismatch):
+        await net_utils.download_file(url, path, sha256=hashlib.sha256(b"other").hexdigest(), part_size=1024 * 1024)
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.anyio
+async def test_download_s3_file_reassembles_ranges(fake_s3, tmp_path):
+    data = os.urandom(2 * 1024 * 1024 + 5)
+    fake_s3.objects[("bucket", "blob.zip")] = data
+    path = str(tmp_path / "blob.zip")
+    await net_utils.download_file("s3://bucket/blob.zip", path, sha256=hashlib.sha256(data).hexdigest(), part_size=1024 * 1024)
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert len(fake_s3.ranges) == 3
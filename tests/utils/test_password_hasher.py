@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from server.controllers.auth.auth_controller import AuthController
+from server.controllers.auth.schemas import CreateUser
+from utils import password_hasher as password_hasher_module
+from utils.password_hasher import HasherOverloaded, PasswordHasher
+
+
+@pytest.fixture
+def process_hasher():
+    hasher = PasswordHasher(workers=1, max_pending=4, mode="process")
+    yield hasher
+    hasher.close()
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_off_the_event_loop(process_hasher: PasswordHasher):
+    hashed = await process_hasher.hash("s3cret")
+    gaps, done = [], asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    assert await process_hasher.verify("s3cret", hashed)
+    assert not await process_hasher.verify("wrong", hashed)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await task
+    # The loop kept ticking while bcrypt ran
+    assert len(gaps) > 5 and max(gaps) < elapsed / 2
+
+
+@pytest.mark.asyncio
+async def test_overload_is_rejected_immediately():
+    hasher = PasswordHasher(workers=1, max_pending=1, mode="thread")
+    try:
+        results = await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], HasherOverloaded)
+        assert hasher.pending == 0 and hasher.rejected.value >= 1
+    finally:
+        hasher.close()
+
+
+@pytest.mark.asyncio
+async def test_signup_is_shed_with_503(session, monkeypatch):
+    hasher = PasswordHasher(workers=1, max_pending=0, mode="thread")
+    monkeypatch.setattr(password_hasher_module, "_password_hasher", hasher)
+    with pytest.raises(HTTPException) as e:
+        await AuthController.create_user(session, CreateUser(email="a@b.c", password="x"))
+    assert e.value.status_code == 503 and e.value.headers["Retry-After"] == "1"
+    hasher.close()
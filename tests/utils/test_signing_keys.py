@@ -0,0 +1,88 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from Crypto.PublicKey import RSA
+from fastapi import FastAPI
+from jose import jwt
+from jose.exceptions import JWTError
+from starlette.testclient import TestClient
+
+from apps.auth.router import well_known_router
+from utils.signing_keys import KeyRing, key_id
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def test_tokens_carry_the_kid_of_the_published_key(key_ring: KeyRing, signing_key):
+    token = key_ring.sign({"sub": "user@example.com"})
+
+    assert jwt.get_unverified_header(token)["kid"] == key_id(signing_key.publickey()) == key_ring.kid
+    assert key_ring.decode(token)["sub"] == "user@example.com"
+
+    # Another service verifies with nothing but the JWKS
+    [published] = key_ring.jwks()["keys"]
+    assert published["kid"] == key_ring.kid
+    assert "d" not in published
+    assert jwt.decode(token, published, algorithms=["RS256"])["sub"] == "user@example.com"
+
+
+def test_rotation_keeps_verifying_tokens_of_the_previous_key(signing_key):
+    old_ring = KeyRing("RS256", signing_key)
+    old_token = old_ring.sign({"sub": "user@example.com"})
+
+    new_key = RSA.generate(2048)
+    new_ring = KeyRing("RS256", new_key, [signing_key.publickey()])
+    new_token = new_ring.sign({"sub": "user@example.com"})
+
+    assert new_ring.kid != old_ring.kid
+    assert new_ring.decode(old_token)["sub"] == "user@example.com"
+    assert new_ring.decode(new_token)["sub"] == "user@example.com"
+    assert {key["kid"] for key in new_ring.jwks()["keys"]} == {old_ring.kid, new_ring.kid}
+
+    # Once the previous key is dropped its tokens are rejected
+    with pytest.raises(JWTError):
+        KeyRing("RS256", new_key).decode(old_token)
+
+
+def test_rejects_unknown_kids_and_symmetric_forgeries(key_ring: KeyRing, signing_key):
+    other_ring = KeyRing("RS256", RSA.generate(2048))
+    with pytest.raises(JWTError):
+        key_ring.decode(other_ring.sign({"sub": "user@example.com"}))
+
+    # The public key is public, a token MACed with it must not pass as RS256
+    header = _b64(json.dumps({"alg": "HS256", "kid": key_ring.kid}).encode())
+    claims = _b64(json.dumps({"sub": "user@example.com"}).encode())
+    mac = hmac.new(signing_key.publickey().export_key(), f"{header}.{claims}".encode(), hashlib.sha256)
+    forged = f"{header}.{claims}.{_b64(mac.digest())}"
+    with pytest.raises(JWTError):
+        key_ring.decode(forged)
+
+
+def test_jwks_route_is_cacheable(key_ring: KeyRing):
+    app = FastAPI()
+    app.include_router(well_known_router)
+
+    response = TestClient(app).get("/.well-known/jwks.json")
+
+    assert response.status_code == 200
+    assert response.json() == key_ring.jwks()
+    assert response.headers["cache-control"] == "public, max-age=300"
+
+
+@pytest.mark.anyio
+async def test_startup_fails_without_the_signing_key(monkeypatch, tmp_path):
+    from core.config import get_settings
+    from src.app import ensure_private_key_exists
+    from utils import signing_keys as signing_keys_module
+
+    monkeypatch.setattr(signing_keys_module, "_key_ring", None)
+    monkeypatch.setattr(get_settings(), "JWT_ALGORITHM", "RS256")
+    monkeypatch.setattr(get_settings(), "PRIVATE_KEY_PATH", str(tmp_path / "privkey.pem"))
+
+    with pytest.raises(RuntimeError, match="pybe generate-privkey"):
+        await ensure_private_key_exists()
@@ -0,0 +1,63 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import pytest
+
+from utils.single_flight import SingleFlight, file_lock
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "model"
+
+    results = await asyncio.gather(*[flight.do("gender/0.0.1", fetch) for _ in range(10)])
+    assert results == ["model"] * 10
+    assert calls == 1
+    assert "gender/0.0.1" not in flight
+
+    # once finished the key is free again
+    await flight.do("gender/0.0.1", fetch)
+    assert calls == 2
+
+
+@pytest.mark.anyio
+async def test_errors_are_shared_by_all_waiters():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("download failed")
+
+    results = await asyncio.gather(*[flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def _download_once(lock_path: str, marker_path: str, log_path: str) -> None:
+    with file_lock(lock_path):
+        if not os.path.exists(marker_path):
+            time.sleep(0.1)
+            with open(marker_path, "w") as f:
+                f.write("done")
+            with open(log_path, "a") as f:
+                f.write("download\n")
+
+
+def test_file_lock_serializes_processes(tmp_path):
+    args = (str(tmp_path / "locks" / "model.lock"), str(tmp_path / "marker"), str(tmp_path / "log"))
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_download_once, args=args) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with open(tmp_path / "log") as f:
+        assert f.read().splitlines() == ["download"]
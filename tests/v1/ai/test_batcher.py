@@ -0,0 +1,67 @@
+import asyncio
+import numpy as np
+import pytest
+
+from core.metrics import MetricsRegistry
+from server.inference import batcher as batcher_module
+from server.inference.batcher import MicroBatcher
+from server.inference.session_cache import find_model_file, load_session
+
+
+@pytest.fixture
+def gender_model(fixture_path: str):
+    return load_session(("gender", "0.0.1", "x"), find_model_file(fixture_path), warmup=False)
+
+
+@pytest.fixture(autouse=True)
+def metrics_registry(monkeypatch) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    monkeypatch.setattr(batcher_module, "get_metrics", lambda: registry)
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched(gender_model, metrics_registry: MetricsRegistry):
+    batches = []
+
+    async def recording_runner(model, inputs):
+        batches.append(inputs["in"].shape[0])
+        return await batcher_module.run_in_thread(model, inputs)
+
+    batcher = MicroBatcher(gender_model, max_batch_size=8, max_wait_ms=50, runner=recording_runner)
+    images = [np.random.rand(1, 96, 96, 3).astype(np.float32) for _ in range(16)]
+    results = await asyncio.gather(*[batcher.submit({"in": image}) for image in images])
+
+    assert sum(batches) == 16
+    assert len(batches) < 16
+    assert max(batches) <= 8
+    for image, result in zip(images, results):
+        expected = gender_model.run({"in": image})["out"]
+        np.testing.assert_allclose(result["out"], expected, rtol=1e-4, atol=1e-5)
+
+    sizes = next(m for m in metrics_registry.snapshot() if m["name"] == "inference_batch_size")
+    assert sizes["count"] == len(batches)
+    assert sizes["sum"] == 16
+
+
+@pytest.mark.asyncio
+async def test_single_requests_are_not_delayed_past_max_wait(gender_model):
+    batcher = MicroBatcher(gender_model, max_batch_size=32, max_wait_ms=5)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await batcher.submit({"in": np.zeros((1, 96, 96, 3), dtype=np.float32)})
+    assert result["out"].shape == (1, 2)
+    assert loop.time() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_errors_fail_every_request_in_the_batch(gender_model):
+    async def failing_runner(model, inputs):
+        raise RuntimeError("inference failed")
+
+    batcher = MicroBatcher(gender_model, max_batch_size=4, max_wait_ms=20, runner=failing_runner)
+    results = await asyncio.gather(
+        *[batcher.submit({"in": np.zeros((1, 96, 96, 3), dtype=np.float32)}) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -1,6 +1,8 @@
 import pytest
+import hashlib
+from datetime import datetime, timedelta
 
-from fastapi import UploadFile, File
+from fastapi import UploadFile, File, HTTPException
 from typing import Tuple, BinaryIO
 from io import BytesIO
 
@@ -14,12 +16,13 @@ from db.models import (
     AiModel
 )
 from src.server.controllers.ai.models.schemas import (
+    BulkModelItem,
     CreateModel,
 )
 
 
 @pytest.mark.asyncio
-async def test_create_model(session: AsyncSession, model_file: UploadFile):
+async def test_create_model(session: AsyncSession, model_file: UploadFile, fake_s3):
     create_model: CreateModel = CreateModel(
         name="test", description="test", url_or_path="http://test.com/test")
     print(f"model_file: {model_file}")
@@ -65,8 +68,8 @@ async def test_model_with_invalid_type_fails(session: AsyncSession, model_file:
 
 
 @pytest.mark.asyncio
-async def test_get_models(session: AsyncSession, model_file: File, aimodel: AiModel):
-    models = await ModelController.get_models(session)
+async def test_get_models(session: AsyncSession, model_file: UploadFile, aimodel: AiModel, fake_s3):
+    models = (await ModelController.get_models(session)).items
     assert len(models) == 1
     assert models[0].name == "test"
     await ModelController.create_model(session, CreateModel(
@@ -75,11 +78,42 @@ async def test_get_models(session: AsyncSession, model_file: File, aimodel: AiMo
         url_or_path="http://test2.com/test2",
         version="0.0.1"
     ), model_file)
-    models = await ModelController.get_models(session)
+    models = (await ModelController.get_models(session)).items
     assert len(models) == 2
     assert models[1].name == "test2"
 
 
+@pytest.mark.asyncio
+async def test_get_models_paginates_with_a_cursor(session: AsyncSession):
+    created_at = datetime(2024, 1, 1)
+    for i in range(7):
+        # rows sharing a timestamp are ordered by id
+        session.add(AiModel(name=f"model-{i}", description=None, url_or_path="test", version="0.0.1",
+                            sha256="x", created_at=created_at + timedelta(seconds=i // 2)))
+    session.add(AiModel(name="model-0", description=None, url_or_path="test", version="0.0.2", sha256="x",
+                        created_at=created_at + timedelta(minutes=1), is_deleted=True))
+    await session.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = await ModelController.get_models(session, limit=3, cursor=cursor)
+        seen.extend(page.items)
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert len(seen) == 7
+    assert len({model.id for model in seen}) == 7
+    assert [(m.created_at, m.id) for m in seen] == sorted((m.created_at, m.id) for m in seen)
+
+    page = await ModelController.get_models(session, name="model-0", include_deleted=True)
+    assert [model.version for model in page.items] == ["0.0.1", "0.0.2"]
+    page = await ModelController.get_models(session, name="model-0", version="0.0.2")
+    assert page.items == []
+
+    with pytest.raises(HTTPException):
+        await ModelController.get_models(session, cursor="not-a-cursor")
+
+
 @pytest.mark.asyncio
 async def test_delete_model(session: AsyncSession, aimodel: AiModel):
     print(f"aimodel: {aimodel}")
@@ -88,3 +122,50 @@ async def test_delete_model(session: AsyncSession, aimodel: AiModel):
     resp = await session.exec(query)
     model = resp.first()
     assert model is None
+
+
+@pytest.mark.asyncio
+async def test_create_model_deduplicates_identical_artifacts(
+    session: AsyncSession, model_file: UploadFile, model_file_bytes: BytesIO, fake_s3
+):
+    first = await ModelController.create_model(session, CreateModel(
+        name="test", description="test", url_or_path="http://test.com/test", version="0.0.1"), model_file)
+    await model_file.seek(0)
+    second = await ModelController.create_model(session, CreateModel(
+        name="test", description="test", url_or_path="http://test.com/test", version="0.0.2"), model_file)
+
+    assert first.sha256 == second.sha256 == hashlib.sha256(model_file_bytes.getvalue()).hexdigest()
+    assert len(fake_s3.objects) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_models(session: AsyncSession, aimodel: AiModel, model_file_bytes: BytesIO, fake_s3):
+    artifacts = {"gender-test.zip": model_file_bytes.getvalue()}
+    sha256 = hashlib.sha256(artifacts["gender-test.zip"]).hexdigest()
+    items = [
+        BulkModelItem(name="bulk", description="a", url_or_path="http://test.com/a", version="1", artifact="gender-test.zip"),
+        BulkModelItem(name="bulk", description="b", url_or_path="http://test.com/b", version="2", artifact="gender-test.zip"),
+        BulkModelItem(name="bulk", description="c", url_or_path="http://test.com/c", version="3", sha256=sha256),
+        BulkModelItem(name="test", description="d", url_or_path="http://test.com/d", version="0.0.1", artifact="gender-test.zip"),
+        BulkModelItem(name="bulk", description="e", url_or_path="http://test.com/e", version="4", artifact="missing.zip"),
+        BulkModelItem(name="bulk", description="f", url_or_path="http://test.com/f", version="1", artifact="gender-test.zip"),
+    ]
+    opened = []
+
+    def open_artifact(item: BulkModelItem) -> BinaryIO:
+        opened.append(item.artifact)
+        return BytesIO(artifacts[item.artifact])
+
+    response = await ModelController.bulk_create_models(session, items, open_artifact, concurrency=2)
+    assert [r.status for r in response.results] == ["created", "created", "created", "exists", "failed", "failed"]
+    assert (response.created, response.existing, response.failed) == (3, 1, 2)
+    assert all(r.sha256 == sha256 for r in response.results[:3])
+    # One upload per distinct artifact, none for the existing version
+    assert opened == ["gender-test.zip", "missing.zip"]
+
+    rows = (await session.exec(select(AiModel).where(AiModel.name == "bulk"))).all()
+    assert sorted(row.version for row in rows) == ["1", "2", "3"]
+
+    # Re-running the manifest is idempotent
+    response = await ModelController.bulk_create_models(session, items[:3], open_artifact)
+    assert (response.created, response.existing, response.failed) == (0, 3, 0)
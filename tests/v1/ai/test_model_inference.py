@@ -0,0 +1,104 @@
+import asyncio
+import shutil
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.config import get_settings
+from db.models import AiModel
+from server.inference.session_cache import SessionCache, find_model_file, is_prepared, load_session, prepare_model
+from src.server.controllers.ai.models.model_controller import ModelController
+from src.server.controllers.ai.models.schemas import PredictRequest
+
+
+@pytest.mark.asyncio
+async def test_predict_runs_the_model(session: AsyncSession, onnx_model: AiModel, session_cache: SessionCache):
+    image = np.random.rand(1, 96, 96, 3).tolist()
+    response = await ModelController.predict(session, "gender", PredictRequest(inputs={"in": image}))
+
+    assert response.name == "gender"
+    assert response.version == "0.0.1"
+    assert np.asarray(response.outputs["out"]).shape == (1, 2)
+    assert (onnx_model.name, onnx_model.version, onnx_model.sha256) in session_cache
+
+
+@pytest.mark.asyncio
+async def test_predict_reuses_loaded_sessions(session: AsyncSession, onnx_model: AiModel, session_cache: SessionCache):
+    request = PredictRequest(inputs={"in": np.zeros((1, 96, 96, 3)).tolist()})
+    await asyncio.gather(*[ModelController.predict(session, "gender", request) for _ in range(4)])
+    loaded = session_cache.peek((onnx_model.name, onnx_model.version, onnx_model.sha256))
+    await ModelController.predict(session, "gender", request)
+
+    assert len(session_cache) == 1
+    assert session_cache.peek((onnx_model.name, onnx_model.version, onnx_model.sha256)) is loaded
+
+
+@pytest.mark.asyncio
+async def test_predict_validates_inputs(session: AsyncSession, onnx_model: AiModel):
+    with pytest.raises(HTTPException) as e:
+        await ModelController.predict(session, "gender", PredictRequest(inputs={"wrong": [1.0]}))
+    assert e.value.status_code == 422
+
+    with pytest.raises(HTTPException) as e:
+        await ModelController.predict(session, "missing", PredictRequest(inputs={"in": [1.0]}))
+    assert e.value.status_code == 404
+
+
+def test_session_cache_evicts_least_recently_used(fixture_path: str):
+    model_path = find_model_file(fixture_path)
+    first = load_session(("a", "1", "x"), model_path, warmup=False)
+    second = load_session(("b", "1", "x"), model_path, warmup=False)
+    cache = SessionCache(max_bytes=first.size + second.size - 1)
+
+    cache.put(first)
+    cache.put(second)
+    assert ("a", "1", "x") not in cache
+    assert ("b", "1", "x") in cache
+
+
+def test_prepared_models_are_memory_mapped(fixture_path: str, tmp_path):
+    original = find_model_file(fixture_path)
+    model_path = str(tmp_path / "gender.onnx")
+    shutil.copyfile(original, model_path)
+    prepare_model(model_path)
+    assert is_prepared(model_path)
+
+    prepared = load_session(("gender", "0.0.1", "x"), model_path, warmup=False)
+    with open("/proc/self/maps") as f:
+        assert model_path + ".data" in f.read()
+
+    image = np.random.rand(2, 96, 96, 3).astype(np.float32)
+    expected = load_session(("gender", "0.0.1", "y"), original, warmup=False).run({"in": image})["out"]
+    np.testing.assert_allclose(prepared.run({"in": image})["out"], expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_predict_batches_only_dynamic_batch_models(session: AsyncSession, onnx_model: AiModel, session_cache: SessionCache):
+    request = PredictRequest(inputs={"in": np.zeros((1, 96, 96, 3)).tolist()})
+    await ModelController.predict(session, "gender", request)
+    loaded = session_cache.peek((onnx_model.name, onnx_model.version, onnx_model.sha256))
+    assert loaded.batchable
+    assert loaded.batcher is not None
+
+    # Exported with a fixed batch size of 1, stacked requests would be rejected by the runtime
+    loaded.batcher = None
+    loaded.inputs[0].shape = [1, 96, 96, 3]
+    assert not loaded.batchable
+    await asyncio.gather(*[ModelController.predict(session, "gender", request) for _ in range(4)])
+    assert loaded.batcher is None
+
+
+@pytest.mark.asyncio
+async def test_predict_ignores_invalid_batching_details(session: AsyncSession, onnx_model: AiModel, session_cache: SessionCache):
+    onnx_model.details = {"max_batch_size": "lots", "max_batch_wait_ms": -1}
+    session.add(onnx_model)
+    await session.commit()
+
+    request = PredictRequest(inputs={"in": np.zeros((1, 96, 96, 3)).tolist()})
+    response = await ModelController.predict(session, "gender", request)
+    assert np.asarray(response.outputs["out"]).shape == (1, 2)
+
+    batcher = session_cache.peek((onnx_model.name, onnx_model.version, onnx_model.sha256)).batcher
+    assert batcher.max_batch_size == get_settings().INFERENCE_MAX_BATCH_SIZE
+    assert batcher.max_wait == get_settings().INFERENCE_MAX_BATCH_WAIT_MS / 1000
@@ -0,0 +1,86 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from uuid import uuid4
+from typing import List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.server.controllers.ai.models.model_controller import ModelController
+from src.server.controllers.auth.auth_controller import AuthController
+from src.server.controllers.auth.schemas import LoginUser
+from utils.pagination import encode_cursor
+
+
+@asynccontextmanager
+async def captured_statements(session: AsyncSession):
+    """
+    Every SELECT the session sends to the database while the block runs
+    """
+    statements: List[Tuple[str, tuple]] = []
+
+    def capture(_conn, _cursor, statement, parameters, _context, _executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+async def query_plan(session: AsyncSession, statement: str, parameters: tuple) -> str:
+    conn = await session.connection()
+    rows = (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+async def plans_of(session: AsyncSession, statements: List[Tuple[str, tuple]]) -> List[str]:
+    assert statements
+    return [await query_plan(session, statement, parameters) for statement, parameters in statements]
+
+
+@pytest.mark.asyncio
+async def test_model_lookups_use_the_live_name_index(session: AsyncSession):
+    async with captured_statements(session) as statements:
+        with pytest.raises(HTTPException):
+            await ModelController.get_model(session, "gender")
+    for plan in await plans_of(session, statements):
+        assert "ix_aimodel_live_name_created_at" in plan
+
+
+@pytest.mark.asyncio
+async def test_version_lookups_use_the_unique_index(session: AsyncSession):
+    async with captured_statements(session) as statements:
+        with pytest.raises(HTTPException):
+            await ModelController.get_model(session, "gender", version="0.0.1")
+        await ModelController.get_models(session, name="gender", version="0.0.1", include_deleted=True)
+    for plan in await plans_of(session, statements):
+        assert "uq_aimodel_name_version" in plan or "ix_aimodel_live_name_created_at" in plan
+        assert "SCAN aimodel" not in plan
+
+
+@pytest.mark.asyncio
+async def test_model_listing_walks_the_keyset_index(session: AsyncSession):
+    async with captured_statements(session) as statements:
+        await ModelController.get_models(session, limit=10)
+        await ModelController.get_models(session, limit=10, cursor=encode_cursor(datetime(2024, 1, 1), uuid4()))
+    first_page, next_page = await plans_of(session, statements)
+    for plan in (first_page, next_page):
+        assert "ix_aimodel_live_created_at_id" in plan
+        # rows come out of the index in order, no sort step
+        assert "TEMP B-TREE" not in plan
+    # later pages seek into the index instead of scanning it from the start
+    assert "SEARCH aimodel" in next_page
+
+
+@pytest.mark.asyncio
+async def test_user_lookups_use_the_email_index(session: AsyncSession):
+    async with captured_statements(session) as statements:
+        await AuthController.authenticate_user(session, LoginUser(email="nobody@example.com", password="x"))
+    for plan in await plans_of(session, statements):
+        assert "uq_users_email" in plan
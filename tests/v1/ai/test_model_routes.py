@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from apps.v1.ai.models.router import router
+from db import session as session_module
+from db import model_cache as model_cache_module
+from db.model_cache import ModelMetadataCache, mark_models_changed
+from db.models import AiModel
+from server.controllers.ai.models.model_controller import ModelController
+from server.controllers.ai.models.schemas import ModelResponse
+from utils.etag import etag_matches
+
+
+@pytest.fixture
+async def api(session: AsyncSession) -> AsyncClient:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[session_module.get_async_db] = lambda: session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.fixture
+def statements(session: AsyncSession):
+    executed = []
+    engine = session.bind.sync_engine
+
+    def record(_conn, _cursor, statement, *_args):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', 'W/"b"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"a"')
+
+
+@pytest.mark.asyncio
+async def test_unchanged_listing_is_answered_without_the_database(
+    api: AsyncClient, session: AsyncSession, aimodel: AiModel, statements
+):
+    response = await api.get("/models")
+    assert response.status_code == 200 and len(response.json()) == 1
+    etag = response.headers["ETag"]
+
+    statements.clear()
+    response = await api.get("/models", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["ETag"] == etag
+    assert statements == []
+
+    session.add(AiModel(name="test", description="test", url_or_path="http://test.com/test", version="0.0.2", sha256="1" * 64))
+    mark_models_changed(session, "test")
+    await session.commit()
+    response = await api.get("/models", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 2
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_listing_etag_falls_back_to_the_database(api: AsyncClient, aimodel: AiModel, model_cache):
+    model_cache.suspended = True
+    etag = (await api.get("/models")).headers["ETag"]
+    assert (await api.get("/models", headers={"If-None-Match": etag})).status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_every_node_hands_out_the_same_listing_etag(api: AsyncClient, session: AsyncSession, aimodel: AiModel, monkeypatch):
+    session.add(AiModel(name="test", description="test", url_or_path="http://test.com/test", version="0.0.2", sha256="1" * 64))
+    mark_models_changed(session, "test")
+    await session.commit()
+    etag = (await api.get("/models")).headers["ETag"]
+
+    # Another worker with its own cache, it learns the version from the database
+    monkeypatch.setattr(model_cache_module, "_model_cache", ModelMetadataCache(max_entries=8, ttl=60))
+    response = await api.get("/models", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["ETag"] == etag
+
+
+@pytest.mark.asyncio
+async def test_listing_etag_on_a_replica_comes_from_its_rows(api: AsyncClient, session: AsyncSession, aimodel: AiModel, model_cache):
+    session.info["read_only"] = True
+    try:
+        etag = (await api.get("/models")).headers["ETag"]
+
+        # The primary announced a change the replica has not replayed, its page is still the old one
+        model_cache.version = 0
+        model_cache.invalidate(["test"], 1)
+        assert model_cache.version == 1
+        response = await api.get("/models", headers={"If-None-Match": etag})
+        assert response.status_code == 304 and response.headers["ETag"] == etag
+    finally:
+        session.info.pop("read_only")
+
+
+@pytest.mark.asyncio
+async def test_model_detail_etag(api: AsyncClient, aimodel: AiModel, statements):
+    response = await api.get("/models/test")
+    assert response.status_code == 200 and response.json()["version"] == "0.0.1"
+    etag = response.headers["ETag"]
+
+    statements.clear()
+    response = await api.get("/models/test", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert statements == []
+    assert (await api.get("/models/missing")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_listing_fast_path_matches_the_response_model(
+    api: AsyncClient, session: AsyncSession, aimodel: AiModel, monkeypatch
+):
+    registered = datetime(2024, 1, 1, 12, 0, 0, 123000, tzinfo=timezone.utc)
+    for i, version in enumerate(("0.0.2", "0.0.3")):
+        session.add(AiModel(
+            name="test", description=None, url_or_path="s3://m", version=version, sha256="1" * 64, details={"a": "b"},
+            created_at=registered + timedelta(seconds=i), updated_at=registered,
+        ))
+    await session.commit()
+
+    # SQLite hands datetimes back naive, Postgres timestamptz columns come back aware in UTC
+    get_models = ModelController.get_models
+
+    async def aware_get_models(*args, **kwargs):
+        page = await get_models(*args, **kwargs)
+        for item in page.items:
+            for field in ("created_at", "updated_at"):
+                if isinstance(item, dict):
+                    item[field] = item[field].replace(tzinfo=timezone.utc)
+                else:
+                    setattr(item, field, getattr(item, field).replace(tzinfo=timezone.utc))
+        return page
+
+    monkeypatch.setattr(ModelController, "get_models", staticmethod(aware_get_models))
+
+    response = await api.get("/models", params={"limit": 2})
+    assert response.headers["content-type"] == "application/json"
+    page = await ModelController.get_models(session, limit=2)
+    assert response.json() == [item.model_dump(mode="json") for item in page.items]
+    assert response.json()[0]["created_at"] == "2024-01-01T12:00:00.123000Z"
+    assert response.headers["X-Next-Cursor"] == page.next_cursor
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson(api: AsyncClient, session: AsyncSession, aimodel: AiModel, monkeypatch):
+    import json
+    from apps.v1.ai.models import router as router_module
+
+    for version in ("0.0.2", "0.0.3", "0.0.4"):
+        session.add(AiModel(name="test", description="test", url_or_path="s3://m", version=version, sha256="1" * 64))
+    await session.commit()
+
+    chunks = [chunk async for chunk in ModelController.export_models(lambda: AsyncSession(session.bind), batch_size=2)]
+    assert len(chunks) == 2
+    assert [json.loads(line)["version"] for line in b"".join(chunks).splitlines()] == ["0.0.1", "0.0.2", "0.0.3", "0.0.4"]
+
+    monkeypatch.setattr(router_module, "stream_session", lambda: AsyncSession(session.bind))
+    response = await api.get("/models/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 4 and set(lines[0]) == set(ModelResponse.model_fields)
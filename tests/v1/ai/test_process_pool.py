@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from server.inference.batcher import MicroBatcher
+from server.inference.process_pool import InferenceProcessPool, InferenceWorkerError, parse_cpu_affinity
+from server.inference.session_cache import find_model_file, load_session
+
+KEY = ("gender", "0.0.1", "x")
+
+
+@pytest.fixture
+def pool():
+    pool = InferenceProcessPool(workers=2)
+    yield pool
+    pool.close()
+
+
+def test_parse_cpu_affinity():
+    assert parse_cpu_affinity("") == []
+    assert parse_cpu_affinity("0-1; 2,3;4") == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.asyncio
+async def test_pool_runs_models_through_shared_memory(pool: InferenceProcessPool, fixture_path: str):
+    model_path = find_model_file(fixture_path)
+    loaded = await pool.load(KEY, model_path, warmup=False)
+    assert loaded.session is None
+    assert [spec.name for spec in loaded.inputs] == ["in"]
+
+    image = np.random.rand(4, 96, 96, 3).astype(np.float32)
+    outputs = await pool.run(loaded, {"in": image})
+
+    expected = load_session(KEY, model_path, warmup=False).run({"in": image})["out"]
+    np.testing.assert_allclose(outputs["out"], expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_pool_is_a_batcher_runner(pool: InferenceProcessPool, fixture_path: str):
+    loaded = await pool.load(KEY, find_model_file(fixture_path), warmup=False)
+    batcher = MicroBatcher(loaded, max_batch_size=8, max_wait_ms=5, runner=pool.run)
+    result = await batcher.submit({"in": np.zeros((2, 96, 96, 3), dtype=np.float32)})
+    assert result["out"].shape == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_worker_errors_are_reported(pool: InferenceProcessPool, fixture_path: str):
+    loaded = await pool.load(KEY, find_model_file(fixture_path), warmup=False)
+    with pytest.raises(InferenceWorkerError):
+        await pool.run(loaded, {"in": np.zeros((1, 3), dtype=np.float32)})